@@ -0,0 +1,158 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+
+Load test of the ifpd web interface.
+
+Sends requests to a running "ifpd serve" instance from a number of concurrent
+clients, each keeping its connection alive, and reports requests per second
+and latency percentiles of each route. The home page and queue status are
+always requested. The download of a query output is requested when a query ID
+is provided, and single-probe queries are submitted when a database and
+chromosome are provided (repeated submissions reuse the results of the first).
+
+Usage:
+    python benchmarks/load_test.py [--url URL] [--clients N] [--requests N]
+        [--query-id ID] [--database DIR --chromosome CHROM]
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import numpy as np  # type: ignore
+import time
+import urllib.parse
+
+
+def build_requests(args):
+    requests = [
+        ("home", "GET", "", None),
+        ("status", "GET", "queueStatus", None),
+    ]
+    if args.query_id is not None:
+        requests.append(("download", "GET", f"q/{args.query_id}/download/", None))
+    if args.database is not None and args.chromosome is not None:
+        form = urllib.parse.urlencode(
+            {
+                "name": "load test",
+                "description": "",
+                "database": args.database,
+                "chromosome": args.chromosome,
+                "start": args.start,
+                "end": args.end,
+                "f1": "size",
+                "f2": "homogeneity",
+                "f3": "centrality",
+                "f1_threshold": 0.1,
+                "n_oligo": 48,
+                "max_probes": 5,
+            }
+        )
+        requests.append(("query", "POST", "single_query", form))
+    return requests
+
+
+class Client(object):
+    """HTTP client sending requests over a persistent connection, and
+    reconnecting when the server closes it."""
+
+    def __init__(self, url):
+        super(Client, self).__init__()
+        self.url = urllib.parse.urlsplit(url)
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        headers = {}
+        if body is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    self.url.hostname, self.url.port, timeout=600
+                )
+            try:
+                self.connection.request(
+                    method, self.url.path + path, body=body, headers=headers
+                )
+                response = self.connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.connection.close()
+                self.connection = None
+                if 0 < attempt:
+                    raise
+                continue
+            if response.will_close:
+                self.connection.close()
+                self.connection = None
+            return response.status
+
+
+def run_client(url, requests, n_requests, seed):
+    rng = np.random.default_rng(seed)
+    client = Client(url)
+    timings = []
+    for requesti in rng.integers(0, len(requests), n_requests):
+        name, method, path, body = requests[requesti]
+        start = time.perf_counter()
+        status = client.request(method, path, body)
+        timings.append((name, status, time.perf_counter() - start))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--url", default="http://localhost:8080/probe-design/")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--query-id", type=str)
+    parser.add_argument("--database", type=str)
+    parser.add_argument("--chromosome", type=str)
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--end", type=int, default=0)
+    args = parser.parse_args()
+    if not args.url.endswith("/"):
+        args.url += "/"
+
+    requests = build_requests(args)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as executor:
+        timings = [
+            timing
+            for clientTimings in executor.map(
+                run_client,
+                [args.url] * args.clients,
+                [requests] * args.clients,
+                [args.requests] * args.clients,
+                range(args.clients),
+            )
+            for timing in clientTimings
+        ]
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{len(timings)} requests from {args.clients} clients in {elapsed:.3f} s:",
+        f"{len(timings) / elapsed:.1f} requests per second.",
+    )
+    print("route\trequests\terrors\tp50_ms\tp99_ms\tmax_ms")
+    for name, method, path, body in requests:
+        latency = np.array([t[2] for t in timings if t[0] == name]) * 1000
+        errors = sum(1 for t in timings if t[0] == name and 400 <= t[1])
+        if 0 == latency.shape[0]:
+            continue
+        print(
+            "\t".join(
+                [
+                    name,
+                    f"{latency.shape[0]}",
+                    f"{errors}",
+                    f"{np.percentile(latency, 50):.1f}",
+                    f"{np.percentile(latency, 99):.1f}",
+                    f"{latency.max():.1f}",
+                ]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+
+Benchmark of probe-set window population with a process pool.
+
+Simulates a whole-chromosome spotting query (i.e., oligos spanning a full
+chromosome) and times ProbeFeatureTable.select_best_in_windows with an
+increasing number of processes, up to the number of available cores.
+
+Usage:
+    python benchmarks/populate_windows.py [--n-oligos N] [--n-probes N]
+        [--window-shift F] [--repeats N]
+"""
+
+import argparse
+from ifpd import const, query
+import joblib  # type: ignore
+import numpy as np  # type: ignore
+import pandas as pd  # type: ignore
+import time
+
+
+def simulate_oligos(n_oligos, oligo_length=40, seed=0):
+    rng = np.random.default_rng(seed)
+    chromStart = np.cumsum(rng.integers(oligo_length + 10, 300, n_oligos))
+    return pd.DataFrame(
+        {
+            "chromStart": chromStart,
+            "chromEnd": chromStart + oligo_length,
+            "name": np.repeat("A" * oligo_length, n_oligos),
+        }
+    )
+
+
+def build_windows(region, n_probes, window_shift):
+    chrom, chromStart, chromEnd = region
+    window_size = int((chromEnd - chromStart) / (n_probes + 1))
+    starts = np.arange(chromStart, chromEnd - window_size, window_size)
+    shifts = np.arange(0, window_size, max(1, int(window_shift * window_size)))
+    windowStart = (starts[None, :] + shifts[:, None]).ravel()
+    return (windowStart, windowStart + window_size, shifts.shape[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--n-oligos", type=int, default=2_000_000)
+    parser.add_argument("--n-oligo", type=int, default=48)
+    parser.add_argument("--n-probes", type=int, default=100)
+    parser.add_argument("--window-shift", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    oligos = simulate_oligos(args.n_oligos)
+    region = ("chrSim", 0, int(oligos["chromEnd"].max()))
+    candidateList = query.ProbeCandidateList(region[0], oligos, args.n_oligo, None)
+    probeFeatureTable = query.ProbeFeatureTable(candidateList, region)
+    windowStart, windowEnd, n_sets = build_windows(
+        region, args.n_probes, args.window_shift
+    )
+    print(
+        f"{len(candidateList)} candidates, {n_sets} window sets,",
+        f"{windowStart.shape[0]} windows.",
+    )
+
+    threadList = [1]
+    while threadList[-1] * 2 <= joblib.cpu_count():
+        threadList.append(threadList[-1] * 2)
+    if threadList[-1] != joblib.cpu_count():
+        threadList.append(joblib.cpu_count())
+
+    reference = None
+    print("threads\tseconds\tspeedup")
+    for threads in threadList:
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            best = probeFeatureTable.select_best_in_windows(
+                windowStart, windowEnd, const.featureList, 0.1, threads=threads
+            )
+            timings.append(time.perf_counter() - start)
+        if reference is None:
+            reference = (best, min(timings))
+        assert np.array_equal(best, reference[0])
+        print(f"{threads}\t{min(timings):.3f}\t{reference[1] / min(timings):.2f}")
+
+
+if __name__ == "__main__":
+    main()
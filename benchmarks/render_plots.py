@@ -0,0 +1,129 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+
+Benchmark of probe and probe set plot rendering.
+
+Simulates a probe set and times the rendering of its plots, per probe. The
+oligo plot of each probe (probe.png) is also rendered as done before figure
+templates were introduced, i.e., with a new pyplot figure for each plot and
+one artist per oligo, as a reference.
+
+Usage:
+    python benchmarks/render_plots.py [--n-probes N] [--n-oligo N]
+        [--repeats N]
+"""
+
+import argparse
+from ifpd import query
+import matplotlib  # type: ignore
+import numpy as np  # type: ignore
+import os
+import pandas as pd  # type: ignore
+import tempfile
+import time
+
+matplotlib.use("agg")
+import matplotlib.pyplot as plt  # type: ignore # noqa: E402
+
+
+def simulate_probe_set(n_probes, n_oligo, oligo_length=40, seed=0):
+    rng = np.random.default_rng(seed)
+    chromStart = np.cumsum(rng.integers(oligo_length + 10, 300, n_probes * n_oligo))
+    oligos = pd.DataFrame(
+        {
+            "chromStart": chromStart,
+            "chromEnd": chromStart + oligo_length,
+            "sequence": np.repeat("A" * oligo_length, chromStart.shape[0]),
+        }
+    )
+    region = ("chrSim", 0, int(oligos["chromEnd"].max()))
+    window_size = int(region[2] / n_probes)
+    window_set = query.GenomicWindowList(None)
+    for pi in range(n_probes):
+        window_set.add(region[0], pi * window_size, window_size)
+        window_set[-1].probe = query.OligoProbe(
+            region[0], oligos.iloc[(pi * n_oligo) : ((pi + 1) * n_oligo), :], None
+        )
+    return (window_set, region)
+
+
+def plot_oligo_pyplot(probe, outputDir):
+    fig = plt.figure(figsize=(20, 5))
+    (genome_handle,) = plt.plot(
+        [probe.chromStart, probe.chromEnd], [0, 0], "k", linewidth=4.0, label="Genome"
+    )
+    for i in probe.oligoData.index:
+        oligo = probe.oligoData.loc[i, :]
+        oligo_midpoint = (oligo["chromStart"] + oligo["chromEnd"]) / 2.0
+        (oligo_handle,) = plt.plot(
+            [oligo["chromStart"], oligo["chromEnd"]],
+            [0, 0],
+            "c",
+            linewidth=2.0,
+            label="Oligo",
+        )
+        (oligoCenter_handle,) = plt.plot(
+            [oligo_midpoint, oligo_midpoint], [-0.1, 0.1], "c:", label="Oligo center"
+        )
+    plt.gca().axes.get_yaxis().set_visible(False)
+    plt.ylim((-0.5, 0.5))
+    plt.legend(
+        handles=[genome_handle, oligo_handle, oligoCenter_handle],
+        fontsize="small",
+        loc="best",
+    )
+    plt.suptitle((f"{probe.chrom}:{probe.chromStart}-{probe.chromEnd}"))
+    plt.xlabel("genomic coordinate [nt]")
+    plt.savefig(os.path.join(outputDir, "probe.png"), format="png", bbox_inches="tight")
+    plt.close(fig)
+
+
+def time_per_probe(window_set, fun, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for window in window_set:
+            fun(window)
+        timings.append((time.perf_counter() - start) / len(window_set))
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--n-probes", type=int, default=20)
+    parser.add_argument("--n-oligo", type=int, default=48)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    window_set, region = simulate_probe_set(args.n_probes, args.n_oligo)
+    outputDir = tempfile.mkdtemp()
+    print(f"{args.n_probes} probes of {args.n_oligo} oligos.")
+
+    window_set[0].probe.plot(outputDir, window_set[0].asRegion())
+    plot_oligo_pyplot(window_set[0].probe, outputDir)
+    reference = time_per_probe(
+        window_set, lambda w: plot_oligo_pyplot(w.probe, outputDir), args.repeats
+    )
+    template = time_per_probe(
+        window_set, lambda w: w.probe._plot_oligo(outputDir), args.repeats
+    )
+    allPlots = time_per_probe(
+        window_set, lambda w: w.probe.plot(outputDir, w.asRegion()), args.repeats
+    )
+
+    print("plot\tms_per_probe\tspeedup")
+    print(f"probe.png (pyplot)\t{reference * 1000:.1f}\t1.00")
+    print(f"probe.png (template)\t{template * 1000:.1f}\t{reference / template:.2f}")
+    print(f"all probe plots\t{allPlots * 1000:.1f}")
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        window_set.plot(outputDir, region)
+        timings.append(time.perf_counter() - start)
+    print(f"probe set plots\t{min(timings) * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,20 @@ try:
 except Exception as e:
     raise e
 
-from ifpd import bioext, exception, query, stats
+from ifpd import bioext, cache, columnar, database, exception, query, stats
+from ifpd import bundle, plot
 from ifpd import sections
 
-__all__ = ["__version__", "bioext", "exception", "query", "sections", "stats"]
+__all__ = [
+    "__version__",
+    "bioext",
+    "bundle",
+    "cache",
+    "columnar",
+    "database",
+    "exception",
+    "plot",
+    "query",
+    "sections",
+    "stats",
+]
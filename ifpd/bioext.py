@@ -4,6 +4,10 @@
 """
 
 # import ifpd as fp
+import csv
+import io
+import itertools
+import numpy as np  # type: ignore
 import os
 import pandas as pd  # type: ignore
 from rich.progress import track  # type: ignore
@@ -28,47 +32,50 @@ class UCSCbed(object):
     ]
     FIELD_FORMAT = "siisfsiisiss"
     FORMATTER = {"f": float, "i": int, "s": str}
+    CHUNKSIZE = 1000000
+    EXTRA_FIELD = "extra"
 
     def __init__(self, path, incrementChromEnd=False, bufferize=False):
         super(UCSCbed, self).__init__()
         self.path = path
         self.incrementChromEnd = incrementChromEnd
-        self.nrecords = self.count_records()
+        self.__nrecords = None
         if not bufferize:
             self.__read()
 
+    @property
+    def nrecords(self):
+        """Number of lines in the bed file, counted only when first needed."""
+        if self.__nrecords is None:
+            self.__nrecords = self.count_records()
+        return self.__nrecords
+
     def count_records(self):
-        return sum(1 for line in open(self.path))
+        with open(self.path, "rb") as IH:
+            return sum(1 for line in IH)
 
     def __read(self):
         """Reads the bed file into a pandas.DataFrame."""
         assert os.path.isfile(self.path), f"bed file not found: '{self.path}'"
 
-        bedDF = []
-        with open(self.path, "r+") as IH:
-            header = next(IH)
-            if header.startswith("browser") or header.startswith("track"):
-                self.custom = True
-                self.header = header.strip()
-            else:
-                bedDF.append(UCSCbed.parse_bed_line(header))
-                self.custom = False
-                self.header = None
-            bedDF.extend([UCSCbed.parse_bed_line(line) for line in IH])
-
-        self.df = pd.concat(bedDF)
-        self.df.index = range(self.df.shape[0])
+        chunkList = list(self.chunks())
+        if 0 == len(chunkList):
+            self.df = pd.DataFrame(columns=UCSCbed.FIELD_NAMES[:3])
+        else:
+            self.df = pd.concat(chunkList, ignore_index=True)
         self.ncols = self.df.shape[1]
 
     def __set_custom_header(self):
         with open(self.path, "r+") as IH:
-            line = next(IH)
+            line = next(IH, "")
             if line.startswith("browser") or line.startswith("track"):
                 self.custom = True
                 self.header = line.strip()
+                line = next(IH, "")
             else:
                 self.custom = False
                 self.header = None
+        self.nfields = len(line.strip("\r\n").split("\t")) if line.strip() else 0
 
     def buffer(self, parse=True, enforceBED3=False):
         """Reads the bed file and yields one line at a time. The content is not
@@ -113,6 +120,93 @@ class UCSCbed(object):
 
         return lineDF
 
+    def chunks(self, chunksize=CHUNKSIZE, enforceBED3=False, extraFields=False):
+        """Reads the bed file and yields blocks of at most chunksize lines, each
+        as a formatted pd.DataFrame. Fields are parsed directly into typed columns.
+        Only the first 4 fields are kept, or the first 3 with enforceBED3. The
+        number of fields is taken from the first record, and missing name fields
+        are empty strings. Empty lines are skipped. With extraFields, any other
+        field is kept, unparsed and tab-separated, in an additional "extra"
+        column."""
+        self.__set_custom_header()
+        ncols = min(4 - enforceBED3, max(3, self.nfields))
+        with open(self.path, "r+") as IH:
+            if self.custom:
+                next(IH)
+            linei = 1 + self.custom
+            while True:
+                lines = list(itertools.islice(IH, chunksize))
+                if 0 == len(lines):
+                    break
+                yield UCSCbed.parse_bed_chunk(
+                    lines, ncols, self.incrementChromEnd, linei, extraFields
+                )
+                linei += len(lines)
+
+    @staticmethod
+    def parse_bed_chunk(
+        lines, ncols=4, incrementChromEnd=False, firstLine=1, extraFields=False
+    ):
+        """Parses and checks a block of lines of a bed file, keeping the first
+        ncols fields, and the others in an "extra" column with extraFields. Does
+        not work on header lines."""
+        nfields = np.array(
+            [line.count("\t") + 1 if line.strip() else 0 for line in lines]
+        )
+        notEmpty = nfields != 0
+        if (nfields[notEmpty] < 3).any():
+            linei = np.argmax(notEmpty & (nfields < 3))
+            assert False, "".join(
+                [
+                    f"at least 3 fields required, {nfields[linei]} found ",
+                    f"in line #{firstLine + linei}.",
+                ]
+            )
+
+        fieldNames = UCSCbed.FIELD_NAMES[:ncols]
+        if extraFields:
+            fieldNames = fieldNames + [UCSCbed.EXTRA_FIELD]
+        if not notEmpty.any():
+            return pd.DataFrame(columns=fieldNames)
+        lines = list(itertools.compress(lines, notEmpty))
+        nread = min(ncols, nfields.max())
+        chunk = pd.read_csv(
+            io.StringIO("".join(lines)),
+            sep="\t",
+            header=None,
+            names=range(nread),
+            usecols=range(nread),
+            dtype={i: str for i in range(nread) if "s" == UCSCbed.FIELD_FORMAT[i]},
+            keep_default_na=False,
+            quoting=csv.QUOTE_NONE,
+        )
+        chunk.columns = fieldNames[:nread]
+        chunk.index = np.arange(len(notEmpty))[notEmpty] + firstLine
+        for field in fieldNames[nread:ncols]:
+            chunk[field] = ""
+        if extraFields:
+            chunk[UCSCbed.EXTRA_FIELD] = [
+                line.rstrip("\r\n").split("\t", ncols)[ncols]
+                if line.count("\t") >= ncols
+                else ""
+                for line in lines
+            ]
+
+        for field in fieldNames[1:3]:
+            if "i" != chunk[field].dtype.kind:
+                values = pd.to_numeric(chunk[field], errors="coerce")
+                linei = chunk.index[np.argmax(values.isnull().values)]
+                assert not values.isnull().any(), "".join(
+                    [
+                        f"integer expected in the {field} field, ",
+                        f"'{chunk.loc[linei, field]}' found in line #{linei}.",
+                    ]
+                )
+                chunk[field] = values
+        chunk["chromStart"] = chunk["chromStart"].astype(np.int64)
+        chunk["chromEnd"] = chunk["chromEnd"].astype(np.int64) + incrementChromEnd
+        return chunk
+
     def isBEDN(self, n):
         n = min(n, 12)
         return self.ncols == n
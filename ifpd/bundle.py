@@ -0,0 +1,322 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+
+Columnar result bundle of a query, with the candidate table and the windows and
+oligos of every exported candidate, in Arrow IPC files. Requires pyarrow, which
+can be installed with the "arrow" extra of ifpd.
+"""
+
+from ifpd import query
+import json
+import numpy as np  # type: ignore
+import os
+import pandas as pd  # type: ignore
+import shutil
+import tempfile
+
+try:
+    import pyarrow as pa  # type: ignore
+except ImportError:
+    pa = None
+
+CANDIDATES_FILE = "candidates.arrow"
+WINDOWS_FILE = "windows.arrow"
+OLIGOS_FILE = "oligos.arrow"
+METADATA_KEY = b"ifpd"
+WINDOW_COLUMNS = {
+    "candidate": np.int64,
+    "chrom": str,
+    "chromStart": np.int64,
+    "chromEnd": np.int64,
+    "probe": np.int64,
+}
+OLIGO_COLUMNS = {
+    "candidate": np.int64,
+    "probe": np.int64,
+    "oligo": np.int64,
+    "chromStart": np.int64,
+    "chromEnd": np.int64,
+    "sequence": str,
+}
+
+
+def is_available():
+    return type(None) != type(pa)
+
+
+def assert_available():
+    assert is_available(), "".join(
+        [
+            "pyarrow is required for result bundles, ",
+            'install it with: pip install "ifpd[arrow]"',
+        ]
+    )
+
+
+def has_bundle(outdir):
+    return os.path.isfile(os.path.join(outdir, CANDIDATES_FILE))
+
+
+def write_table(path, data, metadata=None):
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    if type(None) != type(metadata):
+        table = table.replace_schema_metadata(
+            {METADATA_KEY: json.dumps(metadata).encode("utf-8")}
+        )
+    with pa.OSFile(path, "wb") as OH:
+        with pa.ipc.new_file(OH, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_table(outdir, name):
+    """Memory-maps a table of a result bundle."""
+    source = pa.memory_map(os.path.join(outdir, name), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_candidate_table(outdir):
+    assert_available()
+    return read_table(outdir, CANDIDATES_FILE).to_pandas()
+
+
+def concat_tables(tables, columns):
+    """Concatenates tables, with the given column types also when empty."""
+    empty = pd.DataFrame(
+        {name: np.array([], dtype=dtype) for name, dtype in columns.items()}
+    )
+    return pd.concat([empty, *tables], ignore_index=True).astype(columns)
+
+
+def oligo_table(candidate, probe, oligoProbe):
+    return pd.DataFrame.from_dict(
+        {
+            "candidate": np.repeat(candidate, oligoProbe.oligoData.shape[0]),
+            "probe": np.repeat(probe, oligoProbe.oligoData.shape[0]),
+            "oligo": oligoProbe.oligoData.index.values.astype(np.int64),
+            "chromStart": oligoProbe.oligoData.iloc[:, 0].values.astype(np.int64),
+            "chromEnd": oligoProbe.oligoData.iloc[:, 1].values.astype(np.int64),
+            "sequence": oligoProbe.oligoData.iloc[:, 2].values.astype(str),
+        }
+    )
+
+
+def write(outdir, kind, candidateTable, windows, oligos, region, refGenome, nExported):
+    """Writes a result bundle. Windows and oligos must be sorted by candidate.
+
+    Args:
+            outdir (string): path to the query output folder.
+            kind (string): "candidate" or "probe_set".
+            candidateTable (pd.DataFrame): candidate table.
+            windows (pd.DataFrame): candidate, chrom, chromStart, chromEnd, and
+                    probe (-1 for none) of each window.
+            oligos (pd.DataFrame): candidate, probe, oligo, chromStart,
+                    chromEnd, and sequence of each oligo.
+            region (tuple): queried region.
+            refGenome (string): reference genome.
+            nExported (int): number of exported candidates, i.e., the top rows
+                    of the candidate table.
+    """
+    assert_available()
+    assert kind in ["candidate", "probe_set"], f"unknown candidate kind: {kind}"
+    metadata = dict(
+        kind=kind,
+        region=[region[0], int(region[1]), int(region[2])],
+        refGenome=refGenome,
+        exported=int(nExported),
+    )
+    # The candidate table is written last, as it marks a complete bundle.
+    write_table(os.path.join(outdir, WINDOWS_FILE), windows)
+    write_table(os.path.join(outdir, OLIGOS_FILE), oligos)
+    write_table(os.path.join(outdir, CANDIDATES_FILE), candidateTable, metadata)
+
+
+def write_probes(outdir, candidateTable, probeList, region):
+    """Writes the result bundle of a probe query.
+
+    Args:
+            outdir (string): path to the query output folder.
+            candidateTable (pd.DataFrame): candidate table.
+            probeList (list): exported OligoProbe candidates, in rank order.
+            region (tuple): queried region.
+    """
+    windows = pd.DataFrame.from_dict(
+        {
+            "candidate": np.arange(len(probeList)),
+            "chrom": np.repeat(region[0], len(probeList)),
+            "chromStart": np.repeat(int(region[1]), len(probeList)),
+            "chromEnd": np.repeat(int(region[2]), len(probeList)),
+            "probe": np.zeros(len(probeList), dtype=np.int64),
+        }
+    )
+    oligos = concat_tables(
+        [oligo_table(i, 0, probe) for i, probe in enumerate(probeList)],
+        OLIGO_COLUMNS,
+    )
+    refGenome = probeList[0].refGenome if 0 < len(probeList) else None
+    write(
+        outdir,
+        "candidate",
+        candidateTable,
+        windows,
+        oligos,
+        region,
+        refGenome,
+        len(probeList),
+    )
+
+
+def write_probe_sets(outdir, candidateTable, window_setList, region):
+    """Writes the result bundle of a probe set query.
+
+    Args:
+            outdir (string): path to the query output folder.
+            candidateTable (pd.DataFrame): candidate table.
+            window_setList (list): exported GenomicWindowList, in rank order.
+            region (tuple): queried region.
+    """
+    windowList = []
+    oligoList = []
+    refGenome = None
+    for i, window_set in enumerate(window_setList):
+        windows = window_set.asDataFrame().drop("size", axis=1)
+        windows.insert(0, "candidate", i)
+        windowList.append(windows)
+        probeList = [w.probe for w in window_set if w.has_probe()]
+        for k, probe in enumerate(probeList):
+            oligoList.append(oligo_table(i, k, probe))
+            refGenome = probe.refGenome
+    write(
+        outdir,
+        "probe_set",
+        candidateTable,
+        concat_tables(windowList, WINDOW_COLUMNS),
+        concat_tables(oligoList, OLIGO_COLUMNS),
+        region,
+        refGenome,
+        len(window_setList),
+    )
+
+
+class ResultBundle(object):
+    """Reader of the result bundle of a query. Tables are memory-mapped, and
+    the windows and oligos of a candidate are zero-copy slices of them.
+
+    Args:
+            outdir (string): path to the query output folder.
+            kind (string): "candidate" or "probe_set".
+            region (tuple): queried region.
+            refGenome (string): reference genome.
+            nExported (int): number of exported candidates.
+    """
+
+    def __init__(self, outdir):
+        super(ResultBundle, self).__init__()
+        assert_available()
+        self.outdir = outdir
+        self.candidates = read_table(outdir, CANDIDATES_FILE)
+        metadata = json.loads(self.candidates.schema.metadata[METADATA_KEY])
+        self.kind = metadata["kind"]
+        self.region = tuple(metadata["region"])
+        self.refGenome = metadata["refGenome"]
+        self.nExported = metadata["exported"]
+        self.windows = read_table(outdir, WINDOWS_FILE)
+        self.oligos = read_table(outdir, OLIGOS_FILE)
+
+    def __len__(self):
+        return self.candidates.num_rows
+
+    @staticmethod
+    def slice_candidate(table, candidate):
+        """Rows of a candidate, in a table sorted by candidate."""
+        candidates = table.column("candidate").to_numpy()
+        start, end = np.searchsorted(candidates, [candidate, candidate + 1])
+        return table.slice(start, end - start)
+
+    def get_windows(self, candidate):
+        return self.slice_candidate(self.windows, candidate).to_pandas()
+
+    def get_oligos(self, candidate):
+        return self.slice_candidate(self.oligos, candidate).to_pandas()
+
+    def build_probe(self, chrom, oligos, probe):
+        """OligoProbe from the oligos of a candidate, sorted by probe."""
+        start, end = np.searchsorted(oligos["probe"].values, [probe, probe + 1])
+        assert start < end, f"no oligos for probe {probe}"
+        oligoProbe = query.OligoProbe(
+            chrom,
+            oligos.iloc[start:end, :]
+            .set_index("oligo")
+            .loc[:, ["chromStart", "chromEnd", "sequence"]],
+            None,
+        )
+        oligoProbe.refGenome = self.refGenome
+        return oligoProbe
+
+    def get_probe(self, candidate):
+        return self.build_probe(self.region[0], self.get_oligos(candidate), 0)
+
+    def get_window_set(self, candidate):
+        oligos = self.get_oligos(candidate)
+        window_set = query.GenomicWindowList(None)
+        for window in self.get_windows(candidate).itertuples():
+            window_set.add(
+                window.chrom, window.chromStart, window.chromEnd - window.chromStart
+            )
+            if 0 <= window.probe:
+                window_set[-1].probe = self.build_probe(
+                    window.chrom, oligos, window.probe
+                )
+        return window_set
+
+    def parse_dir_name(self, dirName):
+        """Candidate in a folder name, or None if it does not belong to the
+        bundle."""
+        prefix = f"{self.kind}_"
+        if not dirName.startswith(prefix) or not dirName[len(prefix) :].isdigit():
+            return None
+        candidate = int(dirName[len(prefix) :])
+        return candidate if candidate < self.nExported else None
+
+    def export(self, candidate, path):
+        """Exports a candidate to a folder, as done by ifpd query probe/set."""
+        name = os.path.basename(os.path.normpath(path))
+        if "candidate" == self.kind:
+            probe = self.get_probe(candidate)
+            probe.describe(self.region, os.path.join(path, f"{name}.config"))
+            probe.get_fasta(os.path.join(path, f"{name}.fasta"))
+            probe.get_bed(os.path.join(path, f"{name}.bed"))
+        else:
+            self.get_window_set(candidate).export(path, self.region)
+
+    def materialize(self, dirName):
+        """Exports a candidate folder of the query, if missing. The folder is
+        written under a temporary name and then moved in place, so that
+        incomplete folders are never found.
+
+        Args:
+                dirName (string): candidate folder name.
+
+        Returns:
+                bool: whether the folder was exported.
+        """
+        candidate = self.parse_dir_name(dirName)
+        assert type(None) != type(candidate), f'not in the bundle: "{dirName}"'
+        dirPath = os.path.join(self.outdir, dirName)
+        if os.path.isdir(dirPath):
+            return False
+
+        tmpRoot = tempfile.mkdtemp(prefix=f".{dirName}.", dir=self.outdir)
+        try:
+            tmpPath = os.path.join(tmpRoot, dirName)
+            os.mkdir(tmpPath)
+            self.export(candidate, tmpPath)
+            try:
+                os.rename(tmpPath, dirPath)
+            except OSError:
+                if not os.path.isdir(dirPath):
+                    raise
+                return False
+        finally:
+            shutil.rmtree(tmpRoot, ignore_errors=True)
+        return True
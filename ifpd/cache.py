@@ -0,0 +1,104 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+from collections import OrderedDict
+import os
+import threading
+
+
+class ChromosomeCache(object):
+    """Process-wide cache of chromosome data, with least-recently-used eviction.
+
+    Entries are keyed by database path, chromosome, and chromosome file
+    modification time, so that updated chromosomes are never served from the
+    cache. Entries are evicted when their total size exceeds maxBytes. The cache
+    is disabled when maxBytes is 0.
+
+    Args:
+            maxBytes (int): memory budget, in bytes.
+    """
+
+    def __init__(self, maxBytes=0):
+        super(ChromosomeCache, self).__init__()
+        self.maxBytes = maxBytes
+        self.data = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return 0 < self.maxBytes
+
+    @staticmethod
+    def get_key(dbDirPath, chrom):
+        chromPath = os.path.join(dbDirPath, chrom)
+        return (os.path.realpath(dbDirPath), chrom, os.stat(chromPath).st_mtime_ns)
+
+    def get(self, key):
+        """Returns the cached entry, or None, updating hit/miss counters."""
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key][0]
+
+    def put(self, key, value, nbytes):
+        """Caches an entry of nbytes, evicting the least recently used ones if
+        needed. Entries larger than the whole budget are not cached."""
+        if nbytes > self.maxBytes:
+            return
+        with self.lock:
+            if key in self.data:
+                self.nbytes -= self.data.pop(key)[1]
+            self.data[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.maxBytes:
+                self.nbytes -= self.data.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.nbytes = 0
+
+    def resize(self, maxBytes):
+        """Changes the memory budget, evicting entries if needed."""
+        with self.lock:
+            self.maxBytes = maxBytes
+            while self.nbytes > self.maxBytes:
+                self.nbytes -= self.data.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def stats(self):
+        """Cache status and hit/miss counters, as a dictionary."""
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "entries": len(self.data),
+                "nbytes": self.nbytes,
+                "maxBytes": self.maxBytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+CHROMOSOME_CACHE = ChromosomeCache()
+
+
+def get_chromosome_cache():
+    """Process-wide chromosome cache, disabled by default."""
+    return CHROMOSOME_CACHE
+
+
+def enable_chromosome_cache(maxBytes):
+    """Sets the memory budget of the process-wide chromosome cache."""
+    CHROMOSOME_CACHE.resize(maxBytes)
+    return CHROMOSOME_CACHE
@@ -0,0 +1,282 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+import numpy as np  # type: ignore
+import os
+import pandas as pd  # type: ignore
+import shutil
+
+COLUMNS_DIR = ".columns"
+INT_DTYPE = np.dtype("<i8")
+BYTE_DTYPE = np.dtype("u1")
+
+
+def get_columns_path(dbDirPath, chrom):
+    """Path to the folder with the binary columnar copy of a chromosome."""
+    return os.path.join(dbDirPath, COLUMNS_DIR, chrom)
+
+
+def _memmap(path, dtype):
+    """Memory-maps a raw binary column. Empty files cannot be mapped."""
+    if 0 == os.path.getsize(path):
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class ChromosomeColumns(object):
+    """Binary columnar copy of a chromosome file.
+
+    Oligo positions are stored as fixed-width little-endian int64 arrays, while
+    sequences are concatenated in a single byte array and accessed through an
+    array of (n+1) offsets. All columns are opened with numpy.memmap, so that
+    reading is lazy and the page cache is shared by all processes. Use inMemory
+    to read all columns in memory instead, e.g., to cache them.
+    """
+
+    FILES = {
+        "chromStart": ("chromStart.i8", INT_DTYPE),
+        "chromEnd": ("chromEnd.i8", INT_DTYPE),
+        "offsets": ("sequence_offsets.i8", INT_DTYPE),
+        "sequence": ("sequence.u1", BYTE_DTYPE),
+    }
+
+    def __init__(self, dbDirPath, chrom, inMemory=False):
+        super(ChromosomeColumns, self).__init__()
+        self.chrom = chrom
+        self.dirPath = get_columns_path(dbDirPath, chrom)
+        assert ChromosomeColumns.exists(
+            dbDirPath, chrom
+        ), f'columnar chromosome not found: "{self.dirPath}"'
+
+        read = np.fromfile if inMemory else _memmap
+        for column, (fname, dtype) in self.FILES.items():
+            setattr(self, column, read(os.path.join(self.dirPath, fname), dtype))
+        self.__check()
+
+    def __check(self):
+        assert self.chromStart.shape == self.chromEnd.shape, "".join(
+            [f'column length mismatch in "{self.dirPath}": ', "chromStart/chromEnd"]
+        )
+        assert self.offsets.shape[0] == self.chromStart.shape[0] + 1, "".join(
+            [f'column length mismatch in "{self.dirPath}": ', "sequence offsets"]
+        )
+
+    def __len__(self):
+        return self.chromStart.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes for column in self.FILES.keys())
+
+    @staticmethod
+    def from_frame(chrom, chromData):
+        """Builds an in-memory columnar chromosome from a sorted pd.DataFrame,
+        with chromStart, chromEnd, and (optionally) sequence as first columns."""
+        chromColumns = ChromosomeColumns.__new__(ChromosomeColumns)
+        chromColumns.chrom = chrom
+        chromColumns.dirPath = None
+        chromColumns.chromStart = chromData.iloc[:, 0].values.astype(INT_DTYPE)
+        chromColumns.chromEnd = chromData.iloc[:, 1].values.astype(INT_DTYPE)
+        if 3 <= chromData.shape[1]:
+            sequences = [str(s) for s in chromData.iloc[:, 2].values]
+        else:
+            sequences = [""] * chromData.shape[0]
+        chromColumns.offsets = np.zeros(len(sequences) + 1, dtype=INT_DTYPE)
+        chromColumns.offsets[1:] = np.cumsum(list(map(len, sequences)))
+        chromColumns.sequence = np.frombuffer(
+            "".join(sequences).encode("ascii"), dtype=BYTE_DTYPE
+        )
+        chromColumns.__check()
+        return chromColumns
+
+    @staticmethod
+    def exists(dbDirPath, chrom):
+        dirPath = get_columns_path(dbDirPath, chrom)
+        return all(
+            os.path.isfile(os.path.join(dirPath, fname))
+            for fname, _ in ChromosomeColumns.FILES.values()
+        )
+
+    @staticmethod
+    def is_up_to_date(dbDirPath, chrom):
+        """Whether the columnar copy exists and is not older than the
+        tab-separated chromosome file."""
+        if not ChromosomeColumns.exists(dbDirPath, chrom):
+            return False
+        chromPath = os.path.join(dbDirPath, chrom)
+        if not os.path.isfile(chromPath):
+            return True
+        columnPath = os.path.join(
+            get_columns_path(dbDirPath, chrom),
+            ChromosomeColumns.FILES["chromStart"][0],
+        )
+        return os.path.getmtime(columnPath) >= os.path.getmtime(chromPath)
+
+    def get_sequences(self, start=0, stop=None):
+        """Decodes the sequences of the oligos in the [start, stop) rows."""
+        stop = len(self) if stop is None else stop
+        offsets = np.asarray(self.offsets[start : (stop + 1)])
+        if 0 == offsets.shape[0]:
+            return []
+        blob = self.sequence[offsets[0] : offsets[-1]].tobytes().decode("ascii")
+        offsets = offsets - offsets[0]
+        return [blob[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def asDataFrame(self, start=0, stop=None):
+        """Builds a pd.DataFrame with the [start, stop) rows. The index matches
+        the row number in the chromosome file."""
+        stop = len(self) if stop is None else stop
+        return pd.DataFrame(
+            {
+                "chromStart": np.array(self.chromStart[start:stop]),
+                "chromEnd": np.array(self.chromEnd[start:stop]),
+                "name": self.get_sequences(start, stop),
+            },
+            index=pd.RangeIndex(start, stop),
+        )
+
+
+class ChromosomeColumnsWriter(object):
+    """Writes the binary columnar copy of a chromosome, one block at a time.
+
+    Blocks must be appended already sorted. Files are written in a temporary
+    folder, which replaces any previous copy only when the writer is closed.
+    """
+
+    def __init__(self, dbDirPath, chrom):
+        super(ChromosomeColumnsWriter, self).__init__()
+        self.dirPath = get_columns_path(dbDirPath, chrom)
+        self.tmpPath = f"{self.dirPath}.tmp"
+        if os.path.isdir(self.tmpPath):
+            shutil.rmtree(self.tmpPath)
+        os.makedirs(self.tmpPath)
+
+        self.handles = {
+            column: open(os.path.join(self.tmpPath, fname), "wb")
+            for column, (fname, _) in ChromosomeColumns.FILES.items()
+        }
+        self.nbytes = 0
+        np.zeros(1, dtype=INT_DTYPE).tofile(self.handles["offsets"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, chromStart, chromEnd, sequences):
+        """Appends a block of oligos to the columnar copy."""
+        np.asarray(chromStart, dtype=INT_DTYPE).tofile(self.handles["chromStart"])
+        np.asarray(chromEnd, dtype=INT_DTYPE).tofile(self.handles["chromEnd"])
+
+        sequences = [str(s) for s in sequences]
+        lengths = np.fromiter(
+            map(len, sequences), dtype=INT_DTYPE, count=len(sequences)
+        )
+        (np.cumsum(lengths) + self.nbytes).astype(INT_DTYPE).tofile(
+            self.handles["offsets"]
+        )
+        self.handles["sequence"].write("".join(sequences).encode("ascii"))
+        self.nbytes += int(lengths.sum())
+
+    def append_frame(self, chromData):
+        """Appends a pd.DataFrame with chromStart, chromEnd, and sequence as its
+        first three columns."""
+        if 3 <= chromData.shape[1]:
+            sequences = chromData.iloc[:, 2].values
+        else:
+            sequences = [""] * chromData.shape[0]
+        self.append(chromData.iloc[:, 0].values, chromData.iloc[:, 1].values, sequences)
+
+    def abort(self):
+        for OH in self.handles.values():
+            OH.close()
+        shutil.rmtree(self.tmpPath)
+
+    def close(self):
+        """Closes all columns. Their modification time is updated, so that they
+        are not older than a chromosome file written alongside them."""
+        for column, OH in self.handles.items():
+            OH.close()
+            os.utime(os.path.join(self.tmpPath, ChromosomeColumns.FILES[column][0]))
+        if os.path.isdir(self.dirPath):
+            shutil.rmtree(self.dirPath)
+        os.rename(self.tmpPath, self.dirPath)
+
+
+def write_columns(dbDirPath, chrom, chromData):
+    """Writes the binary columnar copy of a sorted chromosome pd.DataFrame."""
+    with ChromosomeColumnsWriter(dbDirPath, chrom) as writer:
+        writer.append_frame(chromData)
+
+
+INDEX_DIR = ".index"
+INDEX_STEP = 1024
+
+
+def get_index_path(dbDirPath, chrom):
+    """Path to the sparse index of a tab-separated chromosome file."""
+    return os.path.join(dbDirPath, INDEX_DIR, f"{chrom}.i8")
+
+
+class ChromosomeIndex(object):
+    """Sparse index of a sorted tab-separated chromosome file.
+
+    Every INDEX_STEP oligos, stores the row number, the chromStart, and the byte
+    offset of the corresponding line. Since chromosome files are sorted by
+    chromStart, a binary search on the index gives the first block that can
+    contain a region, which is then read from the file.
+    """
+
+    def __init__(self, data):
+        super(ChromosomeIndex, self).__init__()
+        self.data = np.asarray(data, dtype=INT_DTYPE).reshape((-1, 3))
+
+    @staticmethod
+    def build(chromPath, step=INDEX_STEP):
+        """Builds the index of a chromosome file, with a single scan."""
+        data = []
+        offset = 0
+        with open(chromPath, "rb") as IH:
+            for rowi, line in enumerate(IH):
+                if 0 == rowi % step:
+                    data.append((rowi, int(line.split(b"\t", 1)[0]), offset))
+                offset += len(line)
+        return ChromosomeIndex(data)
+
+    @staticmethod
+    def load(dbDirPath, chrom):
+        """Loads the persisted index of a chromosome, if up-to-date."""
+        indexPath = get_index_path(dbDirPath, chrom)
+        if not os.path.isfile(indexPath):
+            return None
+        if os.path.getmtime(indexPath) < os.path.getmtime(
+            os.path.join(dbDirPath, chrom)
+        ):
+            return None
+        return ChromosomeIndex(np.fromfile(indexPath, dtype=INT_DTYPE))
+
+    def save(self, dbDirPath, chrom):
+        indexPath = get_index_path(dbDirPath, chrom)
+        os.makedirs(os.path.dirname(indexPath), exist_ok=True)
+        self.data.tofile(f"{indexPath}.tmp")
+        os.replace(f"{indexPath}.tmp", indexPath)
+
+    def locate(self, chromStart):
+        """Finds (row number, byte offset) of the block where the first oligo
+        starting at or after chromStart is found."""
+        blocki = np.searchsorted(self.data[:, 1], chromStart, side="left") - 1
+        blocki = max(0, blocki)
+        return (int(self.data[blocki, 0]), int(self.data[blocki, 2]))
+
+
+def write_index(dbDirPath, chrom, step=INDEX_STEP):
+    """Builds and persists the sparse index of a chromosome file."""
+    chromIndex = ChromosomeIndex.build(os.path.join(dbDirPath, chrom), step)
+    chromIndex.save(dbDirPath, chrom)
+    return chromIndex
@@ -0,0 +1,508 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+import csv
+import hashlib
+import heapq
+from ifpd import bioext, columnar, query, stats
+import io
+import itertools
+from joblib import Parallel, delayed  # type: ignore
+import numpy as np  # type: ignore
+import os
+import pandas as pd  # type: ignore
+import shutil
+
+TMP_DIR = ".tmp"
+BUFFER_SIZE = 2000000
+MERGE_FANIN = 64
+WRITE_CHUNKSIZE = 100000
+CHECK_BLOCKSIZE = 2**26
+CHROM_SECTION = "CHROM:"
+
+
+def _read_chromosome_lines(lines, ncols):
+    """Parses lines of a chromosome file into a pd.DataFrame."""
+    chunk = pd.read_csv(
+        io.StringIO("".join(lines)) if isinstance(lines, list) else lines,
+        sep="\t",
+        header=None,
+        names=range(ncols),
+        usecols=range(ncols),
+        dtype={i: [np.int64, np.int64, str][i] for i in range(ncols)},
+        keep_default_na=False,
+        quoting=csv.QUOTE_NONE,
+    )
+    chunk.columns = bioext.UCSCbed.FIELD_NAMES[1 : (ncols + 1)]
+    return chunk
+
+
+def _get_line_start(line):
+    return int(line.split("\t", 1)[0])
+
+
+class ChromosomeWriter(object):
+    """Writes a chromosome one sorted block of oligos at a time, to the
+    tab-separated chromosome file, its binary columnar copy, and its sparse index.
+    The oligo statistics are collected while writing."""
+
+    def __init__(self, dbDirPath, chrom, indexStep=columnar.INDEX_STEP):
+        super(ChromosomeWriter, self).__init__()
+        self.dbDirPath = dbDirPath
+        self.chrom = chrom
+        self.indexStep = indexStep
+        self.OH = open(os.path.join(dbDirPath, chrom), "w+")
+        self.columns = columnar.ChromosomeColumnsWriter(dbDirPath, chrom)
+        self.indexData = []
+        self.nrows = 0
+        self.nbytes = 0
+        self.md5 = hashlib.md5()
+        self.stats = stats.OligoStats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, chromStart, chromEnd, sequences=None, extra=None):
+        """Appends a block of oligos. Without sequences, only the positions are
+        written to the chromosome file. Extra fields, if any, are written after
+        them to the chromosome file only."""
+        chromStart = np.asarray(chromStart, dtype=np.int64)
+        chromEnd = np.asarray(chromEnd, dtype=np.int64)
+        if sequences is None:
+            lines = [
+                f"{start}\t{end}\n"
+                for start, end in zip(chromStart.tolist(), chromEnd.tolist())
+            ]
+            sequences = [""] * len(lines)
+        else:
+            lines = [
+                f"{start}\t{end}\t{sequence}\n"
+                for start, end, sequence in zip(
+                    chromStart.tolist(), chromEnd.tolist(), sequences
+                )
+            ]
+        if extra is not None:
+            lines = [
+                f"{line[:-1]}\t{fields}\n" if fields else line
+                for line, fields in zip(lines, extra)
+            ]
+
+        lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+        offsets = np.cumsum(lengths) - lengths + self.nbytes
+        rows = np.arange(self.nrows, self.nrows + len(lines))
+        indexed = 0 == rows % self.indexStep
+        self.indexData.extend(
+            zip(
+                rows[indexed].tolist(),
+                chromStart[indexed].tolist(),
+                offsets[indexed].tolist(),
+            )
+        )
+
+        block = "".join(lines)
+        self.OH.write(block)
+        self.md5.update(block.encode("ascii"))
+        self.columns.append(chromStart, chromEnd, sequences)
+        self.stats.update(chromStart, chromEnd)
+        self.nrows += len(lines)
+        self.nbytes += int(lengths.sum())
+
+    def append_frame(self, chromData):
+        """Appends a pd.DataFrame with chromStart, chromEnd, and (optionally)
+        sequence as its first columns, and (optionally) an extra column."""
+        extra = None
+        if bioext.UCSCbed.EXTRA_FIELD in chromData.columns:
+            extra = chromData[bioext.UCSCbed.EXTRA_FIELD].values
+            chromData = chromData.drop(bioext.UCSCbed.EXTRA_FIELD, axis=1)
+        self.append(
+            chromData.iloc[:, 0].values,
+            chromData.iloc[:, 1].values,
+            chromData.iloc[:, 2].values if 3 <= chromData.shape[1] else None,
+            extra,
+        )
+
+    def abort(self):
+        self.OH.close()
+        self.columns.abort()
+
+    def close(self):
+        """Closes the chromosome file first, so that its binary copy and index are
+        never older than it."""
+        self.OH.close()
+        self.columns.close()
+        columnar.ChromosomeIndex(self.indexData).save(self.dbDirPath, self.chrom)
+        self.stats.checksum = self.md5.hexdigest()
+
+
+class ChromosomeBuffer(object):
+    """Collects the oligos of a chromosome in memory, in unsorted blocks.
+
+    When spilled, the collected oligos are sorted and written to a temporary run
+    file. Run files are merged with an external merge sort when the sorted oligos
+    are read. At most MERGE_FANIN run files are open at the same time. With
+    extraFields, oligos have an additional extra column, which is always the
+    last field of run file lines.
+    """
+
+    def __init__(self, chrom, tmpDirPath, ncols=3, extraFields=False):
+        super(ChromosomeBuffer, self).__init__()
+        self.chrom = chrom
+        self.tmpDirPath = tmpDirPath
+        self.ncols = ncols
+        self.extraFields = extraFields
+        self.blocks = []
+        self.size = 0
+        self.count = 0
+        self.runs = []
+        self.nruns = 0
+
+    def __mk_run_path(self):
+        self.nruns += 1
+        return os.path.join(self.tmpDirPath, f"{self.chrom}.{self.nruns}.tsv")
+
+    def append(self, chromData):
+        self.blocks.append(chromData)
+        self.size += chromData.shape[0]
+        self.count += chromData.shape[0]
+
+    def sort(self):
+        """Sorts the oligos in memory, by start position."""
+        if 0 == len(self.blocks):
+            columns = bioext.UCSCbed.FIELD_NAMES[1 : self.ncols + 1]
+            if self.extraFields:
+                columns = columns + [bioext.UCSCbed.EXTRA_FIELD]
+            return pd.DataFrame(columns=columns)
+        chromData = pd.concat(self.blocks, ignore_index=True)
+        self.blocks = [chromData.sort_values("chromStart", kind="mergesort")]
+        return self.blocks[0]
+
+    def spill(self):
+        """Writes the sorted oligos in memory to a new run file."""
+        if 0 == self.size:
+            return
+        runPath = self.__mk_run_path()
+        chromData = self.sort()
+        if self.extraFields:
+            with open(runPath, "w+") as OH:
+                OH.writelines(
+                    "\t".join(map(str, row)) + "\n"
+                    for row in zip(*(chromData[c].tolist() for c in chromData.columns))
+                )
+        else:
+            chromData.to_csv(runPath, sep="\t", header=False, index=False)
+        self.runs.append(runPath)
+        self.blocks = []
+        self.size = 0
+
+    def __read_run_lines(self, lines):
+        if not self.extraFields:
+            return _read_chromosome_lines(lines, self.ncols)
+        fields = [line[:-1].split("\t", self.ncols) for line in lines]
+        chromData = _read_chromosome_lines(
+            ["\t".join(row[: self.ncols]) + "\n" for row in fields], self.ncols
+        )
+        chromData[bioext.UCSCbed.EXTRA_FIELD] = [row[self.ncols] for row in fields]
+        return chromData
+
+    def __merge_runs(self, runs, OH):
+        handles = [open(runPath, "r") for runPath in runs]
+        try:
+            OH.writelines(heapq.merge(*handles, key=_get_line_start))
+        finally:
+            for IH in handles:
+                IH.close()
+        for runPath in runs:
+            os.remove(runPath)
+
+    def __reduce_runs(self):
+        """Merges run files in groups, until MERGE_FANIN or less are left."""
+        while MERGE_FANIN < len(self.runs):
+            runs = []
+            for i in range(0, len(self.runs), MERGE_FANIN):
+                runPath = self.__mk_run_path()
+                with open(runPath, "w+") as OH:
+                    self.__merge_runs(self.runs[i : (i + MERGE_FANIN)], OH)
+                runs.append(runPath)
+            self.runs = runs
+
+    def sorted_blocks(self, chunksize=WRITE_CHUNKSIZE):
+        """Yields the sorted oligos, in blocks of at most chunksize oligos."""
+        if 0 == len(self.runs):
+            chromData = self.sort()
+            for i in range(0, chromData.shape[0], chunksize):
+                yield chromData.iloc[i : (i + chunksize)]
+            self.blocks = []
+            self.size = 0
+            return
+
+        self.spill()
+        self.__reduce_runs()
+        handles = [open(runPath, "r") for runPath in self.runs]
+        try:
+            merged = heapq.merge(*handles, key=_get_line_start)
+            while True:
+                lines = list(itertools.islice(merged, chunksize))
+                if 0 == len(lines):
+                    break
+                yield self.__read_run_lines(lines)
+        finally:
+            for IH in handles:
+                IH.close()
+        for runPath in self.runs:
+            os.remove(runPath)
+        self.runs = []
+
+
+def write_chromosome_buffer(dbDirPath, chromBuffer, chunksize=WRITE_CHUNKSIZE):
+    """Sorts and writes the oligos of a chromosome buffer, returning their
+    statistics."""
+    with ChromosomeWriter(dbDirPath, chromBuffer.chrom) as writer:
+        for chromData in chromBuffer.sorted_blocks(chunksize):
+            writer.append_frame(chromData)
+    return writer.stats
+
+
+class DatabaseBuilder(object):
+    """Builds a database from blocks of oligos, as read by bioext.UCSCbed.chunks.
+
+    Oligos are collected in one buffer per chromosome, and at most bufferSize
+    oligos are kept in memory: when the limit is exceeded, the largest buffer is
+    spilled to disk. Chromosomes are sorted and written when the database is
+    written, collecting the oligo statistics.
+    """
+
+    def __init__(self, dbDirPath, bufferSize=BUFFER_SIZE):
+        super(DatabaseBuilder, self).__init__()
+        self.dirPath = dbDirPath
+        self.tmpDirPath = os.path.join(dbDirPath, TMP_DIR)
+        os.makedirs(self.tmpDirPath, exist_ok=True)
+        self.bufferSize = bufferSize
+        self.buffers = {}
+        self.size = 0
+        self.count = 0
+
+    def append(self, chunk):
+        """Adds a block of oligos, with a chrom column, and (optionally) an extra
+        column."""
+        extraFields = bioext.UCSCbed.EXTRA_FIELD in chunk.columns
+        ncols = chunk.shape[1] - 1 - extraFields
+        for chrom, chromData in chunk.groupby("chrom", sort=False):
+            if chrom not in self.buffers:
+                self.buffers[chrom] = ChromosomeBuffer(
+                    chrom, self.tmpDirPath, ncols, extraFields
+                )
+            self.buffers[chrom].append(chromData.drop("chrom", axis=1))
+        self.size += chunk.shape[0]
+        self.count += chunk.shape[0]
+
+        while self.bufferSize < self.size:
+            largest = max(self.buffers.values(), key=lambda b: b.size)
+            self.size -= largest.size
+            largest.spill()
+
+    def write_chromosome(self, chrom, chunksize=WRITE_CHUNKSIZE):
+        """Sorts and writes a chromosome, returning its oligo statistics."""
+        chromBuffer = self.buffers.pop(chrom)
+        self.size -= chromBuffer.size
+        return write_chromosome_buffer(self.dirPath, chromBuffer, chunksize)
+
+    def write(self, chunksize=WRITE_CHUNKSIZE, threads=1):
+        """Writes all chromosomes, returning a dictionary with the oligo
+        statistics of each of them. With threads > 1, chromosomes are sorted and
+        written in a process pool, starting from the largest ones."""
+        chromList = sorted(
+            self.buffers.keys(),
+            key=lambda chrom: self.buffers[chrom].count,
+            reverse=True,
+        )
+        if 1 == threads:
+            statsList = [self.write_chromosome(chrom, chunksize) for chrom in chromList]
+        else:
+            statsList = Parallel(n_jobs=threads, verbose=1)(
+                delayed(write_chromosome_buffer)(
+                    self.dirPath, self.buffers.pop(chrom), chunksize
+                )
+                for chrom in chromList
+            )
+            self.size = 0
+        shutil.rmtree(self.tmpDirPath)
+        return dict(sorted(zip(chromList, statsList), key=lambda x: x[0]))
+
+
+def get_chromosome_section(chrom):
+    """Name of the .config section with the statistics of a chromosome."""
+    return f"{CHROM_SECTION}{chrom}"
+
+
+def stats_to_config(oligoStats):
+    """Formats the statistics of a chromosome as a .config section."""
+    section = {
+        "count": str(oligoStats.count),
+        "min_length": str(oligoStats.length_range[0]),
+        "max_length": str(oligoStats.length_range[1]),
+        "overlaps": str(oligoStats.overlaps),
+    }
+    if np.isfinite(oligoStats.min_dist):
+        section["min_dist"] = str(oligoStats.min_dist)
+    if oligoStats.checksum is not None:
+        section["md5"] = oligoStats.checksum
+    return section
+
+
+def stats_from_config(section):
+    """Reads the statistics of a chromosome from a .config section."""
+    oligoStats = stats.OligoStats()
+    oligoStats.count = section.getint("count")
+    oligoStats.length_range = [
+        section.getint("min_length"),
+        section.getint("max_length"),
+    ]
+    oligoStats.overlaps = section.getboolean("overlaps")
+    if "min_dist" in section:
+        oligoStats.min_dist = section.getint("min_dist")
+    oligoStats.checksum = section.get("md5", None)
+    return oligoStats
+
+
+def get_file_md5(path, blocksize=CHECK_BLOCKSIZE):
+    md5 = hashlib.md5()
+    with open(path, "rb") as IH:
+        for block in iter(lambda: IH.read(blocksize), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def check_chromosome_stats(oligoDB, chrom, oligoStats):
+    """Checks the statistics of a chromosome against the database .config,
+    including the persisted statistics of the chromosome, if any."""
+    assert 0 != oligoStats.count, f'found empty chromosome: "{chrom}"'
+    assert oligoStats.min_dist >= oligoDB.get_oligo_min_dist(), "".join(
+        [
+            f'oligo min distance does not match in "{chrom}": ',
+            f"{oligoStats.min_dist} instead of {oligoDB.get_oligo_min_dist()}.",
+        ]
+    )
+    oligoLengthRange = oligoDB.get_oligo_length_range()
+    assert (
+        oligoStats.length_range[0] >= oligoLengthRange[0]
+    ), f'oligo too small for ".config" in "{chrom}"'
+    assert (
+        oligoStats.length_range[1] <= oligoLengthRange[1]
+    ), f'oligo too big for ".config" in "{chrom}"'
+    assert (
+        oligoDB.has_overlaps() or not oligoStats.overlaps
+    ), f'overlaps status mismatch in "{chrom}"'
+
+    section = get_chromosome_section(chrom)
+    if section not in oligoDB.config:
+        return
+    persisted = stats_from_config(oligoDB.config[section])
+    for attr in ["count", "min_dist", "length_range", "overlaps", "checksum"]:
+        if "checksum" == attr and persisted.checksum is None:
+            continue
+        assert getattr(persisted, attr) == getattr(oligoStats, attr), "".join(
+            [
+                f'{attr} does not match ".config" in "{chrom}": ',
+                f"{getattr(oligoStats, attr)} instead of {getattr(persisted, attr)}.",
+            ]
+        )
+
+
+def check_chromosome(dbDirPath, chrom, blocksize=CHECK_BLOCKSIZE):
+    """Checks a chromosome file, reading it in blocks of about blocksize bytes.
+    The binary columnar copy, if up-to-date, must match the chromosome file.
+    Returns the statistics of the chromosome."""
+    oligoDB = query.OligoDatabase(dbDirPath)
+    chromPath = os.path.join(dbDirPath, chrom)
+    columns = None
+    if oligoDB.has_columns(chrom):
+        columns = columnar.ChromosomeColumns(dbDirPath, chrom)
+
+    assert 0 != os.path.getsize(
+        chromPath
+    ), f'found empty chromosome file: "{chromPath}"'
+    with open(chromPath, "r") as IH:
+        ncols = len(IH.readline().split("\t"))
+    assert 2 <= ncols, f'missing columns in "{chromPath}"'
+    if oligoDB.has_sequences():
+        assert 3 <= ncols, f'missing sequence columns in "{chromPath}"'
+    ncols = min(3, ncols)
+
+    oligoStats = stats.OligoStats()
+    md5 = hashlib.md5()
+    lastStart, lastEnd = -np.inf, -np.inf
+    rowi = 0
+    with open(chromPath, "rb") as IH:
+        for lines in iter(lambda: IH.readlines(blocksize), []):
+            block = b"".join(lines)
+            md5.update(block)
+            try:
+                chromData = _read_chromosome_lines(io.BytesIO(block), ncols)
+            except (ValueError, pd.errors.ParserError) as e:
+                assert False, f'malformed line in "{chromPath}" after row {rowi}: {e}'
+
+            chromStart = chromData["chromStart"].values
+            chromEnd = chromData["chromEnd"].values
+            assert all(
+                np.diff(chromStart, prepend=lastStart) > 0
+            ), f'found unsorted file: "{chromPath}"'
+            assert all(
+                np.diff(chromEnd, prepend=lastEnd) >= 0
+            ), f'found unsorted file: "{chromPath}"'
+            assert all(
+                chromEnd > chromStart
+            ), f'found oligo ending before it starts in "{chromPath}"'
+            lastStart, lastEnd = chromStart[-1], chromEnd[-1]
+
+            if columns is not None:
+                stop = rowi + chromData.shape[0]
+                assert (
+                    np.array_equal(columns.chromStart[rowi:stop], chromStart)
+                    and np.array_equal(columns.chromEnd[rowi:stop], chromEnd)
+                    and (
+                        2 == ncols
+                        or columns.get_sequences(rowi, stop)
+                        == chromData["name"].tolist()
+                    )
+                ), f'binary copy does not match "{chromPath}" after row {rowi}'
+
+            oligoStats.update(chromStart, chromEnd)
+            rowi += chromData.shape[0]
+
+    if columns is not None:
+        assert len(columns) == rowi, f'binary copy does not match "{chromPath}"'
+    oligoStats.checksum = md5.hexdigest()
+    check_chromosome_stats(oligoDB, chrom, oligoStats)
+    return oligoStats
+
+
+def check_chromosome_quick(dbDirPath, chrom):
+    """Checks the checksum of a chromosome file and the length of its binary
+    copy against the statistics persisted in the database .config, which are
+    checked and returned."""
+    oligoDB = query.OligoDatabase(dbDirPath)
+    section = get_chromosome_section(chrom)
+    assert section in oligoDB.config, "".join(
+        [f'no statistics found for "{chrom}" in ".config". ', "Run a full check."]
+    )
+    oligoStats = stats_from_config(oligoDB.config[section])
+    assert oligoStats.checksum is not None, "".join(
+        [f'no checksum found for "{chrom}" in ".config". ', "Run a full check."]
+    )
+    assert oligoStats.checksum == get_file_md5(
+        os.path.join(dbDirPath, chrom)
+    ), f'checksum mismatch for "{chrom}"'
+    if oligoDB.has_columns(chrom):
+        assert oligoStats.count == len(
+            columnar.ChromosomeColumns(dbDirPath, chrom)
+        ), f'binary copy does not match "{chrom}"'
+    check_chromosome_stats(oligoDB, chrom, oligoStats)
+    return oligoStats
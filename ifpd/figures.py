@@ -0,0 +1,410 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+from ifpd import stats
+import matplotlib as mpl  # type: ignore
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # type: ignore
+from matplotlib.collections import LineCollection, PolyCollection  # type: ignore
+from matplotlib.figure import Figure  # type: ignore
+import numpy as np  # type: ignore
+from PIL import Image  # type: ignore
+import threading
+
+PNG_COMPRESS_LEVEL = 3
+
+_local = threading.local()
+
+
+def get_template(templateClass):
+    """Instance of a figure template, built once per thread and then reused."""
+    if not hasattr(_local, "templates"):
+        _local.templates = {}
+    if templateClass not in _local.templates:
+        _local.templates[templateClass] = templateClass()
+    return _local.templates[templateClass]
+
+
+def autoscale(ax, x, y):
+    """Sets the axis limits to fit the given points, with the default margins.
+    Needed as artists updated in place (e.g., collections) are not accounted
+    for by autoscaling. Axes with fixed limits are left untouched."""
+    points = np.column_stack([np.ravel(x), np.ravel(y)]).astype("float")
+    if 0 == points.shape[0]:
+        ax.set_xlim(0, 1, auto=None)
+        ax.set_ylim(0, 1, auto=None)
+        return
+    ax.ignore_existing_data_limits = True
+    ax.update_datalim(points)
+    ax.autoscale_view()
+
+
+def mk_segments(x0, y0, x1, y1):
+    """Builds the (n, 2, 2) array of n line segments, as used by
+    LineCollection, from the coordinates of their extremities."""
+    x0, y0, x1, y1 = np.broadcast_arrays(x0, y0, x1, y1)
+    return np.stack([np.column_stack([x0, y0]), np.column_stack([x1, y1])], axis=1)
+
+
+def mk_rectangles(x, width, y, height):
+    """Builds the (n, 4, 2) array of vertices of n rectangles, as used by
+    PolyCollection."""
+    x, width, y, height = np.broadcast_arrays(x, width, y, height)
+    return np.stack(
+        [
+            np.column_stack([x, y]),
+            np.column_stack([x + width, y]),
+            np.column_stack([x + width, y + height]),
+            np.column_stack([x, y + height]),
+        ],
+        axis=1,
+    )
+
+
+class FigureTemplate(object):
+    """Figure with preallocated artists, which are updated with the data of each
+    plot before saving it. This avoids building a new figure, and one artist per
+    oligo or probe, for every plot. Figures are drawn directly on an Agg canvas,
+    without going through pyplot.
+
+    Args:
+            figure (matplotlib.figure.Figure): template figure.
+            ax (matplotlib.axes.Axes): template axes.
+            title (matplotlib.text.Text): figure title.
+            FIGSIZE (tuple): figure size, in inches. Default from rcParams.
+            TIGHT (bool): whether to crop the saved figure to its content.
+    """
+
+    FIGSIZE = None
+    TIGHT = False
+
+    def __init__(self):
+        super(FigureTemplate, self).__init__()
+        self.figure = Figure(figsize=self.FIGSIZE)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.title = self.figure.suptitle("")
+
+    def crop_tight(self, image):
+        """Crops the drawn figure to its tight bounding box, as done by savefig
+        with bbox_inches="tight", but without drawing the figure again. Padding
+        outside of the canvas is filled with the figure background.
+
+        Returns:
+                np.ndarray: cropped image, or None if the figure content does not
+                fit in the canvas, and the figure must be drawn again.
+        """
+        bbox = self.figure.get_tightbbox(self.figure.canvas.get_renderer())
+        if not self.figure.bbox_inches.contains(bbox.x0, bbox.y0):
+            return None
+        if not self.figure.bbox_inches.contains(bbox.x1, bbox.y1):
+            return None
+
+        bbox = bbox.padded(mpl.rcParams["savefig.pad_inches"])
+        dpi = self.figure.dpi
+        height, width = image.shape[:2]
+        x0 = int(np.floor(bbox.x0 * dpi))
+        x1 = int(np.ceil(bbox.x1 * dpi))
+        y0 = int(np.floor(height - bbox.y1 * dpi))
+        y1 = int(np.ceil(height - bbox.y0 * dpi))
+        image = image[max(0, y0) : min(height, y1), max(0, x0) : min(width, x1)]
+        return np.pad(
+            image,
+            [
+                (max(0, -y0), max(0, y1 - height)),
+                (max(0, -x0), max(0, x1 - width)),
+                (0, 0),
+            ],
+            constant_values=255,
+        )
+
+    def save(self, path):
+        """Draws the figure once, and writes it as an RGB PNG image."""
+        canvas = self.figure.canvas
+        canvas.draw()
+        image = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        if self.TIGHT:
+            image = self.crop_tight(image)
+            if image is None:
+                self.figure.savefig(
+                    path,
+                    format="png",
+                    bbox_inches="tight",
+                    pil_kwargs={"compress_level": PNG_COMPRESS_LEVEL},
+                )
+                return
+        Image.fromarray(image).save(
+            path, format="png", compress_level=PNG_COMPRESS_LEVEL
+        )
+
+
+class ProbeWindowFigure(FigureTemplate):
+    """Probe and its center, within the queried window."""
+
+    TIGHT = True
+
+    def __init__(self):
+        super(ProbeWindowFigure, self).__init__()
+        (self.genome,) = self.ax.plot([], [], "k", linewidth=4.0, label="Genome")
+        (self.center,) = self.ax.plot([], [], "r--", label="Window center")
+        (self.probe,) = self.ax.plot([], [], "c-", linewidth=4.0, label="Probe")
+        (self.probeCenter,) = self.ax.plot([], [], "c--", label="Probe center")
+        self.ax.axes.get_yaxis().set_visible(False)
+        self.ax.set_xlabel("genomic coordinate [nt]")
+        self.ax.legend(fontsize="small", loc="best")
+
+    def plot(self, path, region, chromStart, chromEnd):
+        chrom, start, stop = region
+        windowCenter = start + (stop - start) / 2.0
+        probeCenter = chromStart + (chromEnd - chromStart) / 2.0
+        self.genome.set_data([start, stop], [0, 0])
+        self.center.set_data([windowCenter, windowCenter], [-1, 1])
+        self.probe.set_data([chromStart, chromEnd], [0, 0])
+        self.probeCenter.set_data([probeCenter, probeCenter], [-1, 1])
+        self.title.set_text("%s:%d-%.0f" % (chrom, start, stop))
+        autoscale(
+            self.ax,
+            [start, stop, chromStart, chromEnd],
+            [-1, 1, -1, 1],
+        )
+        self.save(path)
+
+
+class ProbeOligoFigure(FigureTemplate):
+    """Oligos of a probe, and their centers, drawn as two line collections."""
+
+    FIGSIZE = (20, 5)
+    TIGHT = True
+
+    def __init__(self):
+        super(ProbeOligoFigure, self).__init__()
+        (self.genome,) = self.ax.plot([], [], "k", linewidth=4.0, label="Genome")
+        self.oligos = LineCollection([], colors="c", linewidths=2.0, label="Oligo")
+        self.centers = LineCollection(
+            [], colors="c", linestyles=":", label="Oligo center"
+        )
+        self.ax.add_collection(self.oligos)
+        self.ax.add_collection(self.centers)
+        self.ax.axes.get_yaxis().set_visible(False)
+        self.ax.set_ylim((-0.5, 0.5))
+        self.ax.set_xlabel("genomic coordinate [nt]")
+        self.ax.legend(
+            handles=[self.genome, self.oligos, self.centers],
+            fontsize="small",
+            loc="best",
+        )
+
+    def plot(self, path, chrom, oligoStart, oligoEnd):
+        chromStart = oligoStart.min()
+        chromEnd = oligoEnd.max()
+        midpoints = (oligoStart + oligoEnd) / 2.0
+        self.genome.set_data([chromStart, chromEnd], [0, 0])
+        self.oligos.set_segments(mk_segments(oligoStart, 0, oligoEnd, 0))
+        self.centers.set_segments(mk_segments(midpoints, -0.1, midpoints, 0.1))
+        self.ax.xaxis.set_ticks(
+            list(
+                range(chromStart, chromEnd, max(1, int((chromEnd - chromStart) / 5.0)))
+            )
+        )
+        self.title.set_text(f"{chrom}:{chromStart}-{chromEnd}")
+        autoscale(self.ax, [chromStart, chromEnd], [0, 0])
+        self.save(path)
+
+
+class PositionFigure(FigureTemplate):
+    """Positions of consecutive items (oligos or probes), compared to a
+    homogeneous distribution."""
+
+    XLABEL = "oligo number"
+    LABEL = "Oligo"
+
+    def __init__(self):
+        super(PositionFigure, self).__init__()
+        (self.homogeneous,) = self.ax.plot(
+            [], [], "k-", label="Homogeneous distribution"
+        )
+        (self.positions,) = self.ax.plot([], [], "r.", label=self.LABEL)
+        self.ax.set_xlabel(self.XLABEL)
+        self.ax.set_ylabel("genomic coordinate [nt]")
+        self.legend = self.ax.legend(fontsize="small", loc="best")
+
+    def plot(self, path, title, positions, first, last):
+        n = positions.shape[0]
+        self.homogeneous.set_data([0, n - 1], [first, last])
+        self.positions.set_data(np.arange(n), positions)
+        self.title.set_text(title)
+        autoscale(self.ax, [0, n - 1, *np.arange(n)], [first, last, *positions])
+        self.save(path)
+
+
+class ProbeOligoPositionFigure(PositionFigure):
+    """Oligo start positions in a probe."""
+
+
+class ProbeSetPositionFigure(PositionFigure):
+    """Probe midpoints in a probe set."""
+
+    TIGHT = True
+    XLABEL = "probe number"
+    LABEL = "Probe"
+
+    def plot(self, path, title, positions, first, last):
+        visible = 1 < positions.shape[0]
+        self.homogeneous.set_visible(visible)
+        self.positions.set_visible(visible)
+        self.legend.set_visible(visible)
+        if not visible:
+            self.title.set_text("")
+            autoscale(self.ax, [], [])
+            self.save(path)
+            return
+
+        self.ax.set_xlim((-1, positions.shape[0]))
+        super(ProbeSetPositionFigure, self).plot(path, title, positions, first, last)
+
+
+class DistanceFigure(FigureTemplate):
+    """Histogram and density of the distances between consecutive items
+    (oligos or probes). The histogram bars are preallocated, and only their
+    position and size are updated."""
+
+    XLABEL = "Distance between consecutive oligos [nt]"
+    NBINS = 10
+
+    def __init__(self):
+        super(DistanceFigure, self).__init__()
+        self.bars = self.ax.bar(
+            np.arange(self.NBINS),
+            np.zeros(self.NBINS),
+            width=1,
+            align="edge",
+            facecolor="green",
+            alpha=0.5,
+        ).patches
+        (self.density,) = self.ax.plot([], [], "b--", label="Density distribution")
+        self.ax.set_xlabel(self.XLABEL)
+        self.ax.set_ylabel("Density")
+        self.legend = self.ax.legend(fontsize="small", loc="best")
+
+    def plot(self, path, title, diffs):
+        visible = 0 < diffs.shape[0]
+        for artist in [*self.bars, self.density, self.legend]:
+            artist.set_visible(visible)
+        if not visible:
+            self.title.set_text("")
+            autoscale(self.ax, [], [])
+            self.save(path)
+            return
+
+        counts, edges = np.histogram(diffs, bins=self.NBINS, density=True)
+        for bar, x, width, height in zip(self.bars, edges[:-1], np.diff(edges), counts):
+            bar.set_x(x)
+            bar.set_width(width)
+            bar.set_height(height)
+        density = stats.calc_density(diffs, alpha=0.5)
+        self.density.set_data(density["x"], density["y"])
+        self.title.set_text(title)
+        autoscale(
+            self.ax,
+            [*edges, *density["x"]],
+            [0, *counts, *density["y"]],
+        )
+        self.save(path)
+
+
+class ProbeDistanceFigure(DistanceFigure):
+    """Distances between consecutive oligos in a probe."""
+
+
+class ProbeSetDistanceFigure(DistanceFigure):
+    """Distances between consecutive probes in a probe set."""
+
+    TIGHT = True
+    XLABEL = "Distance between consecutive probes [nt]"
+
+
+class ProbeSetWindowsFigure(FigureTemplate):
+    """Windows of a probe set, with their probes, within the queried region.
+    Window borders, empty windows, and probes are drawn as collections, and
+    window numbers reuse a pool of text artists."""
+
+    FIGSIZE = (20, 5)
+    TIGHT = True
+    MESSAGE = "Empty windows are reported in red."
+
+    def __init__(self):
+        super(ProbeSetWindowsFigure, self).__init__()
+        self.borders = LineCollection([], colors="k")
+        self.emptyWindows = PolyCollection([], facecolors="r", edgecolors="r")
+        self.setBorders = LineCollection([], colors="k", linestyles=":")
+        self.outside = PolyCollection([], facecolors="k", edgecolors="k")
+        for collection in [
+            self.borders,
+            self.emptyWindows,
+            self.setBorders,
+            self.outside,
+        ]:
+            self.ax.add_collection(collection)
+        self.labels = []
+        (self.genome,) = self.ax.plot([], [], "k", linewidth=4.0, label="Genome")
+        self.probes = LineCollection([], colors="c", linewidths=2.0)
+        self.centers = LineCollection([], colors="c", linestyles=":", linewidths=2.0)
+        self.ax.add_collection(self.probes)
+        self.ax.add_collection(self.centers)
+        self.ax.axes.get_yaxis().set_visible(False)
+        self.ax.set_ylim((-1, 1))
+        self.ax.set_xlabel("genomic coordinate [nt]")
+
+    def set_labels(self, x, labels):
+        while len(self.labels) < len(labels):
+            self.labels.append(self.ax.text(0, 0.5, ""))
+        for text in self.labels[len(labels) :]:
+            text.set_visible(False)
+        for text, xi, label in zip(self.labels, x, labels):
+            text.set_position((xi, 0.5))
+            text.set_text(label)
+            text.set_visible(True)
+
+    def plot(
+        self, path, region, windowStart, windowEnd, hasProbe, probeStart, probeEnd
+    ):
+        chrom, start, stop = region
+        setStart = windowStart[0]
+        setEnd = windowEnd[-1]
+        self.borders.set_segments(mk_segments(windowStart, -1, windowStart, 1))
+        self.emptyWindows.set_verts(
+            mk_rectangles(
+                windowStart[~hasProbe],
+                windowEnd[~hasProbe] - windowStart[~hasProbe],
+                -1,
+                2,
+            )
+        )
+        self.set_labels(
+            (windowStart + windowEnd) / 2,
+            [f"{wi + 1}" for wi in range(windowStart.shape[0])],
+        )
+        self.setBorders.set_segments(
+            mk_segments([setStart, setEnd], -1, [setStart, setEnd], 1)
+        )
+        self.outside.set_verts(
+            mk_rectangles([start, setEnd], [setStart - start, stop - setEnd], -1, 2)
+        )
+        self.genome.set_data([start, stop], [0, 0])
+        midpoints = (probeStart + probeEnd) / 2
+        self.probes.set_segments(mk_segments(probeStart, 0, probeEnd, 0))
+        self.centers.set_segments(mk_segments(midpoints, -0.1, midpoints, 0.1))
+        self.title.set_text(
+            "".join(
+                [
+                    f"Region: {chrom}:{start}-{stop}",
+                    " & Probe set: ",
+                    f"{chrom}:{setStart}-{setEnd}\n",
+                    self.MESSAGE,
+                ]
+            )
+        )
+        x = [start, stop, *windowStart, *windowEnd]
+        autoscale(self.ax, x, np.zeros(len(x)))
+        self.save(path)
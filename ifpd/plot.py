@@ -0,0 +1,126 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+import configparser
+from ifpd import query
+from joblib import Parallel, delayed  # type: ignore
+import os
+import shutil
+import tempfile
+
+PROBE_PLOTS = ["window.png", "probe.png", "oligo.png", "distance.png"]
+PROBE_SET_PLOTS = ["windows.png", "distr.png", "distance.png"]
+
+
+def get_plot_names(dirPath):
+    """Names of the plots of an exported candidate, probe set, or probe set
+    probe, depending on the folder name."""
+    dirName = os.path.basename(os.path.normpath(dirPath))
+    if dirName.startswith("probe_set_"):
+        return PROBE_SET_PLOTS
+    if dirName.startswith("candidate_") or dirName.startswith("probe_"):
+        return PROBE_PLOTS
+    return []
+
+
+def has_plots(dirPath):
+    return all(
+        os.path.isfile(os.path.join(dirPath, name)) for name in get_plot_names(dirPath)
+    )
+
+
+def plot_probe(dirPath, outputDir):
+    dirName = os.path.basename(os.path.normpath(dirPath))
+    config = configparser.ConfigParser()
+    config.read(os.path.join(dirPath, f"{dirName}.config"))
+    region = (
+        config["REGION"]["chrom"],
+        int(float(config["REGION"]["chromStart"])),
+        int(float(config["REGION"]["chromEnd"])),
+    )
+    probe = query.OligoProbe.from_bed(os.path.join(dirPath, f"{dirName}.bed"))
+    probe.plot(outputDir, region)
+
+
+def plot_probe_set(dirPath, outputDir):
+    window_set, region = query.GenomicWindowList.from_export(dirPath)
+    window_set.plot(outputDir, region)
+
+
+def render(dirPath, force=False):
+    """Renders the plots of an exported candidate, probe set, or probe set
+    probe, from its data files. Plots are drawn in a temporary folder and then
+    moved in place, so that incomplete images are never found.
+
+    Args:
+            dirPath (string): path to the exported folder.
+            force (bool): render plots even if already present.
+
+    Returns:
+            bool: whether plots were rendered.
+    """
+    assert os.path.isdir(dirPath), f'folder not found: "{dirPath}"'
+    names = get_plot_names(dirPath)
+    assert 0 < len(names), f'no plots for folder "{dirPath}"'
+    if not force and has_plots(dirPath):
+        return False
+
+    tmpDir = tempfile.mkdtemp(prefix=".plots.", dir=dirPath)
+    try:
+        if names is PROBE_SET_PLOTS:
+            plot_probe_set(dirPath, tmpDir)
+        else:
+            plot_probe(dirPath, tmpDir)
+        for name in names:
+            os.replace(os.path.join(tmpDir, name), os.path.join(dirPath, name))
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors=True)
+    return True
+
+
+def find_plot_dirs(outdir):
+    """Lists the exported candidate, probe set, and probe set probe folders in a
+    query output folder."""
+    dirList = []
+    for item in sorted(os.scandir(outdir), key=lambda x: x.name):
+        if not item.is_dir():
+            continue
+        if item.name.startswith("candidate_"):
+            dirList.append(item.path)
+        elif item.name.startswith("probe_set_"):
+            dirList.append(item.path)
+            for probe in sorted(os.scandir(item.path), key=lambda x: x.name):
+                if probe.is_dir() and probe.name.startswith("probe_"):
+                    dirList.append(probe.path)
+    return dirList
+
+
+def render_all(outdir, threads=1, progress=None):
+    """Renders the plots of every exported folder of a query, in parallel
+    processes.
+
+    Args:
+            outdir (string): path to the query output folder.
+            threads (int): number of processes.
+            progress (ProgressReporter): advanced once per rendered folder.
+    """
+    dirList = find_plot_dirs(outdir)
+    if type(None) != type(progress):
+        progress.start_stage("plot", len(dirList))
+
+    if 1 == threads:
+        for dirPath in dirList:
+            render(dirPath)
+            if type(None) != type(progress):
+                progress.advance()
+        return
+
+    batchSize = threads * 4
+    with Parallel(n_jobs=threads) as parallel:
+        for batchStart in range(0, len(dirList), batchSize):
+            batch = dirList[batchStart : (batchStart + batchSize)]
+            parallel(delayed(render)(dirPath) for dirPath in batch)
+            if type(None) != type(progress):
+                progress.advance(len(batch))
@@ -0,0 +1,107 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+import json
+import os
+import time
+
+PROGRESS_FILE = "progress.json"
+UPDATE_INTERVAL = 0.5
+
+
+class ProgressReporter(object):
+    """Reports the progress of a query, as a JSON file in its output folder.
+
+    Queries go through a list of stages. Each stage can have a number of items
+    to process (e.g., candidates to export), and the estimated time to complete
+    a stage is calculated from the time taken by the items processed so far.
+    Updates within a stage are written at most once every UPDATE_INTERVAL
+    seconds, replacing the file atomically.
+
+    Args:
+            path (string): path to the progress file.
+            stages (list): names of the query stages, in order.
+    """
+
+    def __init__(self, path, stages):
+        super(ProgressReporter, self).__init__()
+        self.path = path
+        self.stages = list(stages)
+        self.start_time = time.time()
+        self.stage = None
+        self.stage_time = None
+        self.done = 0
+        self.total = None
+        self.last_write = 0
+
+    @staticmethod
+    def from_outdir(outdir, stages):
+        return ProgressReporter(os.path.join(outdir, PROGRESS_FILE), stages)
+
+    def start_stage(self, stage, total=None):
+        """Moves to a stage, with total items to process, if known."""
+        assert stage in self.stages, f'unknown stage "{stage}".'
+        self.stage = stage
+        self.stage_time = time.time()
+        self.done = 0
+        self.total = total
+        self.write()
+
+    def set_total(self, total):
+        """Sets the total items to process in the current stage, when known
+        only after the stage started."""
+        self.total = total
+        self.write()
+
+    def advance(self, n=1):
+        """Marks n more items of the current stage as processed."""
+        self.done += n
+        if time.time() - self.last_write >= UPDATE_INTERVAL or self.done == self.total:
+            self.write()
+
+    def finish(self):
+        self.stage = "done"
+        self.stage_time = time.time()
+        self.done = 0
+        self.total = None
+        self.write()
+
+    def get_eta(self):
+        """Estimated seconds to complete the current stage, or None."""
+        if self.total is None or 0 == self.done:
+            return None
+        elapsed = time.time() - self.stage_time
+        return elapsed / self.done * max(0, self.total - self.done)
+
+    def get_data(self):
+        return {
+            "stage": self.stage,
+            "stage_index": (
+                self.stages.index(self.stage) if self.stage in self.stages else None
+            ),
+            "stages": self.stages,
+            "done": self.done,
+            "total": self.total,
+            "eta": self.get_eta(),
+            "start_time": self.start_time,
+            "stage_time": self.stage_time,
+            "time": time.time(),
+        }
+
+    def write(self):
+        tmpPath = f"{self.path}.tmp"
+        with open(tmpPath, "w+") as OH:
+            json.dump(self.get_data(), OH)
+        os.replace(tmpPath, self.path)
+        self.last_write = time.time()
+
+
+def read_progress(outdir):
+    """Reads the progress file of a query output folder, or returns None."""
+    try:
+        with open(os.path.join(outdir, PROGRESS_FILE), "r") as IH:
+            return json.load(IH)
+    except (OSError, ValueError):
+        return None
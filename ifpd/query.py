@@ -3,11 +3,8 @@
 @contact: gigi.ga90@gmail.com
 """
 
-import matplotlib  # type: ignore
-import matplotlib.pyplot as plt  # type: ignore
-import matplotlib.patches as patches  # type: ignore
 import configparser
-from ifpd import bioext, stats
+from ifpd import bioext, cache, columnar, figures
 from joblib import Parallel, delayed  # type: ignore
 import numpy as np  # type: ignore
 import os
@@ -15,7 +12,7 @@ import pandas as pd  # type: ignore
 from rich.progress import track  # type: ignore
 from typing import List
 
-matplotlib.use("svg")
+WINDOWS_FILE = "windows.tsv"
 
 
 class OligoDatabase(object):
@@ -40,14 +37,17 @@ class OligoDatabase(object):
             self.config = configparser.ConfigParser()
             self.config.read_string("".join(IH.readlines()))
 
-    def check_overlaps(self):
-        hasOverlaps = False
-        for chrom, chromData in self.chromData.items():
-            startPositions = np.array(chromData.iloc[:-1, 0])
-            endPositions = np.array(chromData.iloc[1:, 1]) - 1
-            foundOverlaps = any(startPositions <= endPositions)
-            hasOverlaps |= foundOverlaps
-        return hasOverlaps == self.has_overlaps()
+    def check_overlaps(self, chrom=None):
+        """Whether any of the loaded chromosomes (or the specified one) contains
+        overlapping oligos."""
+        chromList = list(self.chromData.keys()) if chrom is None else [chrom]
+        for chrom in chromList:
+            chromData = self.chromData[chrom]
+            startPositions = chromData.iloc[1:, 0].values
+            endPositions = chromData.iloc[:-1, 1].values
+            if any(startPositions < endPositions):
+                return True
+        return False
 
     def get_oligo_length_range(self):
         """Reads oligo length range from Database .config"""
@@ -79,12 +79,27 @@ class OligoDatabase(object):
     def has_chromosome(self, chrom):
         return chrom in os.listdir(self.dirPath)
 
+    def get_chromosome_list(self):
+        """Lists the chromosome files, skipping hidden files and folders."""
+        return sorted(
+            d
+            for d in os.listdir(self.dirPath)
+            if not d.startswith(".") and os.path.isfile(os.path.join(self.dirPath, d))
+        )
+
+    def has_columns(self, chrom):
+        """Whether an up-to-date binary columnar copy of a chromosome exists."""
+        return columnar.ChromosomeColumns.is_up_to_date(self.dirPath, chrom)
+
     def read_chromosome(self, chrom):
         assert self.has_chromosome(chrom)
 
         chromPath = os.path.join(self.dirPath, chrom)
-        chromData = pd.read_csv(chromPath, "\t", header=None)
-        chromData.columns = bioext.UCSCbed.FIELD_NAMES[1 : (chromData.shape[1] + 1)]
+        if self.has_columns(chrom):
+            chromData = columnar.ChromosomeColumns(self.dirPath, chrom).asDataFrame()
+        else:
+            chromData = pd.read_csv(chromPath, "\t", header=None)
+            chromData.columns = bioext.UCSCbed.FIELD_NAMES[1 : (chromData.shape[1] + 1)]
 
         assert 0 != chromData.shape[0], f'found empty chromosome file: "{chromPath}"'
         assert 2 <= chromData.shape[1], f'missing columns in "{chromPath}"'
@@ -118,17 +133,118 @@ class OligoDatabase(object):
             oligoLengthList <= oligoLengthRange[1]
         ), f'oligo too big for ".config" in "{chromPath}"'
 
-        if self.has_overlaps():
-            assert self.check_overlaps(), f'overlaps status mismatch in "{chromPath}"'
-
         if self.has_sequences():
             assert chromData.shape[1] >= 3, f'missing sequence columns in "{chromPath}"'
 
         self.chromData[chrom] = chromData
+        if not self.has_overlaps():
+            assert not self.check_overlaps(
+                chrom
+            ), f'overlaps status mismatch in "{chromPath}"'
+
+    def get_columns(self, chrom):
+        """Opens the binary columnar copy of a chromosome, if up-to-date. When the
+        process-wide chromosome cache is enabled, the columns are read in memory
+        (or built from the chromosome file, if missing) and cached."""
+        chromCache = cache.get_chromosome_cache()
+        if not chromCache.enabled:
+            if self.has_columns(chrom):
+                return columnar.ChromosomeColumns(self.dirPath, chrom)
+            return None
+
+        key = chromCache.get_key(self.dirPath, chrom)
+        chromColumns = chromCache.get(key)
+        if chromColumns is None:
+            if self.has_columns(chrom):
+                chromColumns = columnar.ChromosomeColumns(
+                    self.dirPath, chrom, inMemory=True
+                )
+            else:
+                chromColumns = columnar.ChromosomeColumns.from_frame(
+                    chrom,
+                    pd.read_csv(
+                        os.path.join(self.dirPath, chrom), sep="\t", header=None
+                    ),
+                )
+            chromCache.put(key, chromColumns, chromColumns.nbytes)
+        return chromColumns
+
+    def get_index(self, chrom):
+        """Loads the sparse index of a chromosome file, building and persisting
+        it if missing or outdated."""
+        chromIndex = columnar.ChromosomeIndex.load(self.dirPath, chrom)
+        if chromIndex is None:
+            chromIndex = columnar.ChromosomeIndex.build(
+                os.path.join(self.dirPath, chrom)
+            )
+            try:
+                chromIndex.save(self.dirPath, chrom)
+            except OSError:
+                pass
+        return chromIndex
+
+    def __read_text_region(self, chrom, chromStart, chromEnd):
+        rowi, offset = self.get_index(chrom).locate(chromStart)
+        chunkList = []
+        with open(os.path.join(self.dirPath, chrom), "rb") as IH:
+            IH.seek(offset)
+            for chunk in pd.read_csv(
+                IH, sep="\t", header=None, chunksize=columnar.INDEX_STEP
+            ):
+                chunk.index = pd.RangeIndex(rowi, rowi + chunk.shape[0])
+                rowi += chunk.shape[0]
+                chunkList.append(chunk)
+                if chunk.iloc[-1, 0] > chromEnd:
+                    break
+        chromData = pd.concat(chunkList)
+        chromData.columns = bioext.UCSCbed.FIELD_NAMES[1 : (chromData.shape[1] + 1)]
+        return chromData.loc[
+            np.logical_and(
+                chromData.iloc[:, 0] >= chromStart, chromData.iloc[:, 1] <= chromEnd
+            ),
+            :,
+        ]
+
+    def read_region(self, chrom, chromStart=0, chromEnd=np.inf):
+        """Reads the oligos in a chromosome region, i.e., starting at or after
+        chromStart and ending at or before chromEnd. As chromosome files are
+        sorted, only the rows in the region are read, using either the binary
+        columnar copy (possibly cached) or the sparse index of the chromosome file.
+        The index of the output pd.DataFrame matches the row number in the
+        chromosome file."""
+        assert self.has_chromosome(chrom)
+
+        if chrom in self.chromData.keys():
+            chromData = self.chromData[chrom]
+            starti, endi = (
+                np.searchsorted(chromData.iloc[:, 0].values, chromStart, "left"),
+                np.searchsorted(chromData.iloc[:, 1].values, chromEnd, "right"),
+            )
+            return chromData.iloc[starti : max(starti, endi), :]
+
+        chromColumns = self.get_columns(chrom)
+        if chromColumns is not None:
+            starti, endi = (
+                int(np.searchsorted(chromColumns.chromStart, chromStart, "left")),
+                int(np.searchsorted(chromColumns.chromEnd, chromEnd, "right")),
+            )
+            chromData = chromColumns.asDataFrame(starti, max(starti, endi))
+        else:
+            chromData = self.__read_text_region(chrom, chromStart, chromEnd)
+
+        chromPath = os.path.join(self.dirPath, chrom)
+        assert all(
+            chromData.iloc[:, 0].diff()[1:] > 0
+        ), f'found unsorted file: "{chromPath}"'
+        assert all(
+            chromData.iloc[:, 1].diff()[1:] >= 0
+        ), f'found unsorted file: "{chromPath}"'
+
+        return chromData
 
     def read_all_chromosomes(self, verbose):
-        chromList = [d for d in os.listdir(self.dirPath) if not d.startswith(".")]
-        assert 0 < len(chromList), "no chromosome files found in {self.dirPath}"
+        chromList = self.get_chromosome_list()
+        assert 0 < len(chromList), f"no chromosome files found in {self.dirPath}"
         chromList = track(chromList) if verbose else chromList
 
         for chrom in chromList:
@@ -142,13 +258,41 @@ class OligoProbe(object):
         super(OligoProbe, self).__init__()
         self.chrom = chrom
         self.oligoData = oligos
-        self.refGenome = database.get_reference_genome()
+        self.refGenome = None
+        if type(None) != type(database):
+            self.refGenome = database.get_reference_genome()
         self.chromStart = self.oligoData.iloc[:, 0].min()
         self.chromEnd = self.oligoData.iloc[:, 1].max()
         self.midpoint = (self.chromStart + self.chromEnd) / 2
         self.size = self.chromEnd - self.chromStart
         self.homogeneity = self.get_probe_homogeneity()
 
+    @staticmethod
+    def from_bed(path):
+        """Reads a probe from a .bed file written by get_bed. Oligo sequences
+        are not stored in it, and are left empty."""
+        with open(path, "r") as IH:
+            header = IH.readline()
+        bed = pd.read_csv(
+            path,
+            sep="\t",
+            header=None,
+            skiprows=1,
+            names=["chrom", "chromStart", "chromEnd", "name"],
+        )
+        assert 0 < bed.shape[0], f"no oligos found in {path}"
+        oligos = pd.DataFrame.from_dict(
+            {
+                "chromStart": bed["chromStart"].values,
+                "chromEnd": bed["chromEnd"].values,
+                "sequence": np.repeat("", bed.shape[0]),
+            }
+        )
+        probe = OligoProbe(bed["chrom"].values[0], oligos, None)
+        if "ref:" in header:
+            probe.refGenome = header.split("ref:")[1].strip().strip('"')
+        return probe
+
     def __str__(self):
         s = f"[{self.refGenome}]"
         s += f"{self.chrom}:{self.chromStart}-{self.chromEnd};"
@@ -241,224 +385,468 @@ class OligoProbe(object):
 
         return description
 
-    def get_fasta(self, path=None, prefix=""):
+    def get_fasta_records(self, prefix=""):
+        """Fasta records of the oligos, one string per oligo, formatted from
+        the oligo columns in a single pass."""
         if not prefix.startswith(" "):
             prefix = " " + prefix
+        return [
+            f">{prefix}oligo_{i} [{self.refGenome}]{self.chrom}:{start}-{end}\n"
+            + f"{sequence}\n"
+            for i, start, end, sequence in zip(
+                self.oligoData.index.tolist(),
+                self.oligoData.iloc[:, 0].tolist(),
+                self.oligoData.iloc[:, 1].tolist(),
+                self.oligoData.iloc[:, 2].tolist(),
+            )
+        ]
 
-        fasta = ""
-        for i in self.oligoData.index:
-            oligo = self.oligoData.loc[i, :]
-            chromStart, chromEnd, sequence = oligo[:3]
-            fasta += f">{prefix}oligo_{i} [{self.refGenome}]"
-            fasta += f"{self.chrom}:{chromStart}-{chromEnd}\n"
-            fasta += f"{sequence}\n"
+    def get_bed_records(self, prefix=""):
+        """Bed records of the oligos, one line per oligo, formatted from the
+        oligo columns in a single pass."""
+        if not prefix.endswith("_"):
+            prefix += "_"
+        return [
+            f"{self.chrom}\t{start}\t{end}\t{prefix}oligo_{i}\n"
+            for i, start, end in zip(
+                self.oligoData.index.tolist(),
+                self.oligoData.iloc[:, 0].tolist(),
+                self.oligoData.iloc[:, 1].tolist(),
+            )
+        ]
+
+    def get_bed_header(self):
+        return f'track description="ref:{self.refGenome}"\n'
+
+    def get_fasta(self, path=None, prefix=""):
+        records = self.get_fasta_records(prefix)
 
         if type(None) != type(path):
             assert os.path.isdir(os.path.dirname(path))
             with open(path, "w+") as OH:
-                OH.write(fasta)
+                OH.writelines(records)
 
-        return fasta
+        return "".join(records)
 
     def get_bed(self, path=None, prefix=""):
-        if not prefix.endswith("_"):
-            prefix += "_"
-
-        bed = f'track description="ref:{self.refGenome}"\n'
-        for i in self.oligoData.index:
-            oligo = self.oligoData.loc[i, :]
-            chromStart, chromEnd, sequence = oligo[:3]
-            bed += f"{self.chrom}\t{chromStart}\t{chromEnd}\t"
-            bed += f"{prefix}oligo_{i}\n"
+        records = [self.get_bed_header(), *self.get_bed_records(prefix)]
 
         if type(None) != type(path):
             assert os.path.isdir(os.path.dirname(path))
             with open(path, "w+") as OH:
-                OH.write(bed)
+                OH.writelines(records)
 
-        return bed
+        return "".join(records)
 
     def _plot_region(self, outputDir, region):
-        fig = plt.figure()
-
-        chrom, start, stop = region
-        plt.plot([start, stop], [0, 0], "k", linewidth=4.0, label="Genome")
-        plt.plot(
-            [start + (stop - start) / 2.0, start + (stop - start) / 2.0],
-            [-1, 1],
-            "r--",
-            label="Window center",
+        figures.get_template(figures.ProbeWindowFigure).plot(
+            os.path.join(outputDir, "window.png"),
+            region,
+            self.chromStart,
+            self.chromEnd,
         )
 
-        plt.plot(
-            [self.chromStart, self.chromEnd], [0, 0], "c-", linewidth=4.0, label="Probe"
-        )
-        plt.plot(
-            [self.chromStart + self.size / 2.0, self.chromStart + self.size / 2.0],
-            [-1, 1],
-            "c--",
-            label="Probe center",
+    def _plot_oligo(self, outputDir):
+        figures.get_template(figures.ProbeOligoFigure).plot(
+            os.path.join(outputDir, "probe.png"),
+            self.chrom,
+            self.oligoData["chromStart"].values,
+            self.oligoData["chromEnd"].values,
         )
 
-        plt.gca().axes.get_yaxis().set_visible(False)
-        plt.suptitle("%s:%d-%.0f" % (chrom, start, stop))
-        plt.xlabel("genomic coordinate [nt]")
-        plt.legend(fontsize="small", loc="best")
-
-        plt.savefig(
-            os.path.join(outputDir, "window.png"), format="png", bbox_inches="tight"
+    def _plot_oligo_distr(self, outputDir):
+        figures.get_template(figures.ProbeOligoPositionFigure).plot(
+            os.path.join(outputDir, "oligo.png"),
+            f"{self.chrom}:{self.chromStart}-{self.chromEnd}",
+            self.oligoData["chromStart"].values,
+            self.chromStart,
+            self.chromEnd,
         )
-        plt.close(fig)
 
-    def _plot_oligo(self, outputDir):
-        fig = plt.figure(figsize=(20, 5))
-        (genome_handle,) = plt.plot(
-            [self.chromStart, self.chromEnd], [0, 0], "k", linewidth=4.0, label="Genome"
+    def _plot_oligo_distance(self, outputDir):
+        figures.get_template(figures.ProbeDistanceFigure).plot(
+            os.path.join(outputDir, "distance.png"),
+            f"{self.chrom}:{self.chromStart}-{self.chromEnd}",
+            self.oligoData.iloc[1:, 0].values - self.oligoData.iloc[:-1, 1].values,
         )
 
-        for i in self.oligoData.index:
-            oligo = self.oligoData.loc[i, :]
-            oligo_midpoint = (oligo["chromStart"] + oligo["chromEnd"]) / 2.0
-            (oligo_handle,) = plt.plot(
-                [oligo["chromStart"], oligo["chromEnd"]],
-                [0, 0],
-                "c",
-                linewidth=2.0,
-                label="Oligo",
-            )
-            (oligoCenter_handle,) = plt.plot(
-                [oligo_midpoint, oligo_midpoint],
-                [-0.1, 0.1],
-                "c:",
-                label="Oligo center",
-            )
+    def plot(self, outputDir, region):
+        assert os.path.isdir(outputDir), f'folder not found: "{outputDir}"'
+        self._plot_region(outputDir, region)
+        self._plot_oligo(outputDir)
+        self._plot_oligo_distr(outputDir)
+        self._plot_oligo_distance(outputDir)
 
-        plt.gca().axes.get_yaxis().set_visible(False)
-        plt.ylim((-0.5, 0.5))
 
-        plt.gca().axes.get_xaxis().set_ticks(
-            list(
-                range(
-                    self.chromStart,
-                    self.chromEnd,
-                    max(1, int((self.chromEnd - self.chromStart) / 5.0)),
-                )
-            )
-        )
+def describe_candidate(candidate, queried_region):
+    return candidate.describe(queried_region)
 
-        plt.legend(
-            handles=[genome_handle, oligo_handle, oligoCenter_handle],
-            fontsize="small",
-            loc="best",
-        )
-        plt.suptitle((f"{self.chrom}:{self.chromStart}-{self.chromEnd}"))
-        plt.xlabel("genomic coordinate [nt]")
 
-        plt.savefig(
-            os.path.join(outputDir, "probe.png"), format="png", bbox_inches="tight"
-        )
-        plt.close(fig)
+class ProbeCandidateList(object):
+    """All probe candidates made of n_oligo consecutive oligos in a region.
 
-    def _plot_oligo_distr(self, outputDir):
-        fig = plt.figure()
+    Features are calculated at once for all candidates, directly from the oligo
+    start/end arrays. As oligos are sorted by both start and end position, each
+    candidate starts with its first oligo and ends with its last one. OligoProbe
+    instances are built (and cached) only when a candidate is accessed.
 
-        plt.plot(
-            [0, self.oligoData.shape[0] - 1],
-            [self.chromStart, self.chromEnd],
-            "k-",
-            label="Homogeneous distribution",
-        )
-        plt.plot(
-            list(range(self.oligoData.shape[0])),
-            self.oligoData["chromStart"].values,
-            "r.",
-            label="Oligo",
-        )
+    Homogeneity is calculated in blocks of at most CHUNKSIZE candidates, and
+    each block is marked as processed in the progress reporter, if any.
+    """
 
-        plt.suptitle(f"{self.chrom}:{self.chromStart}-{self.chromEnd}")
-        plt.xlabel("oligo number")
-        plt.ylabel("genomic coordinate [nt]")
-        plt.legend(fontsize="small", loc="best")
+    CHUNKSIZE = 2**20
 
-        plt.savefig(os.path.join(outputDir, "oligo.png"), format="png")
-        plt.close(fig)
+    def __init__(self, chrom, oligos, n_oligo, database, progress=None):
+        super(ProbeCandidateList, self).__init__()
+        self.chrom = chrom
+        self.oligoData = oligos
+        self.n_oligo = n_oligo
+        self.database = database
+        self.probes = {}
+
+        ncandidates = max(0, oligos.shape[0] - n_oligo + 1)
+        if type(None) != type(progress):
+            progress.set_total(ncandidates)
+        chromEnd = oligos.iloc[:, 1].values.astype(np.int64)
+        self.chromStart = oligos.iloc[:ncandidates, 0].values.astype(np.int64)
+        self.chromEnd = chromEnd[(n_oligo - 1) :][:ncandidates]
+        self.midpoint = (self.chromStart + self.chromEnd) / 2
+        self.size = self.chromEnd - self.chromStart
+        self.homogeneity = self.__calc_homogeneity(chromEnd, ncandidates, progress)
+
+    def __calc_homogeneity(self, chromEnd, ncandidates, progress=None):
+        """Probe homogeneity, as in OligoProbe.get_probe_homogeneity. The
+        standard deviation of the distances in each window is calculated from
+        cumulative sums of distances and squared distances. Integer sums are
+        exact, as wrapped-around cumulative sums still give exact differences."""
+        ndiffs = self.n_oligo - 1
+        if 0 == ndiffs:
+            if type(None) != type(progress):
+                progress.advance(ncandidates)
+            return np.full(ncandidates, np.nan)
+
+        diffs = np.diff(chromEnd)
+        sum1 = np.concatenate([[0], np.cumsum(diffs)])
+        sum2 = np.concatenate([[0], np.cumsum(diffs * diffs)])
+
+        homogeneity = np.empty(ncandidates)
+        for start in range(0, ncandidates, self.CHUNKSIZE):
+            end = min(ncandidates, start + self.CHUNKSIZE)
+            wsum1 = sum1[(ndiffs + start) : (ndiffs + end)] - sum1[start:end]
+            wsum2 = sum2[(ndiffs + start) : (ndiffs + end)] - sum2[start:end]
+
+            variance = (ndiffs * wsum2 - wsum1 * wsum1) / (ndiffs * ndiffs)
+            std = np.sqrt(np.maximum(variance, 0))
+            with np.errstate(divide="ignore"):
+                homogeneity[start:end] = np.where(0 == std, np.inf, 1 / std)
+            if type(None) != type(progress):
+                progress.advance(end - start)
+        return homogeneity
 
-    def _plot_oligo_distance(self, outputDir):
-        fig = plt.figure()
-
-        if self.oligoData.shape[0] > 1:
-            startPositions = self.oligoData.iloc[1:, 0].values
-            endPositions = self.oligoData.iloc[:-1, 1].values
-            diffs = startPositions - endPositions
-            plt.hist(diffs, density=1, facecolor="green", alpha=0.5)
-            density = stats.calc_density(diffs, alpha=0.5)
-            plt.plot(
-                density["x"].tolist(),
-                density["y"].tolist(),
-                "b--",
-                label="Density distribution",
+    def __len__(self):
+        return self.chromStart.shape[0]
+
+    def __getitem__(self, i):
+        if i not in self.probes:
+            self.probes[i] = OligoProbe(
+                self.chrom,
+                self.oligoData.iloc[i : (i + self.n_oligo), :],
+                self.database,
             )
+        return self.probes[i]
 
-            plt.suptitle(f"{self.chrom}:{self.chromStart}-{self.chromEnd}")
-            plt.legend(fontsize="small", loc="best")
+    def get_probe_centrality(self, region):
+        """Calculate centrality for all candidates,
+        as in OligoProbe.get_probe_centrality."""
+        region_halfWidth = (region[2] - region[1]) / 2
+        region_midPoint = region[1] + region_halfWidth
+        return (
+            region_halfWidth - abs(region_midPoint - self.midpoint)
+        ) / region_halfWidth
 
-        plt.xlabel("Distance between consecutive oligos [nt]")
-        plt.ylabel("Density")
+    def describe(self, region):
+        """Builds a pd.DataFrame describing all candidates,
+        as in OligoProbe.describe."""
+        return pd.DataFrame.from_dict(
+            {
+                "chrom": np.repeat(region[0], len(self)),
+                "chromStart": self.chromStart,
+                "chromEnd": self.chromEnd,
+                "centrality": self.get_probe_centrality(region),
+                "size": self.size,
+                "homogeneity": self.homogeneity,
+            }
+        )
 
-        plt.savefig(os.path.join(outputDir, "distance.png"), format="png")
-        plt.close(fig)
 
-    def plot(self, outputDir, region):
-        assert os.path.isdir(outputDir), f'folder not found: "{outputDir}"'
-        self._plot_region(outputDir, region)
-        self._plot_oligo(outputDir)
-        self._plot_oligo_distr(outputDir)
-        self._plot_oligo_distance(outputDir)
+def argsort_feature(values, ascending):
+    """Sorts feature values with NaNs last. Identical to the sorting done by
+    pd.DataFrame.sort_values, to keep the same order of ties."""
+    isnan = np.isnan(values)
+    positions = np.arange(values.shape[0])
+    nonNaNs = values[~isnan]
+    nonNaN_positions = positions[~isnan]
+    if not ascending:
+        nonNaNs = nonNaNs[::-1]
+        nonNaN_positions = nonNaN_positions[::-1]
+    order = nonNaN_positions[nonNaNs.argsort(kind="quicksort")]
+    if not ascending:
+        order = order[::-1]
+    return np.concatenate([order, positions[isnan]])
+
+
+def get_feature_sort_key(feature, values):
+    """Converts feature values to keys to be sorted increasingly, and flags
+    NaNs, which are always ranked last."""
+    isnan = np.isnan(values)
+    if not ProbeFeatureTable.FEATURE_SORT[feature]["ascending"]:
+        values = -values
+    return (np.where(isnan, 0, values), isnan)
+
+
+def select_best_in_segments(columns, positions, lengths, order, thr):
+    """Selects the best candidate in each (non-empty) segment of positions.
+    Candidates are filtered around the best value of the first feature, and
+    ranked on the second one. Ties are broken on the first feature, and then
+    on position. Returns -1 for segments with no candidates left."""
+    offsets = np.cumsum(lengths) - lengths
+    segment = np.repeat(np.arange(lengths.shape[0]), lengths)
+
+    values = columns[order[0]][positions]
+    key1, isnan1 = get_feature_sort_key(order[0], values)
+    key1 = np.where(isnan1, np.inf, key1)
+    best_feature = np.minimum.reduceat(key1, offsets)
+    if not ProbeFeatureTable.FEATURE_SORT[order[0]]["ascending"]:
+        best_feature = -best_feature
+    best_feature[np.add.reduceat(~isnan1, offsets) == 0] = np.nan
+    best_feature = best_feature[segment]
+
+    with np.errstate(invalid="ignore"):
+        feature_delta = best_feature * thr
+        discardCondition = np.logical_or(
+            values < best_feature - feature_delta,
+            values > best_feature + feature_delta,
+        )
 
+    key2, isnan2 = get_feature_sort_key(order[1], columns[order[1]][positions])
+    tier = np.where(discardCondition, 2, isnan2.astype("int"))
+    best_tier = np.minimum.reduceat(tier, offsets)
+    isBest = tier == best_tier[segment]
+    for key in [key2, key1]:
+        best_key = np.minimum.reduceat(np.where(isBest, key, np.inf), offsets)
+        isBest &= key == best_key[segment]
+    best = np.minimum.reduceat(
+        np.where(isBest, positions, np.iinfo(positions.dtype).max), offsets
+    )
+    return np.where(2 == best_tier, -1, best)
+
+
+def select_best_in_ranges(
+    columns, starti, lengths, order, thr, chunksize=None, progress=None
+):
+    """Selects the best candidate in each range of feature table positions,
+    starting at starti and of given lengths. Ranges are processed in batches of
+    at most chunksize candidates, and each batch is marked as processed in the
+    progress reporter, if any. Returns -1 for empty ranges."""
+    best = np.full(lengths.shape[0], -1)
+    nonEmpty = np.flatnonzero(lengths)
+    if type(None) != type(progress):
+        progress.advance(lengths.shape[0] - nonEmpty.shape[0])
+    if 0 == nonEmpty.shape[0]:
+        return best
+
+    chunksize = lengths.sum() if chunksize is None else max(1, chunksize)
+    batch = np.cumsum(lengths[nonEmpty]) // chunksize
+    for bi in np.unique(batch):
+        ranges = nonEmpty[batch == bi]
+        segment_lengths = lengths[ranges]
+        positions = np.arange(segment_lengths.sum()) + np.repeat(
+            starti[ranges] - (np.cumsum(segment_lengths) - segment_lengths),
+            segment_lengths,
+        )
+        best[ranges] = select_best_in_segments(
+            columns, positions, segment_lengths, order, thr
+        )
+        if type(None) != type(progress):
+            progress.advance(ranges.shape[0])
 
-def describe_candidate(candidate, queried_region):
-    return candidate.describe(queried_region)
+    return best
 
 
 class ProbeFeatureTable(object):
+    """Table of probe candidate features.
+
+    The table itself is never modified. Filtering and ranking only change
+    self.selection, the array of positions of the currently selected candidates
+    (in rank order), so that resetting does not copy any data. The selected
+    and discarded rows are available as pd.DataFrame via the data and
+    discarded attributes, built when accessed.
+    """
+
     FEATURE_SORT = {
         "centrality": {"ascending": False},
         "size": {"ascending": True},
         "homogeneity": {"ascending": False},
     }
+    WINDOW_CHUNKSIZE = 2**22
+    GROUPS_PER_THREAD = 4
 
     def __init__(self, candidateList, queried_region, verbose=False, threads=1):
         super(ProbeFeatureTable, self).__init__()
         assert 0 < len(candidateList)
 
-        self.data = []
-        if threads != 1:
+        table = []
+        if isinstance(candidateList, ProbeCandidateList):
+            table = [candidateList.describe(queried_region)]
+        elif threads != 1:
             verbose = 1 if verbose else 0
-            self.data = Parallel(n_jobs=threads, backend="threading", verbose=verbose)(
+            table = Parallel(n_jobs=threads, backend="threading", verbose=verbose)(
                 delayed(describe_candidate)(candidate, queried_region)
                 for candidate in candidateList
             )
         else:
             candidateList = track(candidateList) if verbose else candidateList
             for candidate in candidateList:
-                self.data.append(candidate.describe(queried_region))
-        self.data = pd.concat(self.data)
-        self.data.index = range(self.data.shape[0])
+                table.append(candidate.describe(queried_region))
+        self.table = pd.concat(table)
+        self.table.index = range(self.table.shape[0])
+
+        self.columns = {
+            column: self.table[column].values
+            for column in ["chromStart", "chromEnd", *self.FEATURE_SORT.keys()]
+        }
+        self.is_sorted = all(
+            np.all(np.diff(self.columns[column]) >= 0)
+            for column in ["chromStart", "chromEnd"]
+        )
 
-        self.discarded = None
+        self.positions = np.arange(self.table.shape[0])
+        self.selection = self.positions
+
+    def __len__(self):
+        return self.selection.shape[0]
+
+    @property
+    def data(self):
+        return self.table.iloc[self.selection, :]
+
+    @property
+    def discarded(self):
+        isDiscarded = np.ones(self.table.shape[0], dtype="bool")
+        isDiscarded[self.selection] = False
+        return self.table.iloc[isDiscarded, :]
 
     def reset(self):
-        self.data = pd.concat([self.discarded, self.data])
-        self.discarded = None
-        self.data.sort_index(inplace=True)
+        self.selection = self.positions
 
     def keep(self, condition, cumulative=False):
+        """Keeps only the selected candidates matching the condition: either a
+        boolean mask over the whole table, or an array of table positions."""
         if not cumulative:
             self.reset()
-        self.discarded = pd.concat(
-            [self.discarded, self.data.loc[np.logical_not(condition), :]]
-        )
-        self.data = self.data.loc[condition, :]
+        condition = np.asarray(condition)
+        if condition.dtype == bool:
+            self.selection = self.selection[condition[self.selection]]
+        elif self.selection is self.positions:
+            self.selection = condition
+        else:
+            self.selection = self.selection[np.isin(self.selection, condition)]
+
+    def keep_window(self, chromStart, chromEnd, cumulative=False):
+        """Keeps only the candidates in the [chromStart, chromEnd] window.
+        As candidates are sorted, this costs time proportional to the number of
+        candidates in the window, not to the size of the table."""
+        if not self.is_sorted:
+            self.keep(
+                np.logical_and(
+                    self.columns["chromStart"] >= chromStart,
+                    self.columns["chromEnd"] <= chromEnd,
+                ),
+                cumulative,
+            )
+            return
+
+        starti = np.searchsorted(self.columns["chromStart"], chromStart, "left")
+        endi = np.searchsorted(self.columns["chromEnd"], chromEnd, "right")
+        self.keep(np.arange(starti, max(starti, endi)), cumulative)
+
+    def select_best_in_windows(
+        self,
+        chromStart,
+        chromEnd,
+        order,
+        thr,
+        chunksize=WINDOW_CHUNKSIZE,
+        threads=1,
+        progress=None,
+    ):
+        """Selects the best candidate in each window, as done by filtering on
+        the first feature and ranking on the second one. All windows are
+        processed at once, as a reduction over the contiguous segments of
+        candidates in each window. Use chunksize to limit the number of
+        candidates processed at once (i.e., memory usage). With multiple threads,
+        windows are split in groups with similar numbers of candidates, and each
+        group is processed in a separate process. Feature columns are
+        memory-mapped by the workers, instead of being pickled for each group.
+        Groups are processed GROUPS_PER_THREAD times per thread, so that the
+        progress reporter, if any, is updated while windows are populated.
+
+        Args:
+            chromStart (np.ndarray): window start positions.
+            chromEnd (np.ndarray): window end positions.
+            order (list): features, the first two are used.
+            thr (float): first feature filter threshold.
+            chunksize (int): max number of candidates per batch of windows.
+            threads (int): number of processes.
+            progress (ProgressReporter): marks windows as processed.
+
+        Returns:
+            np.ndarray: best candidate position in each window, -1 if empty.
+        """
+        assert self.is_sorted, "candidates must be sorted by position."
+        for feature in order[:2]:
+            assert (
+                feature in self.FEATURE_SORT.keys()
+            ), f'fetature "{feature}" not recognized.'
+
+        starti = np.searchsorted(self.columns["chromStart"], chromStart, "left")
+        endi = np.searchsorted(self.columns["chromEnd"], chromEnd, "right")
+        lengths = np.maximum(endi - starti, 0)
+        if type(None) != type(progress):
+            progress.set_total(lengths.shape[0])
+
+        if threads == 1 or lengths.shape[0] < 2:
+            return select_best_in_ranges(
+                self.columns, starti, lengths, order, thr, chunksize, progress
+            )
+
+        ngroups = threads * self.GROUPS_PER_THREAD
+        group = np.cumsum(lengths) * ngroups // max(1, lengths.sum())
+        group = np.minimum(group, ngroups - 1)
+        groupList = [np.flatnonzero(group == gi) for gi in np.unique(group)]
+        bestList = []
+        with Parallel(n_jobs=threads, max_nbytes="1M", mmap_mode="r") as parallel:
+            for i in range(0, len(groupList), threads):
+                bestList.extend(
+                    parallel(
+                        delayed(select_best_in_ranges)(
+                            self.columns,
+                            starti[windows],
+                            lengths[windows],
+                            order,
+                            thr,
+                            chunksize,
+                        )
+                        for windows in groupList[i : (i + threads)]
+                    )
+                )
+                if type(None) != type(progress):
+                    progress.advance(
+                        sum(
+                            windows.shape[0] for windows in groupList[i : (i + threads)]
+                        )
+                    )
+        return np.concatenate(bestList)
 
     def filter(self, feature, thr, cumulative=False):
         assert (
@@ -470,25 +858,25 @@ class ProbeFeatureTable(object):
 
         self.rank(feature)
 
-        best_feature = self.data[feature].values[0]
+        values = self.columns[feature][self.selection]
+        best_feature = values[0]
         feature_delta = best_feature * thr
         feature_range = (best_feature - feature_delta, best_feature + feature_delta)
 
-        discardCondition = [
-            self.data[feature] < feature_range[0],
-            self.data[feature] > feature_range[1],
-        ]
-
-        discardCondition = np.logical_or(*discardCondition)
-        self.discarded = pd.concat([self.discarded, self.data.loc[discardCondition, :]])
-        self.data = self.data.loc[np.logical_not(discardCondition), :]
+        discardCondition = np.logical_or(
+            values < feature_range[0], values > feature_range[1]
+        )
+        self.selection = self.selection[np.logical_not(discardCondition)]
 
         return (feature_range, feature)
 
     def rank(self, feature):
-        self.data = self.data.sort_values(
-            feature, ascending=self.FEATURE_SORT[feature]["ascending"]
-        )
+        self.selection = self.selection[
+            argsort_feature(
+                self.columns[feature][self.selection],
+                self.FEATURE_SORT[feature]["ascending"],
+            )
+        ]
 
 
 class GenomicWindow(object):
@@ -522,10 +910,9 @@ class GenomicWindow(object):
 class GenomicWindowList(object):
     """Both a list genomic window and associated probe set."""
 
-    data: List = []
-
     def __init__(self, windows=None):
         super(GenomicWindowList, self).__init__()
+        self.data: List = []
         if type(None) != type(windows):
             self.data = windows
 
@@ -569,182 +956,160 @@ class GenomicWindowList(object):
         return 2 / (size_std + probe_homogeneity)
 
     def asDataFrame(self):
+        """Window table, with the ID of the exported probe in each window (-1
+        for empty windows)."""
+        chroms = []
         starts = []
         ends = []
         sizes = []
+        probes = []
+        probe_counter = 0
         for window in self:
+            chroms.append(window.chrom)
             starts.append(window.chromStart)
             ends.append(window.chromEnd)
             sizes.append(window.size)
+            if window.has_probe():
+                probes.append(probe_counter)
+                probe_counter += 1
+            else:
+                probes.append(-1)
         return pd.DataFrame.from_dict(
-            {"chromStart": starts, "chromEnd": ends, "size": sizes}
-        )
-
-    def _plot_probe_set(self, outputDir, region):
-        fig = plt.figure(figsize=(20, 5))
-
-        for wi in range(len(self)):
-            window = self[wi]
-            plt.axvline(window.chromStart, ymin=-1, ymax=1, color="k")
-            if not window.has_probe():
-                plt.gca().add_patch(
-                    patches.Rectangle(
-                        (window.chromStart, -1), window.size, 2, color="r"
-                    )
-                )
-            plt.gca().text(window.midpoint, 0.5, wi + 1)
-        plt.axvline(self[0].chromStart, ymin=-1, ymax=1, color="k", linestyle=":")
-        plt.axvline(self[-1].chromEnd, ymin=-1, ymax=1, color="k", linestyle=":")
-
-        plt.gca().add_patch(
-            patches.Rectangle(
-                (region[1], -1), self[0].chromStart - region[1], 2, color="k"
-            )
-        )
-        plt.gca().add_patch(
-            patches.Rectangle(
-                (self[-1].chromEnd, -1), region[2] - self[-1].chromEnd, 2, color="k"
-            )
+            {
+                "chrom": chroms,
+                "chromStart": starts,
+                "chromEnd": ends,
+                "size": sizes,
+                "probe": probes,
+            }
         )
 
-        (genome,) = plt.plot(
-            [region[1], region[2]], [0, 0], "k", linewidth=4.0, label="Genome"
+    @staticmethod
+    def from_export(path):
+        """Reads a window set exported to a folder, with its probes.
+
+        Returns:
+                tuple: GenomicWindowList and queried region.
+        """
+        path = os.path.normpath(path)
+        config = configparser.ConfigParser()
+        config.read(os.path.join(path, f"{os.path.basename(path)}.config"))
+        region = (
+            config["REGION"]["chrom"],
+            int(float(config["REGION"]["chromStart"])),
+            int(float(config["REGION"]["chromEnd"])),
         )
 
-        for probe in [w.probe for w in self if w.probe is not None]:
-            (oligo,) = plt.plot(
-                [probe.chromStart, probe.chromEnd],
-                [0, 0],
-                "c",
-                linewidth=2.0,
-                label="Probe",
-            )
-            (oligo_center,) = plt.plot(
-                [probe.midpoint, probe.midpoint],
-                [-0.1, 0.1],
-                "c:",
-                label="Probe center",
-                linewidth=2.0,
-            )
-
-        plt.gca().axes.get_yaxis().set_visible(False)
-        plt.ylim((-1, 1))
-        msg = "Empty windows are reported in red."
-        plt.suptitle(
-            "".join(
-                [
-                    f"Region: {region[0]}:{region[1]}-{region[2]}",
-                    " & Probe set: ",
-                    f"{self[0].chrom}:{self[0].chromStart}-{self[-1].chromEnd}\n",
-                    msg,
-                ]
-            )
-        )
-        plt.xlabel("genomic coordinate [nt]")
+        window_set = GenomicWindowList(None)
+        windows = pd.read_csv(os.path.join(path, WINDOWS_FILE), sep="\t")
+        for window in windows.itertuples():
+            window_set.add(window.chrom, window.chromStart, window.size)
+            if 0 <= window.probe:
+                window_set[-1].probe = OligoProbe.from_bed(
+                    os.path.join(
+                        path, f"probe_{window.probe}", f"probe_{window.probe}.bed"
+                    )
+                )
+        return (window_set, region)
 
-        plt.savefig(
-            os.path.join(outputDir, "windows.png"), format="png", bbox_inches="tight"
+    def _plot_probe_set(self, outputDir, region):
+        probes = [w.probe for w in self if w.probe is not None]
+        figures.get_template(figures.ProbeSetWindowsFigure).plot(
+            os.path.join(outputDir, "windows.png"),
+            region,
+            np.array([w.chromStart for w in self]),
+            np.array([w.chromEnd for w in self]),
+            np.array([w.has_probe() for w in self]),
+            np.array([p.chromStart for p in probes]),
+            np.array([p.chromEnd for p in probes]),
         )
-        plt.close(fig)
 
     def _plot_probe_distr(self, outputDir):
-        fig = plt.figure()
-
         probes = [w.probe for w in self if w.probe is not None]
-
-        if len(probes) > 1:
-            plt.plot(
-                [0, len(probes) - 1],
-                [probes[0].midpoint, probes[-1].midpoint],
-                "k-",
-                label="Homogeneous distribution",
-            )
-            plt.plot(
-                list(range(len(probes))),
-                [p.midpoint for p in probes],
-                "r.",
-                label="Probe",
-            )
-
-            plt.suptitle(
-                f"{probes[0].chrom}:" + f"{probes[0].chromStart}{probes[-1].chromEnd}"
-            )
-            plt.xlim((-1, len(probes)))
-            plt.legend(fontsize="small", loc="best")
-
-        plt.xlabel("probe number")
-        plt.ylabel("genomic coordinate [nt]")
-
-        plt.savefig(
-            os.path.join(outputDir, "distr.png"), format="png", bbox_inches="tight"
+        title = ""
+        if 0 < len(probes):
+            title = f"{probes[0].chrom}:{probes[0].chromStart}{probes[-1].chromEnd}"
+        figures.get_template(figures.ProbeSetPositionFigure).plot(
+            os.path.join(outputDir, "distr.png"),
+            title,
+            np.array([p.midpoint for p in probes]),
+            probes[0].midpoint if 0 < len(probes) else 0,
+            probes[-1].midpoint if 0 < len(probes) else 0,
         )
-        plt.close(fig)
 
     def _plot_probe_distance(self, outputDir, region):
-        fig = plt.figure()
-
         probes = [w.probe for w in self if w.probe is not None]
-
-        if len(probes) > 1:
-            starts = np.array([p.chromStart for p in probes][1:])
-            ends = np.array([p.chromEnd for p in probes][:-1])
-            diffs = starts - ends
-            plt.hist(diffs, density=1, facecolor="green", alpha=0.5)
-
-            density = stats.calc_density(diffs, alpha=0.5)
-            plt.plot(
-                density["x"].tolist(),
-                density["y"].tolist(),
-                "b--",
-                label="Density distribution",
-            )
-
-            plt.suptitle(
-                f"{probes[0].chrom}:" + f"{probes[0].chromStart}{probes[-1].chromEnd}"
-            )
-            plt.legend(fontsize="small", loc="best")
-
-        plt.xlabel("Distance between consecutive probes [nt]")
-        plt.ylabel("Density")
-
-        plt.savefig(
-            os.path.join(outputDir, "distance.png"), format="png", bbox_inches="tight"
+        title = ""
+        if 0 < len(probes):
+            title = f"{probes[0].chrom}:{probes[0].chromStart}{probes[-1].chromEnd}"
+        figures.get_template(figures.ProbeSetDistanceFigure).plot(
+            os.path.join(outputDir, "distance.png"),
+            title,
+            np.array([p.chromStart for p in probes][1:])
+            - np.array([p.chromEnd for p in probes][:-1]),
         )
-        plt.close(fig)
-
-    def export(self, path, region):
-        probe_counter = 0
-        fasta = ""
-        bed = ""
-        for window in self:
-            if window.has_probe():
-                probe_dirName = f"probe_{probe_counter}"
-                probe_dirPath = os.path.join(path, probe_dirName)
-                probe = window.probe
 
-                assert not os.path.isfile(probe_dirPath)
-                assert not os.path.isdir(probe_dirPath)
-                os.mkdir(probe_dirPath)
+    def plot(self, outputDir, region):
+        assert os.path.isdir(outputDir), f'folder not found: "{outputDir}"'
+        self._plot_probe_set(outputDir, region)
+        self._plot_probe_distr(outputDir)
+        self._plot_probe_distance(outputDir, region)
 
-                probe.describe(
-                    window.asRegion(),
-                    os.path.join(probe_dirPath, f"probe_{probe_counter}.config"),
-                )
-                fasta += probe.get_fasta(
-                    os.path.join(probe_dirPath, f"probe_{probe_counter}.fasta"),
-                    f"probe{probe_counter}",
-                )
-                probe_bed = probe.get_bed(
-                    os.path.join(probe_dirPath, f"probe_{probe_counter}.bed"),
-                    f"probe{probe_counter}",
-                )
-                bed += "\n".join(probe_bed.split("\n")[1:])
-                probe.plot(probe_dirPath, window.asRegion())
+    def export(self, path, region):
+        """Exports the probes in the window set, with the window table and the
+        queried region, to be plotted with ifpd.plot. The fasta and bed records
+        of each probe are written both to the probe files and to the fasta and
+        bed files of the whole set.
+
+        Returns:
+                tuple: paths to the fasta and bed files of the whole set.
+        """
+        path = os.path.normpath(path)
+        basename = os.path.basename(path)
+        config = configparser.ConfigParser()
+        config["REGION"] = {
+            "chrom": region[0],
+            "chromStart": region[1],
+            "chromEnd": region[2],
+        }
+        with open(os.path.join(path, f"{basename}.config"), "w+") as OH:
+            config.write(OH)
+        self.asDataFrame().to_csv(
+            os.path.join(path, WINDOWS_FILE), sep="\t", index=False
+        )
 
-                probe_counter += 1
+        fasta_path = os.path.join(path, f"{basename}.fa")
+        bed_path = os.path.join(path, f"{basename}.bed")
+        with open(fasta_path, "w+") as FH, open(bed_path, "w+") as BH:
+            probe_counter = 0
+            for window in self:
+                if window.has_probe():
+                    self.__export_probe(window, path, probe_counter, FH, BH)
+                    probe_counter += 1
+
+        return (fasta_path, bed_path)
+
+    def __export_probe(self, window, path, probe_counter, FH, BH):
+        probe_dirName = f"probe_{probe_counter}"
+        probe_dirPath = os.path.join(path, probe_dirName)
+        probe = window.probe
+
+        assert not os.path.isfile(probe_dirPath)
+        assert not os.path.isdir(probe_dirPath)
+        os.mkdir(probe_dirPath)
+
+        probe.describe(
+            window.asRegion(),
+            os.path.join(probe_dirPath, f"{probe_dirName}.config"),
+        )
 
-        self._plot_probe_set(path, region)
-        self._plot_probe_distr(path)
-        self._plot_probe_distance(path, region)
+        records = probe.get_fasta_records(f"probe{probe_counter}")
+        with open(os.path.join(probe_dirPath, f"{probe_dirName}.fasta"), "w+") as OH:
+            OH.writelines(records)
+        FH.writelines(records)
 
-        return (fasta, bed)
+        records = probe.get_bed_records(f"probe{probe_counter}")
+        with open(os.path.join(probe_dirPath, f"{probe_dirName}.bed"), "w+") as OH:
+            OH.write(probe.get_bed_header())
+            OH.writelines(records)
+        BH.writelines(records)
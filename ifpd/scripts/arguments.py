@@ -21,25 +21,25 @@ def add_version_option(parser: argparse.ArgumentParser) -> argparse.ArgumentPars
     return parser
 
 
-def check_n_oligo(args, selectCondition):
-    assert 0 < selectCondition.sum(), "".join(
+def check_n_oligo(args, nOligos):
+    assert 0 < nOligos, "".join(
         [
             "no oligos found in the specified region.",
             f" [{args.chrom}:{args.region[0]}-{args.region[1]}]",
         ]
     )
     if args.exact_n_oligo:
-        assert args.n_oligo <= selectCondition.sum(), "".join(
+        assert args.n_oligo <= nOligos, "".join(
             [
                 "there are not enough oligos in the database.",
-                f" Asked for {args.n_oligo}, {selectCondition.sum()} found.",
+                f" Asked for {args.n_oligo}, {nOligos} found.",
             ]
         )
-    elif args.n_oligo > selectCondition.sum():
+    elif args.n_oligo > nOligos:
         logging.info(
             "".join(
                 [
-                    f"Found {selectCondition.sum()} oligos in",
+                    f"Found {nOligos} oligos in",
                     f" {args.chrom}:{args.region[0]}-{args.region[1]}",
                 ]
             )
@@ -47,19 +47,22 @@ def check_n_oligo(args, selectCondition):
         logging.warning(
             "".join(
                 [
-                    f"Designing a probe with {selectCondition.sum()} oligos",
+                    f"Designing a probe with {nOligos} oligos",
                     f" (instead of {args.n_oligo}).",
                 ]
             )
         )
-        args.n_oligo = selectCondition.sum()
+        args.n_oligo = nOligos
     return args
 
 
-def add_log_file_handler(path: str, logger_name: Optional[str] = None) -> None:
+def add_log_file_handler(
+    path: str, logger_name: Optional[str] = None
+) -> logging.Handler:
     """Adds log file handler to logger.
 
-    By defaults, adds the handler to the root logger.
+    By defaults, adds the handler to the root logger. The handler is returned,
+    to be removed (and closed) when running multiple commands in one process.
 
     Arguments:
         path {str} -- path to output log file
@@ -74,6 +77,7 @@ def add_log_file_handler(path: str, logger_name: Optional[str] = None) -> None:
     fh.setLevel(logging.INFO)
     logging.getLogger(logger_name).addHandler(fh)
     logging.info(f"[green]Log to[/]: '{path}'")
+    return fh
 
 
 def check_threads(threads: int) -> int:
@@ -4,9 +4,10 @@
 """
 
 import argparse
-from ifpd import query
+from ifpd import database, query, stats
 from ifpd.scripts import arguments as ap  # type: ignore
 from ifpd.exception import enable_rich_assert
+from joblib import Parallel, delayed  # type: ignore
 import logging
 from rich.logging import RichHandler  # type: ignore
 
@@ -30,6 +31,13 @@ Checks integrity of a database. Specifically:
     * An ODN must end after it starts.
     * No ODNs can start from the same position.
     * No ODNs can be totally included in another one.
+    * The binary copy of the chromosome, if present, must match.
+    * Statistics and checksum must match those stored in ".config", if present.
+
+Each chromosome is read once, in blocks, and chromosomes can be checked in
+parallel. With --quick, only the checksum of each chromosome file is compared
+to the one stored in ".config" when the database was built, and the stored
+statistics are checked.
 """,
         formatter_class=argparse.RawDescriptionHelpFormatter,
         help="Check integrity of a database.",
@@ -38,8 +46,25 @@ Checks integrity of a database. Specifically:
     parser.add_argument(
         "dbDirPath", type=str, default=".", help="""Path to database directory."""
     )
+    parser.add_argument(
+        "--quick",
+        action="store_const",
+        const=True,
+        default=False,
+        help="""Check only the checksums and statistics stored in ".config".""",
+    )
     parser = ap.add_version_option(parser)
 
+    advanced = parser.add_argument_group("advanced arguments")
+    advanced.add_argument(
+        "-t",
+        "--threads",
+        metavar="nthreads",
+        type=int,
+        help="""Number of threads for parallelization. Default: 1""",
+        default=1,
+    )
+
     parser.set_defaults(parse=parse_arguments, run=run)
 
     return parser
@@ -47,6 +72,7 @@ Checks integrity of a database. Specifically:
 
 @enable_rich_assert
 def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
+    args.threads = ap.check_threads(args.threads)
     return args
 
 
@@ -54,7 +80,28 @@ def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
 def run(args: argparse.Namespace) -> None:
     logging.info("Read database.")
     oligoDB = query.OligoDatabase(args.dbDirPath)
-    oligoDB.read_all_chromosomes(True)
+    chromList = oligoDB.get_chromosome_list()
+    assert 0 < len(chromList), f"no chromosome files found in {args.dbDirPath}"
+
+    logging.info(
+        f"Check {len(chromList)} chromosomes{' (quick)' if args.quick else ''}."
+    )
+    check = database.check_chromosome_quick if args.quick else database.check_chromosome
+    if 1 == args.threads:
+        statsList = []
+        for chrom in chromList:
+            statsList.append(check(args.dbDirPath, chrom))
+            logging.info(f" {chrom}: {statsList[-1].count} oligos.")
+    else:
+        statsList = Parallel(n_jobs=args.threads, verbose=1)(
+            delayed(check)(args.dbDirPath, chrom) for chrom in chromList
+        )
+    oligoStats = stats.OligoStats.merge(statsList)
+    assert (
+        oligoStats.overlaps == oligoDB.has_overlaps()
+    ), 'overlaps status does not match ".config"'
+    logging.info(f"Found {oligoStats.count} oligos.")
+
     logging.info(f'Database name: "{oligoDB.get_name()}"')
 
     refGenome = oligoDB.get_reference_genome()
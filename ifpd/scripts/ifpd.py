@@ -15,7 +15,7 @@ def default_parser(*args) -> None:
     sys.exit()
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description=f"""
 Version:    {__version__}
@@ -40,6 +40,10 @@ An iFISH probe design pipeline, with web interface included.
     scripts.query.query.init_parser(subparsers)
     scripts.serve.init_parser(subparsers)
 
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
     args = args.parse(args)
     args.run(args)
@@ -5,13 +5,12 @@
 
 import argparse
 import configparser
-from ifpd import bioext
+from ifpd import bioext, database, stats
 from ifpd.scripts import arguments as ap  # type: ignore
 from ifpd.exception import enable_rich_assert
 import logging
 import numpy as np  # type: ignore
 import os
-import pandas as pd  # type: ignore
 from rich.logging import RichHandler  # type: ignore
 import shutil
 
@@ -86,6 +85,23 @@ https://genome.ucsc.edu/FAQ/FAQformat.html#format1
             and the last position (chromEnd) is actually included. This forces
             a unit increase of that position to convert to UCSC bed format.""",
     )
+    advanced.add_argument(
+        "--buffer-size",
+        metavar="nOligos",
+        type=int,
+        default=database.BUFFER_SIZE,
+        help=f"""Maximum number of oligos kept in memory. Chromosomes not fitting
+        in memory are sorted on disk. Default: {database.BUFFER_SIZE}""",
+    )
+    advanced.add_argument(
+        "-t",
+        "--threads",
+        metavar="nthreads",
+        type=int,
+        help="""Number of threads for parallelization. Chromosomes are sorted and
+        written in parallel. Default: 1""",
+        default=1,
+    )
     advanced.add_argument(
         "--custom-config",
         metavar="config",
@@ -127,40 +143,14 @@ def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
         assert not os.path.isdir(
             args.output
         ), f'output folder already exists: "{args.output}"'
+    args.threads = ap.check_threads(args.threads)
+    assert 0 < args.buffer_size, f"buffer size must be positive: {args.buffer_size}"
     return args
 
 
-def sort_oligos(args, chromList):
-    logging.info("Sort oligos.")
-    has_overlaps = False
-    oligoLengthRange = [np.inf, -np.inf]
-    oligoMinDist = np.inf
-    for chrom in chromList:
-        chromDF = pd.read_csv(os.path.join(args.output, chrom), "\t", header=None)
-        chromDF.columns = bioext.UCSCbed.FIELD_NAMES[1 : (chromDF.shape[1] + 1)]
-
-        chromDF = chromDF.sort_values("chromStart")
-        chromDF.to_csv(
-            os.path.join(args.output, chrom), "\t", header=False, index=False
-        )
-
-        startPositions = np.array(chromDF["chromStart"].iloc[1:].tolist())
-        endPositions = np.array(chromDF["chromEnd"].iloc[:-1].tolist()) - 1
-        if any(startPositions <= endPositions):
-            has_overlaps = True
-
-        oligoLengthList = np.unique(chromDF["chromEnd"] - chromDF["chromStart"])
-        oligoLengthRange[0] = min(oligoLengthRange[0], oligoLengthList.min())
-        oligoLengthRange[1] = max(oligoLengthRange[1], oligoLengthList.max())
-
-        assert len(startPositions) == len(endPositions)
-        if len(startPositions) == 0:
-            continue
-        oligoMinDist = min(oligoMinDist, min(startPositions - endPositions - 1))
-    return oligoMinDist, oligoLengthRange, has_overlaps
-
-
-def mk_config(args, oligoMinDist, oligoLengthRange, has_overlaps):
+def mk_config(args, statsDict):
+    oligoStats = stats.OligoStats.merge(statsDict.values())
+    oligoMinDist = oligoStats.min_dist
     if np.inf == oligoMinDist:
         oligoMinDist = 0
     logging.info("Write config file.")
@@ -168,9 +158,9 @@ def mk_config(args, oligoMinDist, oligoLengthRange, has_overlaps):
     config["DATABASE"] = {"name": args.dbName, "refGenome": args.refGenome}
     config["OLIGOS"] = {
         "min_dist": oligoMinDist,
-        "min_length": oligoLengthRange[0],
-        "max_length": oligoLengthRange[1],
-        "overlaps": str(has_overlaps),
+        "min_length": oligoStats.length_range[0],
+        "max_length": oligoStats.length_range[1],
+        "overlaps": str(oligoStats.overlaps),
     }
     config["SOURCE"] = {
         "bed": args.input,
@@ -181,6 +171,10 @@ def mk_config(args, oligoMinDist, oligoLengthRange, has_overlaps):
         for x in args.custom_config:
             k, v = x.split(":")[:2]
             config["CUSTOM"][k] = v
+    for chrom, chromStats in statsDict.items():
+        config[database.get_chromosome_section(chrom)] = database.stats_to_config(
+            chromStats
+        )
 
     with open(os.path.join(args.output, ".config"), "w+") as OH:
         config.write(OH)
@@ -190,24 +184,18 @@ def mk_config(args, oligoMinDist, oligoLengthRange, has_overlaps):
 def run(args: argparse.Namespace) -> None:
     os.mkdir(args.output)
 
-    logging.info("Set up input buffer.")
-    oligoGenerator = bioext.UCSCbed(
+    logging.info("Parse oligos.")
+    builder = database.DatabaseBuilder(args.output, args.buffer_size)
+    for chunk in bioext.UCSCbed(
         args.input, incrementChromEnd=args.incrementChromEnd, bufferize=True
-    ).buffer(False, False)
-
-    logging.info("Parse and write database.")
-    chromList = set()
-    for line in oligoGenerator:
-        if len(line.strip()) == 0:
-            continue
-        line = line.strip().split("\t")
-        chrom = line.pop(0)
-        line = "\t".join(line) + "\n"
-        chromList.add(chrom)
-        with open(os.path.join(args.output, chrom), "a+") as OH:
-            OH.write(line)
-
-    mk_config(args, *sort_oligos(args, chromList))
+    ).chunks(extraFields=True):
+        builder.append(chunk)
+    logging.info(
+        f" Parsed {builder.count} oligos on {len(builder.buffers)} chromosomes."
+    )
+
+    logging.info("Sort and write database.")
+    mk_config(args, builder.write(threads=args.threads))
     logging.info(f'Created database "{args.dbName}".')
 
     logging.info("Done. :thumbs_up: :smiley:")
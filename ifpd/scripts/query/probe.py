@@ -4,14 +4,14 @@
 """
 
 import argparse
-from ifpd import const, query
+from ifpd import bundle, const, plot, query
 from ifpd.scripts import arguments as ap  # type: ignore
 from ifpd.exception import enable_rich_assert
+from ifpd.progress import ProgressReporter
 import logging
 import numpy as np  # type: ignore
 import os
 from rich.logging import RichHandler  # type: ignore
-from rich.progress import track  # type: ignore
 import shutil
 
 logging.basicConfig(
@@ -35,7 +35,8 @@ oligonucleotides. Concisely, the script does the following:
   all the candidates that do not fall in it.
 - Rank the remaining candidates based on the second feature (featOrder), i.e.,
   decreasing for centrality, increasing for size or homogeneity.
-- Return the top N candidates (maxProbes), with plots, tables, fasta and bed.
+- Return the top N candidates (maxProbes), with tables, fasta and bed, and plots
+  if requested (--plots), or in a columnar result bundle (--bundle).
 """,
         formatter_class=argparse.RawDescriptionHelpFormatter,
         help="Design a FISH probe in a genomic region of interest.",
@@ -121,6 +122,25 @@ oligonucleotides. Concisely, the script does the following:
         help="""Stop if not enough oligos are found,
         instead of designing the largest probe.""",
     )
+    advanced.add_argument(
+        "--plots",
+        action="store_const",
+        dest="plots",
+        const=True,
+        default=False,
+        help="""Render the plots of the exported candidates. By default, only
+        data files are exported, and plots can be rendered later with ifpd.plot.""",
+    )
+    advanced.add_argument(
+        "--bundle",
+        action="store_const",
+        dest="bundle",
+        const=True,
+        default=False,
+        help="""Export the candidates to a columnar result bundle (Arrow IPC files)
+        instead of one folder each. Folders can be exported later with
+        ifpd.bundle.ResultBundle. Requires pyarrow.""",
+    )
     advanced.add_argument(
         "-f",
         action="store_const",
@@ -189,6 +209,10 @@ def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
         args.max_probes = np.inf
     assert args.max_probes >= 0, f"at least 1 probe in output: {args.max_probes}"
 
+    if args.bundle:
+        bundle.assert_available()
+        assert not args.plots, "plots are rendered from folders, not from bundles"
+
     return args
 
 
@@ -196,8 +220,13 @@ def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
 def run(args: argparse.Namespace) -> None:
     os.mkdir(args.outdir)
     ap.add_log_file_handler(os.path.join(args.outdir, "log"))
+    stages = ["read", "candidates", "features", "export"]
+    progress = ProgressReporter.from_outdir(
+        args.outdir, stages + ["plot"] if args.plots else stages
+    )
 
     logging.info("Read database.")
+    progress.start_stage("read")
     oligoDB = query.OligoDatabase(args.database)
 
     assert (
@@ -207,43 +236,31 @@ def run(args: argparse.Namespace) -> None:
         args.chrom
     ), f'chromosome "{args.chrom}" not in the database.'
 
-    oligoDB.read_chromosome(args.chrom)
-    chromData = oligoDB.chromData[args.chrom]
+    selectedOligos = oligoDB.read_region(args.chrom, *args.region)
     if args.region[1] == np.inf:
-        args.region = (args.region[0], chromData["chromEnd"].max())
+        args.region = (args.region[0], selectedOligos["chromEnd"].max())
     chromStart, chromEnd = args.region
     queried_region = (args.chrom, chromStart, chromEnd)
 
-    selectCondition = np.logical_and(
-        chromData.iloc[:, 0] >= chromStart, chromData.iloc[:, 1] <= chromEnd
-    )
-    selectedOligos = chromData.loc[selectCondition, :]
-
-    args = ap.check_n_oligo(args, selectCondition)
+    args = ap.check_n_oligo(args, selectedOligos.shape[0])
 
     logging.info("Build probe candidates.")
-    candidateList = [
-        query.OligoProbe(
-            queried_region[0],
-            selectedOligos.iloc[i : (i + args.n_oligo), :],
-            oligoDB,
-        )
-        for i in track(
-            range(selectedOligos.shape[0] - args.n_oligo + 1),
-            description="Building",
-        )
-    ]
+    progress.start_stage("candidates")
+    candidateList = query.ProbeCandidateList(
+        queried_region[0], selectedOligos, args.n_oligo, oligoDB, progress
+    )
 
     logging.info(f"Found {len(candidateList)} probe candidates.")
 
     logging.info("Describing candidates...")
+    progress.start_stage("features")
     probeFeatureTable = query.ProbeFeatureTable(candidateList, queried_region, True)
     feature_range, feature = probeFeatureTable.filter(args.order[0], args.filter_thr)
     feature_range = np.round(feature_range, 6)
     logging.info(
         "".join(
             [
-                f"Selected {probeFeatureTable.data.shape[0]} candidates ",
+                f"Selected {len(probeFeatureTable)} candidates ",
                 f"in the range {feature_range} of '{feature}'.",
             ]
         )
@@ -261,15 +278,31 @@ def run(args: argparse.Namespace) -> None:
         logging.info(f"Exporting top {args.max_probes} candidates...")
     else:
         logging.info("Exporting candidates...")
-    for i in range(min(args.max_probes, probeFeatureTable.data.shape[0])):
-        candidate = candidateList[probeFeatureTable.data.index[i]]
-        candidatePath = os.path.join(args.outdir, f"candidate_{i}")
-        os.mkdir(candidatePath)
-        candidate.describe(
-            queried_region, os.path.join(candidatePath, f"candidate_{i}.config")
+    nExported = int(min(args.max_probes, len(probeFeatureTable)))
+    progress.start_stage("export", nExported)
+    if args.bundle:
+        bundle.write_probes(
+            args.outdir,
+            probeFeatureTable.data,
+            [candidateList[probeFeatureTable.selection[i]] for i in range(nExported)],
+            queried_region,
         )
-        candidate.get_fasta(os.path.join(candidatePath, f"candidate_{i}.fasta"))
-        candidate.get_bed(os.path.join(candidatePath, f"candidate_{i}.bed"))
-        candidate.plot(candidatePath, queried_region)
-
+        progress.advance(nExported)
+    else:
+        for i in range(nExported):
+            candidate = candidateList[probeFeatureTable.selection[i]]
+            candidatePath = os.path.join(args.outdir, f"candidate_{i}")
+            os.mkdir(candidatePath)
+            candidate.describe(
+                queried_region, os.path.join(candidatePath, f"candidate_{i}.config")
+            )
+            candidate.get_fasta(os.path.join(candidatePath, f"candidate_{i}.fasta"))
+            candidate.get_bed(os.path.join(candidatePath, f"candidate_{i}.bed"))
+            progress.advance()
+
+    if args.plots:
+        logging.info("Plotting candidates...")
+        plot.render_all(args.outdir, progress=progress)
+
+    progress.finish()
     logging.info("Done. :thumbs_up: :smiley:")
@@ -4,9 +4,10 @@
 """
 
 import argparse
-from ifpd import const, query
+from ifpd import bundle, const, plot, query
 from ifpd.scripts import arguments as ap  # type: ignore
 from ifpd.exception import enable_rich_assert
+from ifpd.progress import ProgressReporter
 from joblib import Parallel, delayed  # type: ignore
 import logging
 import numpy as np  # type: ignore
@@ -22,6 +23,9 @@ logging.basicConfig(
     handlers=[RichHandler(markup=True, rich_tracebacks=True)],
 )
 
+STAGES = ["read", "candidates", "features", "windows", "populate", "compare", "export"]
+EXPORT_BATCHES_PER_THREAD = 4
+
 
 def init_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
     parser = subparsers.add_parser(
@@ -38,7 +42,8 @@ as homogeneously spaced as possible. Concisely, the script does the following:
     + Find the best probe in each window.
     + Aggregate each window's best probe into a candidate probe set.
 - Rank candidate probe sets based on probe homogeneity.
-- Return the top N candidates (maxSets), with plots, tables, fasta and bed.
+- Return the top N candidates (maxSets), with tables, fasta and bed, and plots
+  if requested (--plots), or in a columnar result bundle (--bundle).
 """,
         formatter_class=argparse.RawDescriptionHelpFormatter,
         help="Design a FISH probe set in a genomic region.",
@@ -83,8 +88,9 @@ as homogeneously spaced as possible. Concisely, the script does the following:
         metavar="maxProbes",
         type=int,
         default=-1,
-        help="""Maximum number of probe set candidates to output.
-            Set to -1 to retrieve all candidates. Default: -1""",
+        help="""Maximum number of probe set candidates to output. Only the top
+            candidates are exported, the others are only listed in
+            set_candidates.tsv. Set to -1 to retrieve all candidates. Default: -1""",
     )
     parser = ap.add_version_option(parser)
 
@@ -131,6 +137,15 @@ as homogeneously spaced as possible. Concisely, the script does the following:
         default=0.1,
         help="""Window fraction for windows shifting.""",
     )
+    advanced.add_argument(
+        "--plots",
+        action="store_const",
+        dest="plots",
+        const=True,
+        default=False,
+        help="""Render the plots of the exported probe sets. By default, only
+        data files are exported, and plots can be rendered later with ifpd.plot.""",
+    )
     advanced.add_argument(
         "-t",
         "--threads",
@@ -139,6 +154,16 @@ as homogeneously spaced as possible. Concisely, the script does the following:
         help="""Number of threads for parallelization. Default: 1""",
         default=1,
     )
+    advanced.add_argument(
+        "--bundle",
+        action="store_const",
+        dest="bundle",
+        const=True,
+        default=False,
+        help="""Export the probe sets to a columnar result bundle (Arrow IPC files)
+        instead of one folder each. Folders can be exported later with
+        ifpd.bundle.ResultBundle. Requires pyarrow.""",
+    )
     advanced.add_argument(
         "-f",
         action="store_const",
@@ -209,6 +234,10 @@ def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
         args.max_sets = np.inf
     assert args.max_sets >= 0, f"at least 1 probe set in output: {args.max_sets}"
 
+    if args.bundle:
+        bundle.assert_available()
+        assert not args.plots, "plots are rendered from folders, not from bundles"
+
     return args
 
 
@@ -220,47 +249,21 @@ def init_db(
         not oligoDB.has_overlaps()
     ), "databases with overlapping oligos are not supported yet."
 
-    if args.chrom not in oligoDB.chromData.keys():
-        oligoDB.read_chromosome(args.chrom)
-    chromData = oligoDB.chromData[args.chrom]
+    selectedOligos = oligoDB.read_region(args.chrom, *args.region)
     if args.region[1] == np.inf:
-        args.region = (
-            args.region[0],
-            oligoDB.chromData[args.chrom]["chromEnd"].max(),
-        )
+        args.region = (args.region[0], selectedOligos["chromEnd"].max())
     chromStart, chromEnd = args.region
     queried_region = (args.chrom, chromStart, chromEnd)
 
-    selectCondition = np.logical_and(
-        chromData.iloc[:, 0] >= chromStart, chromData.iloc[:, 1] <= chromEnd
-    )
-    selectedOligos = chromData.loc[selectCondition, :]
-
-    return oligoDB, queried_region, selectCondition, selectedOligos
+    return oligoDB, queried_region, selectedOligos
 
 
-def build_candidates(args, queried_region, selectedOligos, oligoDB):
+def build_candidates(args, queried_region, selectedOligos, oligoDB, progress=None):
     logging.info("Build probe candidates.")
     args.threads = ap.check_threads(args.threads)
-    if args.threads != 1:
-        candidateList = Parallel(n_jobs=args.threads, backend="threading", verbose=1)(
-            delayed(query.OligoProbe)(
-                queried_region[0],
-                selectedOligos.iloc[ii : (ii + args.n_oligo), :],
-                oligoDB,
-            )
-            for ii in range(selectedOligos.shape[0] - args.n_oligo + 1)
-        )
-
-    else:
-        candidateList = [
-            query.OligoProbe(
-                queried_region[0],
-                selectedOligos.iloc[i : (i + args.n_oligo), :],
-                oligoDB,
-            )
-            for i in track(range(selectedOligos.shape[0] - args.n_oligo + 1))
-        ]
+    candidateList = query.ProbeCandidateList(
+        queried_region[0], selectedOligos, args.n_oligo, oligoDB, progress
+    )
     logging.info(f"Found {len(candidateList)} probe candidates.")
 
     return candidateList
@@ -297,13 +300,35 @@ def export_window_set(args, queried_region, window_setList, wsi):
     assert not os.path.isdir(window_set_path)
     os.mkdir(window_set_path)
 
-    fasta, bed = window_set.export(window_set_path, queried_region)
-    fasta_path = os.path.join(window_set_path, f"probe_set_{wsi}.fa")
-    bed_path = os.path.join(window_set_path, f"probe_set_{wsi}.bed")
-    with open(fasta_path, "w+") as OH:
-        OH.write(fasta)
-    with open(bed_path, "w+") as OH:
-        OH.write(bed)
+    window_set.export(window_set_path, queried_region)
+
+
+def rank_window_sets(probeCount, probeSetSpread, nTop):
+    """Ranks window sets by number of probes and then homogeneity, both
+    descending. Only the top nTop sets are selected (with a partial sort) and
+    ranked, the others follow in window shift order.
+
+    Args:
+            probeCount (np.ndarray): number of probes per window set.
+            probeSetSpread (np.ndarray): homogeneity per window set.
+            nTop (int): number of window sets to rank.
+
+    Returns:
+            np.ndarray: window set indexes.
+    """
+    order = ["nProbes", "homogeneity"]
+    keys = np.zeros(len(probeCount), dtype=[(name, float) for name in order])
+    keys["nProbes"] = -probeCount
+    keys["homogeneity"] = -probeSetSpread
+
+    if nTop >= len(keys):
+        return np.argsort(keys, order=order, kind="stable")
+    if 0 == nTop:
+        return np.arange(len(keys))
+
+    top = np.argpartition(keys, nTop - 1, order=order)[:nTop]
+    top = top[np.argsort(keys[top], order=order, kind="stable")]
+    return np.concatenate([top, np.setdiff1d(np.arange(len(keys)), top)])
 
 
 def build_feature_table(args, queried_region, candidateList):
@@ -317,61 +342,41 @@ def build_feature_table(args, queried_region, candidateList):
         os.path.join(args.outdir, "probe_candidates.tsv"), "\t", index=False
     )
 
-    assert args.nProbes <= probeFeatureTable.data.shape[0], "".join(
+    assert args.nProbes <= len(probeFeatureTable), "".join(
         [
             "not enough probes in the region of interest: ",
-            f"{probeFeatureTable.data.shape[0]}/{args.nProbes}",
+            f"{len(probeFeatureTable)}/{args.nProbes}",
         ]
     )
 
     return probeFeatureTable
 
 
-def populate_windows(args, candidateList, window_setList, probeFeatureTable):
-    for wsi in range(len(window_setList)):
-        window_set = window_setList[wsi]
-        for wi in range(len(window_set)):
-            window = window_set[wi]
-            probeFeatureTable.reset()
-
-            selectCondition = np.logical_and(
-                probeFeatureTable.data.loc[:, "chromStart"] >= window.chromStart,
-                probeFeatureTable.data.loc[:, "chromEnd"] <= window.chromEnd,
-            )
-            logging.info(
-                "".join(
-                    [
-                        f"Found {selectCondition.sum()} probe candidates",
-                        f" in window #{wi} of set #{wsi}.",
-                    ]
-                )
-            )
-
-            if selectCondition.sum() == 0:
-                window_setList[wsi][wi].probe = None
-                continue
-            elif selectCondition.sum() != 1:
-                probeFeatureTable.keep(selectCondition, cumulative=True)
-                feature_range, feature = probeFeatureTable.filter(
-                    args.order[0], args.filter_thr, cumulative=True
-                )
-                feature_range = np.round(feature_range, 6)
-                logging.info(
-                    "".join(
-                        [
-                            f" Selected {probeFeatureTable.data.shape[0]}",
-                            f" candidates in the range {feature_range} of '{feature}'.",
-                        ]
-                    )
-                )
-                logging.info(
-                    " Ranking probe candidates based on" + f" '{args.order[1]}'."
-                )
-                probeFeatureTable.rank(args.order[1])
-
-            window_setList[wsi][wi].probe = candidateList[
-                probeFeatureTable.data.index[0]
+def populate_windows(
+    args, candidateList, window_setList, probeFeatureTable, progress=None
+):
+    windowList = [window for window_set in window_setList for window in window_set]
+    logging.info(
+        "".join(
+            [
+                f"Select best probe candidate in {len(windowList)} windows,",
+                f" filtering on '{args.order[0]}' and ranking on '{args.order[1]}'.",
             ]
+        )
+    )
+
+    bestList = probeFeatureTable.select_best_in_windows(
+        np.array([window.chromStart for window in windowList]),
+        np.array([window.chromEnd for window in windowList]),
+        args.order,
+        args.filter_thr,
+        threads=args.threads,
+        progress=progress,
+    )
+    for window, best in zip(windowList, bestList):
+        window.probe = None if best < 0 else candidateList[best]
+
+    logging.info(f" Found a probe candidate in {(bestList >= 0).sum()} windows.")
     return window_setList
 
 
@@ -379,20 +384,31 @@ def populate_windows(args, candidateList, window_setList, probeFeatureTable):
 def run(args: argparse.Namespace) -> None:
     os.mkdir(args.outdir)
     ap.add_log_file_handler(os.path.join(args.outdir, "log"))
+    progress = ProgressReporter.from_outdir(
+        args.outdir, STAGES + ["plot"] if args.plots else STAGES
+    )
 
     logging.info("Read database.")
+    progress.start_stage("read")
     oligoDB = query.OligoDatabase(args.database)
-    oligoDB, queried_region, selectCondition, selectedOligos = init_db(args, oligoDB)
-    args = ap.check_n_oligo(args, selectCondition)
+    oligoDB, queried_region, selectedOligos = init_db(args, oligoDB)
+    args = ap.check_n_oligo(args, selectedOligos.shape[0])
 
-    candidateList = build_candidates(args, queried_region, selectedOligos, oligoDB)
+    progress.start_stage("candidates")
+    candidateList = build_candidates(
+        args, queried_region, selectedOligos, oligoDB, progress
+    )
+    progress.start_stage("features")
     probeFeatureTable = build_feature_table(args, queried_region, candidateList)
+    progress.start_stage("windows")
     window_setList = build_windows(args, queried_region, oligoDB)
+    progress.start_stage("populate")
     window_setList = populate_windows(
-        args, candidateList, window_setList, probeFeatureTable
+        args, candidateList, window_setList, probeFeatureTable, progress
     )
 
     logging.info("Compare probe set candidates.")
+    progress.start_stage("compare")
     probeSetSpread = np.array(
         [ws.calc_probe_size_and_homogeneity() for ws in window_setList]
     )
@@ -407,30 +423,51 @@ def run(args: argparse.Namespace) -> None:
     )
 
     logging.info("Rank based on #probes and homogeneity (of probes and size).")
+    nExported = int(min(args.max_sets, len(window_setList)))
+    ranking = rank_window_sets(probeCount, probeSetSpread, nExported)
     probeSetData = pd.DataFrame.from_dict(
         {
-            "id": range(len(window_setList)),
-            "homogeneity": probeSetSpread[np.argsort(probeCount)[::-1]],
-            "nProbes": probeCount[np.argsort(probeCount)[::-1]],
+            "homogeneity": probeSetSpread[ranking],
+            "nProbes": probeCount[ranking],
+            "setStart": [window_setList[i][0].chromStart for i in ranking],
+            "exported": np.arange(len(ranking)) < nExported,
         }
     )
-    probeSetData.sort_values(
-        by=["nProbes", "homogeneity"], ascending=[False, False], inplace=True
-    )
-    probeSetData.drop("id", axis=1).to_csv(
+    probeSetData.to_csv(
         os.path.join(args.outdir, "set_candidates.tsv"), "\t", index=False
     )
 
-    logging.info("Export probe set candidates.")
-    window_setList = [window_setList[i] for i in probeSetData["id"].values]
+    logging.info(f"Export top {nExported}/{len(window_setList)} probe set candidates.")
+    window_setList = [window_setList[i] for i in ranking[:nExported]]
+    progress.start_stage("export", len(window_setList))
 
-    if args.threads != 1:
-        Parallel(n_jobs=args.threads, verbose=1)(
-            delayed(export_window_set)(args, queried_region, window_setList, wsi)
-            for wsi in range(len(window_setList))
+    if args.bundle:
+        bundle.write_probe_sets(
+            args.outdir, probeSetData, window_setList, queried_region
         )
+        progress.advance(len(window_setList))
+    elif args.threads != 1:
+        batchSize = args.threads * EXPORT_BATCHES_PER_THREAD
+        with Parallel(n_jobs=args.threads, verbose=1) as parallel:
+            for batchStart in range(0, len(window_setList), batchSize):
+                batch = range(
+                    batchStart, min(batchStart + batchSize, len(window_setList))
+                )
+                parallel(
+                    delayed(export_window_set)(
+                        args, queried_region, window_setList, wsi
+                    )
+                    for wsi in batch
+                )
+                progress.advance(len(batch))
     else:
         for wsi in track(range(len(window_setList))):
             export_window_set(args, queried_region, window_setList, wsi)
+            progress.advance()
+
+    if args.plots:
+        logging.info("Plot probe set candidates.")
+        plot.render_all(args.outdir, args.threads, progress)
 
+    progress.finish()
     logging.info("Done. :thumbs_up: :smiley:")
@@ -11,6 +11,7 @@ from ifpd.exception import enable_rich_assert
 import importlib.util
 import logging
 import os
+import time
 from rich.logging import RichHandler  # type: ignore
 
 logging.basicConfig(
@@ -58,9 +59,32 @@ def init_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentPars
         default="email@example.com",
         help="Email address of server admin.",
     )
+    parser.add_argument(
+        "--debug",
+        action="store_const",
+        const=True,
+        default=False,
+        help="""Run in debug mode: templates are re-loaded at every request, and
+        errors are shown in the web interface.""",
+    )
     parser = ap.add_version_option(parser)
 
     advanced = parser.add_argument_group("advanced arguments")
+    advanced.add_argument(
+        "--threads",
+        metavar="nthreads",
+        type=int,
+        default=10,
+        help="""Number of threads serving web requests. Default: 10""",
+    )
+    advanced.add_argument(
+        "--keep-alive",
+        metavar="seconds",
+        type=float,
+        default=5,
+        help="""Time after which idle connections are closed. Set to 0 to close
+        connections after each request. Default: 5""",
+    )
     advanced.add_argument(
         "--hide-breadcrumbs",
         action="store_const",
@@ -69,6 +93,46 @@ def init_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentPars
         default=True,
         help="""Hide navigation breadcrumbs.""",
     )
+    advanced.add_argument(
+        "--max-running",
+        metavar="nQueries",
+        type=int,
+        default=1,
+        help="""Maximum number of queries running at the same time. Default: 1""",
+    )
+    advanced.add_argument(
+        "--cache-size",
+        metavar="MB",
+        type=int,
+        default=512,
+        help="""Memory budget of the chromosome cache of each running query
+        process, in MB. Set to 0 to disable. Default: 512""",
+    )
+    advanced.add_argument(
+        "--results-size",
+        metavar="MB",
+        type=int,
+        default=10240,
+        help="""Size budget of reusable query results, in MB. The least recently
+        used results are no longer reused when exceeded, but are kept on disk.
+        Set to 0 for no limit. Default: 10240""",
+    )
+    advanced.add_argument(
+        "--results-age",
+        metavar="days",
+        type=float,
+        default=30,
+        help="""Reusable query results not used for longer than this are no
+        longer reused, but are kept on disk. Set to 0 for no limit. Default: 30""",
+    )
+    advanced.add_argument(
+        "--plot-workers",
+        metavar="nProcesses",
+        type=int,
+        default=1,
+        help="""Number of processes rendering query plots, when they are first
+        viewed. Default: 1""",
+    )
     advanced.add_argument(
         "-R",
         "--custom-routes",
@@ -100,9 +164,57 @@ def init_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentPars
 
 @enable_rich_assert
 def parse_arguments(args: argparse.Namespace) -> argparse.Namespace:
+    assert 1 <= args.max_running, f"at least 1 running query needed: {args.max_running}"
+    assert 0 <= args.cache_size, f"negative cache size: {args.cache_size}"
+    assert 0 <= args.results_size, f"negative results size: {args.results_size}"
+    assert 0 <= args.results_age, f"negative results age: {args.results_age}"
+    assert 1 <= args.plot_workers, f"at least 1 plot worker needed: {args.plot_workers}"
+    assert 1 <= args.threads, f"at least 1 thread needed: {args.threads}"
+    assert 0 <= args.keep_alive, f"negative keep-alive timeout: {args.keep_alive}"
     return args
 
 
+class RequestTimer(object):
+    """WSGI middleware logging the method, path, status, and duration of each
+    request. The duration includes sending the response body, e.g., streamed
+    downloads.
+
+    Args:
+            app (callable): WSGI application.
+    """
+
+    def __init__(self, app):
+        super(RequestTimer, self).__init__()
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        startTime = time.perf_counter()
+        status = ["-"]
+
+        def timed_start_response(code, headers, exc_info=None):
+            status[0] = code.split(" ", 1)[0]
+            return start_response(code, headers, exc_info)
+
+        body = self.app(environ, timed_start_response)
+        try:
+            for chunk in body:
+                yield chunk
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+            logging.info(
+                " ".join(
+                    [
+                        environ.get("REQUEST_METHOD", "-"),
+                        environ.get("SCRIPT_NAME", "").rstrip("/")
+                        + environ.get("PATH_INFO", ""),
+                        status[0],
+                        f"{(time.perf_counter() - startTime) * 1000:.1f}ms",
+                    ]
+                )
+            )
+
+
 def add_static_routes_includes(root, root_path):
     # CSS files
     @root.route("/css/<path>")
@@ -170,6 +282,11 @@ def build_root_app(args, home_template, home_status):
         root_path,
         "http://%s:%d/" % (args.url, args.port),
         "probe-design/",
+        MAX_CURR=args.max_running,
+        CACHE_SIZE=args.cache_size * 1024**2,
+        RESULTS_SIZE=args.results_size * 1024**2,
+        RESULTS_AGE=args.results_age * 24 * 60 * 60,
+        PLOT_WORKERS=args.plot_workers,
     )
     pdApp.admin_email = args.mail
 
@@ -241,6 +358,24 @@ def run(args: argparse.Namespace) -> None:
 
     # RUN ==========================================================================
 
-    root.run(host=args.url, port=args.port, debug=True, server="paste")
+    serverOptions = dict(use_threadpool=True, threadpool_workers=args.threads)
+    if 0 < args.keep_alive:
+        serverOptions.update(
+            protocol_version="HTTP/1.1",
+            socket_timeout=args.keep_alive,
+            daemon_threads=True,
+        )
+    if not args.debug:
+        logging.getLogger("wsgi").propagate = False
+    logging.info(f"Listening on http://{args.url}:{args.port}/")
+    bot.run(
+        app=RequestTimer(root),
+        host=args.url,
+        port=args.port,
+        debug=args.debug,
+        quiet=not args.debug,
+        server="paste",
+        **serverOptions,
+    )
 
     logging.info("Done. :thumbs_up: :smiley:")
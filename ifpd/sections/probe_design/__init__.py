@@ -4,9 +4,19 @@
 """
 
 from ifpd.sections.probe_design.app import App
+from ifpd.sections.probe_design.catalog import DatabaseCatalog
 from ifpd.sections.probe_design.enquirer import Enquirer
 from ifpd.sections.probe_design.query import Query
 from ifpd.sections.probe_design.queue import Queue
 from ifpd.sections.probe_design.routes import Routes
+from ifpd.sections.probe_design.worker import QueryPool
 
-__all__ = ["App", "Enquirer", "Query", "Queue", "Routes"]
+__all__ = [
+    "App",
+    "DatabaseCatalog",
+    "Enquirer",
+    "Query",
+    "QueryPool",
+    "Queue",
+    "Routes",
+]
@@ -4,10 +4,14 @@
 """
 
 from ifpd.sections import app as rootApp
+from ifpd.sections.probe_design.catalog import DatabaseCatalog
 from ifpd.sections.probe_design.enquirer import Enquirer
 from ifpd.sections.probe_design.queue import Queue
+from ifpd.sections.probe_design.results import ResultCache
 from ifpd.sections.probe_design.routes import Routes
+from ifpd.sections.probe_design.worker import PlotRenderer, QueryPool
 import logging
+import os
 from typing import Dict
 
 
@@ -17,10 +21,15 @@ class App(rootApp.App):
     Args:
             app_uri (string): section relative url.
             base_dir (string): section base directory.
-            consumer (Enquirer): queue consumer.
+            catalog (DatabaseCatalog): catalog of available databases.
+            consumers (list): queue consumers (Enquirer).
+            journal_path (string): absolute path to the queue journal.
+            pool (QueryPool): pool of processes running the queries.
             local_path (string): absolute path to app directory.
+            plots (PlotRenderer): renders query plots when first requested.
             qpath (string): absolute path to query folder.
             queue (Queue): query queue.
+            results (ResultCache): index of reusable query results.
             root_path (string): webserver root absolute path.
             root_uri (string): root webserver url.
             route_list (string): probe_design.routes.Routes instance.
@@ -29,6 +38,12 @@ class App(rootApp.App):
             vd (string): view data.
             vpath (string): absolute path to views folder.
             BUF_SIZE (int): queue size.
+            MAX_CURR (int): maximum number of running tasks.
+            N_CONSUMERS (int): number of queue consumers.
+            CACHE_SIZE (int): chromosome cache budget of each query process.
+            RESULTS_SIZE (int): size budget of reusable query results.
+            RESULTS_AGE (float): maximum age of reusable query results.
+            PLOT_WORKERS (int): number of processes rendering plots.
     """
 
     vd: Dict = {}
@@ -38,6 +53,11 @@ class App(rootApp.App):
     vd = {}
     BUF_SIZE = 0
     MAX_CURR = 1
+    N_CONSUMERS = None
+    CACHE_SIZE = 0
+    RESULTS_SIZE = 0
+    RESULTS_AGE = 0
+    PLOT_WORKERS = 1
 
     def __init__(
         self,
@@ -48,6 +68,11 @@ class App(rootApp.App):
         app_uri,
         MAX_CURR=None,
         BUF_SIZE=None,
+        N_CONSUMERS=None,
+        CACHE_SIZE=None,
+        RESULTS_SIZE=None,
+        RESULTS_AGE=None,
+        PLOT_WORKERS=None,
     ):
         """Initialize.
 
@@ -58,6 +83,15 @@ class App(rootApp.App):
                 app_uri (string): section relative url.
                 MAX_CURR (int): maximum number of running tasks.
                 BUF_SIZE (int): queue size, defaults to 0.
+                N_CONSUMERS (int): number of queue consumers, defaults to MAX_CURR.
+                CACHE_SIZE (int): chromosome cache budget of each query process,
+                        in bytes. Defaults to 0 (no cache).
+                RESULTS_SIZE (int): size budget of reusable query results, in
+                        bytes. Defaults to 0 (no limit).
+                RESULTS_AGE (float): maximum age of reusable query results, in
+                        seconds. Defaults to 0 (no limit).
+                PLOT_WORKERS (int): number of processes rendering plots,
+                        defaults to 1.
         """
 
         # Run default initialization
@@ -75,8 +109,7 @@ class App(rootApp.App):
         self.static_path = static_path
         self.vpath = "%s/views/" % self.local_path
         self.qpath = "%s/query/" % self.static_path
-        self.MAX_CURR = MAX_CURR
-        self.BUF_SIZE = BUF_SIZE
+        self.journal_path = os.path.join(self.qpath, ".queue.sqlite")
 
         # Start setting up view dictionary
         self.vd["app_uri"] = "%s%s" % (root_uri, app_uri)
@@ -95,6 +128,18 @@ class App(rootApp.App):
             self.MAX_CURR = MAX_CURR
         if type(None) != type(BUF_SIZE):
             self.BUF_SIZE = BUF_SIZE
+        if type(None) != type(N_CONSUMERS):
+            self.N_CONSUMERS = N_CONSUMERS
+        if type(None) == type(self.N_CONSUMERS):
+            self.N_CONSUMERS = self.MAX_CURR
+        if type(None) != type(CACHE_SIZE):
+            self.CACHE_SIZE = CACHE_SIZE
+        if type(None) != type(RESULTS_SIZE):
+            self.RESULTS_SIZE = RESULTS_SIZE
+        if type(None) != type(RESULTS_AGE):
+            self.RESULTS_AGE = RESULTS_AGE
+        if type(None) != type(PLOT_WORKERS):
+            self.PLOT_WORKERS = PLOT_WORKERS
 
         # Logging config
         logging.basicConfig(
@@ -102,9 +147,29 @@ class App(rootApp.App):
         )
 
         # Initialize queue
-        self.queue = Queue(BUF_SIZE=self.BUF_SIZE, MAX_CURR=self.MAX_CURR)
-        self.consumer = Enquirer(self.queue)
-        self.consumer.start()
+        self.queue = Queue(
+            BUF_SIZE=self.BUF_SIZE,
+            MAX_CURR=self.MAX_CURR,
+            JOURNAL_PATH=self.journal_path,
+        )
+        self.pool = QueryPool(self.MAX_CURR, self.CACHE_SIZE)
+        self.consumers = [
+            Enquirer(self.queue, self.pool) for i in range(self.N_CONSUMERS)
+        ]
+        for cmd in self.queue.interrupted:
+            try:
+                self.consumers[0].restore_query(cmd)
+            except Exception as e:
+                logging.exception(e)
+        for consumer in self.consumers:
+            consumer.start()
+        self.plots = PlotRenderer(QueryPool(self.PLOT_WORKERS))
+
+        # Catalog databases
+        self.catalog = DatabaseCatalog(os.path.join(self.static_path, "db"))
+
+        # Index reusable results
+        self.results = ResultCache(self.qpath, self.RESULTS_SIZE, self.RESULTS_AGE)
 
         # Save queue
         self.vd["queue"] = self.queue
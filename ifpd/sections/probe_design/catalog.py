@@ -0,0 +1,136 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+import configparser
+import logging
+import os
+import threading
+import time
+
+
+class DatabaseEntry(object):
+    """Description of a database in the catalog.
+
+    Args:
+            dirName (string): database folder name.
+            config (configparser.ConfigParser): database .config.
+            chromosomes (list): sorted chromosome names.
+            counts (dict): oligo count of each chromosome, if known.
+            sizes (dict): size of each chromosome file, in bytes.
+            signature (tuple): modification times of the database folder and of
+                    its .config file when the entry was read.
+    """
+
+    def __init__(self, dirPath):
+        super(DatabaseEntry, self).__init__()
+        self.dirName = os.path.basename(dirPath)
+        self.signature = DatabaseEntry.get_signature(dirPath)
+        self.config = configparser.ConfigParser()
+        with open(os.path.join(dirPath, ".config"), "r") as IH:
+            self.config.read_string("".join(IH.readlines()))
+
+        self.chromosomes = []
+        self.counts = {}
+        self.sizes = {}
+        for item in os.scandir(dirPath):
+            if item.name.startswith(".") or not item.is_file():
+                continue
+            self.chromosomes.append(item.name)
+            self.sizes[item.name] = item.stat().st_size
+            section = f"CHROM:{item.name}"
+            if section in self.config:
+                self.counts[item.name] = self.config[section].getint("count")
+        self.chromosomes.sort()
+
+    @property
+    def name(self):
+        return self.config["DATABASE"]["name"]
+
+    @property
+    def refGenome(self):
+        return self.config["DATABASE"]["refGenome"]
+
+    @staticmethod
+    def get_signature(dirPath):
+        """Modification times of a database folder, which changes when
+        chromosome files are added or removed, and of its .config file."""
+        return (
+            os.stat(dirPath).st_mtime_ns,
+            os.stat(os.path.join(dirPath, ".config")).st_mtime_ns,
+        )
+
+
+class DatabaseCatalog(object):
+    """In-memory catalog of the databases in a folder.
+
+    The catalog is refreshed when accessed, at most once every POLL_INTERVAL
+    seconds. Only databases whose folder or .config changed since they were
+    last read are read again.
+
+    Args:
+            db_root (string): path to the database folder.
+            entries (dict): DatabaseEntry of each database, by folder name.
+            POLL_INTERVAL (float): minimum time between refreshes, in seconds.
+    """
+
+    POLL_INTERVAL = 5
+
+    def __init__(self, db_root, POLL_INTERVAL=None):
+        super(DatabaseCatalog, self).__init__()
+        self.db_root = db_root
+        if type(None) != type(POLL_INTERVAL):
+            self.POLL_INTERVAL = POLL_INTERVAL
+        self.entries = {}
+        self.last_refresh = None
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self, force=False):
+        """Reads new or changed databases, and forgets removed ones."""
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.last_refresh is not None:
+                if now - self.last_refresh < self.POLL_INTERVAL:
+                    return
+            self.last_refresh = now
+
+            entries = {}
+            for item in sorted(os.scandir(self.db_root), key=lambda x: x.name):
+                if not item.is_dir():
+                    continue
+                try:
+                    signature = DatabaseEntry.get_signature(item.path)
+                except FileNotFoundError:
+                    continue
+                entry = self.entries.get(item.name, None)
+                if entry is None or entry.signature != signature:
+                    try:
+                        entry = DatabaseEntry(item.path)
+                    except (OSError, configparser.Error, KeyError) as e:
+                        logging.warning(f'Cannot read database "{item.name}": {e}')
+                        continue
+                entries[item.name] = entry
+            self.entries = entries
+
+    def get_entries(self):
+        """Database entries, sorted by folder name."""
+        self.refresh()
+        return list(self.entries.values())
+
+    def get_configs(self):
+        """Database .config of each database, sorted by folder name."""
+        return [entry.config for entry in self.get_entries()]
+
+    def get_names(self):
+        """Database folder name of each database, by database name."""
+        return {entry.name: entry.dirName for entry in self.get_entries()}
+
+    def get_chromosomes(self, dirName):
+        """Sorted chromosome list of a database, empty if not found."""
+        self.refresh()
+        entry = self.entries.get(dirName, None)
+        if entry is None:
+            return []
+        return list(entry.chromosomes)
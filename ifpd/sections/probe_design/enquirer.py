@@ -7,26 +7,31 @@ import configparser
 import datetime
 import logging
 import os
+import shutil
 import subprocess as sp
 import threading
 import time
 
 
 class Enquirer(threading.Thread):
-    """Database enquirer."""
+    """Database enquirer. Multiple enquirers can consume the same queue, which
+    limits the number of queries running at the same time."""
 
-    def __init__(self, queue):
+    def __init__(self, queue, pool=None):
         """Instance method.
 
         Args:
                 queue (Queue): Queue object which will contain the queries.
+                pool (QueryPool): pool of processes running the queries. If None,
+                        each query is run in a new ifpd process.
         """
 
         # Initializer
-        super(Enquirer, self).__init__()
+        super(Enquirer, self).__init__(daemon=True)
 
         # Set class vars
         self.queue = queue
+        self.pool = pool
 
         # Close
         return
@@ -44,40 +49,55 @@ class Enquirer(threading.Thread):
     def __get_outdir_id(self, cmd):
         return 5
 
+    def restore_query(self, cmd):
+        """Prepare a query interrupted by a restart to be run again, removing
+        its partial output and setting its status back to queued."""
+        outdir_id = self.__get_outdir_id(cmd)
+        logging.warning(f'Queueing again interrupted query "{cmd[outdir_id]}"')
+        if os.path.isdir(cmd[outdir_id]):
+            shutil.rmtree(cmd[outdir_id])
+        config = self.readQueryConfig(cmd[outdir_id])
+        config["GENERAL"]["status"] = "queued"
+        self.writeQueryConfig(cmd[outdir_id], config)
+
+    def run_query(self, cmd):
+        """Run one query, tracking its status in the query config."""
+        outdir_id = self.__get_outdir_id(cmd)
+
+        query_id = os.path.basename(cmd[outdir_id])
+        errorLogPath = f"{cmd[outdir_id]}.error.log"
+        logging.debug(f'Running query "{query_id}"')
+        timestamp = time.time()
+        isotimestamp = datetime.datetime.fromtimestamp(timestamp).isoformat()
+        config = self.readQueryConfig(cmd[outdir_id])
+        config["GENERAL"]["status"] = "running"
+        config["WHEN"]["start_time"] = f"{timestamp}"
+        config["WHEN"]["start_isotime"] = isotimestamp
+        self.writeQueryConfig(cmd[outdir_id], config)
+
+        if self.pool is None:
+            with open(errorLogPath, "w+") as EH:
+                sp.call(cmd, stderr=EH)
+        else:
+            self.pool.run(cmd, errorLogPath)
+
+        timestamp = time.time()
+        isotimestamp = datetime.datetime.fromtimestamp(timestamp).isoformat()
+        logging.debug(f'Finished query "{query_id}"')
+        config = self.readQueryConfig(cmd[outdir_id])
+        config["GENERAL"]["status"] = "done"
+        config["WHEN"]["done_time"] = f"{timestamp}"
+        config["WHEN"]["done_isotime"] = isotimestamp
+        self.writeQueryConfig(cmd[outdir_id], config)
+
     def run(self):
-        """Run one query from the queue."""
+        """Run queries from the queue, waiting for them when idle."""
 
         while True:
-            if not self.queue.empty():
-                cmd = self.queue.get()
-
-                # If the queue released a task
-                if type(None) != type(cmd):
-                    outdir_id = self.__get_outdir_id(cmd)
-
-                    query_id = os.path.basename(cmd[outdir_id])
-                    with open(f"{cmd[outdir_id]}.error.log", "w+") as EH:
-                        logging.debug(f'Running query "{query_id}"')
-                        timestamp = time.time()
-                        isotimestamp = datetime.datetime.fromtimestamp(
-                            timestamp
-                        ).isoformat()
-                        config = self.readQueryConfig(cmd[outdir_id])
-                        config["GENERAL"]["status"] = "running"
-                        config["WHEN"]["start_time"] = f"{timestamp}"
-                        config["WHEN"]["start_isotime"] = isotimestamp
-                        self.writeQueryConfig(cmd[outdir_id], config)
-
-                        sp.call(cmd, stderr=EH)
-                        timestamp = time.time()
-                        isotimestamp = datetime.datetime.fromtimestamp(
-                            timestamp
-                        ).isoformat()
-                        logging.debug(f'Finished query "{query_id}"')
-                        config = self.readQueryConfig(cmd[outdir_id])
-                        config["GENERAL"]["status"] = "done"
-                        config["WHEN"]["done_time"] = f"{timestamp}"
-                        config["WHEN"]["done_isotime"] = isotimestamp
-                        self.writeQueryConfig(cmd[outdir_id], config)
-                        cmd = self.queue.task_done(cmd)
-        return
+            cmd = self.queue.get()
+            try:
+                self.run_query(cmd)
+            except Exception as e:
+                logging.exception(e)
+            finally:
+                self.queue.task_done(cmd)
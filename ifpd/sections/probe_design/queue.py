@@ -3,64 +3,230 @@
 @contact: gigi.ga90@gmail.com
 """
 
+import json
+import logging
 import queue as q
-from typing import List
+import sqlite3
+import threading
+import time
+from typing import Dict, List
 
 
 class Queue(q.Queue):
     """Database query Queue.
 
+    When a journal path is provided, tasks are also stored in an SQLite
+    database, so that queued tasks survive a restart. Tasks that were running
+    when the server stopped are queued again, at the front of the queue.
+
     Args:
             MAX_CURR (int): maximum number of simultaneously released tasks.
+            HISTORY_SIZE (int): maximum number of completed tasks remembered.
             doing (list): list of currently released tasks (i.e., running).
             done (list): list of completed tasks.
+            interrupted (list): tasks that were running when the server stopped.
+            journal (sqlite3.Connection): task journal, if any.
+            info (dict): metadata of each queued or running task.
+            version (int): incremented at every change of the queue status,
+                    starting from the creation time of the queue.
     """
 
     MAX_CURR = 1
-    doing: List = []
-    done: List = []
+    HISTORY_SIZE = 1000
 
-    def __init__(self, MAX_CURR=None, **kwargs):
+    def __init__(
+        self, MAX_CURR=None, BUF_SIZE=None, JOURNAL_PATH=None, HISTORY_SIZE=None
+    ):
         """Instance method.
 
         Args:
-                n_doing (int): max number of simultaneously running tasks.
+                MAX_CURR (int): max number of simultaneously running tasks.
+                BUF_SIZE (int): max number of queued tasks, 0 for no limit.
+                JOURNAL_PATH (string): path to the SQLite task journal. If None,
+                        tasks are kept only in memory.
+                HISTORY_SIZE (int): max number of completed tasks remembered.
         """
         if type(None) != type(MAX_CURR):
             self.MAX_CURR = MAX_CURR
+        if type(None) != type(HISTORY_SIZE):
+            self.HISTORY_SIZE = HISTORY_SIZE
+        assert 1 <= self.MAX_CURR, f"at least 1 running task needed: {self.MAX_CURR}"
+        assert 0 <= self.HISTORY_SIZE, f"negative history size: {self.HISTORY_SIZE}"
         super(Queue, self).__init__()
+        self.doing: List = []
+        self.done: List = []
+        self.interrupted: List = []
+        self.running = threading.BoundedSemaphore(self.MAX_CURR)
+        self.status_lock = threading.Lock()
+        self.journal = None
+        self.info: Dict = {}
+        self.version = time.time_ns()
+        if type(None) != type(JOURNAL_PATH):
+            self.__open_journal(JOURNAL_PATH)
+        self.maxsize = 0 if BUF_SIZE is None else BUF_SIZE
         return
 
-    def get(self, **kwargs):
-        """Extend original get method by setting up doing.
-        Also forces only one element to be running at a time.
+    def __open_journal(self, path):
+        """Opens the task journal, and queues again any pending task."""
+        self.journal = sqlite3.connect(path, check_same_thread=False)
+        with self.journal:
+            self.journal.execute(
+                """CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cmd TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    time REAL NOT NULL,
+                    info TEXT)"""
+            )
+            columns = [x[1] for x in self.journal.execute("PRAGMA table_info(tasks)")]
+            if "info" not in columns:
+                self.journal.execute("ALTER TABLE tasks ADD COLUMN info TEXT")
+        rows = self.journal.execute(
+            """SELECT cmd, status, info FROM tasks WHERE status != 'done'
+            ORDER BY status = 'queued', id"""
+        ).fetchall()
+        for cmd, status, info in rows:
+            task = json.loads(cmd)
+            if "running" == status:
+                self.interrupted.append(task)
+            self.info[cmd] = {} if info is None else json.loads(info)
+            super(Queue, self).put(task)
+        self.done = [
+            json.loads(cmd)
+            for (cmd,) in self.journal.execute(
+                """SELECT cmd FROM tasks WHERE status = 'done'
+                ORDER BY id DESC LIMIT ?""",
+                (self.HISTORY_SIZE,),
+            ).fetchall()[::-1]
+        ]
+        if rows:
+            logging.info(
+                f"Restored {len(rows)} queued tasks, "
+                + f"{len(self.interrupted)} of which interrupted."
+            )
+
+    def __set_status(self, task, status):
+        """Updates the status of a task in the journal. Must be called with
+        the status lock acquired."""
+        if self.journal is None:
+            return
+        with self.journal:
+            self.journal.execute(
+                """UPDATE tasks SET status = ?, time = ? WHERE id = (
+                    SELECT id FROM tasks WHERE cmd = ? AND status != 'done'
+                    ORDER BY id LIMIT 1)""",
+                (status, time.time(), json.dumps(task)),
+            )
+
+    def __trim_history(self):
+        """Forgets the oldest completed tasks, beyond HISTORY_SIZE. Must be
+        called with the status lock acquired."""
+        if len(self.done) > self.HISTORY_SIZE:
+            del self.done[: len(self.done) - self.HISTORY_SIZE]
+        if self.journal is None:
+            return
+        with self.journal:
+            self.journal.execute(
+                """DELETE FROM tasks WHERE status = 'done' AND id NOT IN (
+                    SELECT id FROM tasks WHERE status = 'done'
+                    ORDER BY id DESC LIMIT ?)""",
+                (self.HISTORY_SIZE,),
+            )
+
+    def put(self, item, block=True, timeout=None, info=None):
+        """Extend original put method by storing the task, and its metadata, in
+        the journal before queueing it. Tasks and metadata must be
+        JSON-serializable.
+
+        Args:
+                info (dict): task metadata, reported by status.
         """
+        key = json.dumps(item)
+        with self.status_lock:
+            self.info[key] = {} if info is None else dict(info)
+            if self.journal is not None:
+                with self.journal:
+                    rowid = self.journal.execute(
+                        """INSERT INTO tasks (cmd, status, time, info)
+                        VALUES (?, ?, ?, ?)""",
+                        (key, "queued", time.time(), json.dumps(self.info[key])),
+                    ).lastrowid
+        try:
+            super(Queue, self).put(item, block, timeout)
+        except q.Full:
+            with self.status_lock:
+                self.info.pop(key, None)
+                if self.journal is not None:
+                    with self.journal:
+                        self.journal.execute("DELETE FROM tasks WHERE id = ?", (rowid,))
+            raise
+        with self.status_lock:
+            self.version += 1
+
+    def get(self, block=True, timeout=None):
+        """Extend original get method by setting up doing.
+        Waits until less than MAX_CURR elements are running, then waits for an
+        element to be available. Raises queue.Empty like the original method."""
 
-        # Stop if already running
-        if self.MAX_CURR < len(self.doing):
-            return
+        # Wait for a running slot
+        if not self.running.acquire(block, timeout):
+            raise q.Empty
 
         # Call original method
-        released = super(Queue, self).get(**kwargs)
+        try:
+            released = super(Queue, self).get(block, timeout)
+        except q.Empty:
+            self.running.release()
+            raise
 
         # Append released element to released list
-        self.doing.append(released)
+        with self.status_lock:
+            self.doing.append(released)
+            self.__set_status(released, "running")
+            self.version += 1
 
         # Output released element
         return released
 
     def task_done(self, done, **kwargs):
-        """Extend original task_done method by adding doing and done features."""
+        """Extend original task_done method by adding doing and done features.
+        Frees the running slot of the completed task."""
 
         # If unknown task, kill execution
-        if done not in self.doing:
-            return
-
-        # Set the task as completed
-        self.done.append(self.doing.pop(self.doing.index(done)))
+        with self.status_lock:
+            if done not in self.doing:
+                return
+
+            # Set the task as completed
+            self.done.append(self.doing.pop(self.doing.index(done)))
+            if done in self.interrupted:
+                self.interrupted.remove(done)
+            self.__set_status(done, "done")
+            self.__trim_history()
+            self.info.pop(json.dumps(done), None)
+            self.version += 1
 
         # Call original method
         super(Queue, self).task_done(**kwargs)
+        self.running.release()
 
         # Stop
         return
+
+    def status(self):
+        """Metadata of running and queued tasks, with their state and position
+        in the queue, without reading any file.
+
+        Returns:
+                tuple: status version and list of task metadata.
+        """
+        with self.status_lock:
+            with self.mutex:
+                queued = list(self.queue)
+            taskList = []
+            for state, tasks in [("running", self.doing), ("queued", queued)]:
+                for task in tasks:
+                    info = dict(self.info.get(json.dumps(task), {}))
+                    info.update(state=state, position=len(taskList) + 1)
+                    taskList.append(info)
+            return (self.version, taskList)
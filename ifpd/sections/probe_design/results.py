@@ -0,0 +1,194 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+import configparser
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+class ResultCache(object):
+    """Index of query results by database checksum and normalized query
+    parameters, used to reuse the output of identical queries.
+
+    Cached queries are evicted from the index when they have not been used for
+    longer than MAX_AGE seconds, or when the output of all cached queries takes
+    more than MAX_BYTES. Least recently used queries are evicted first. Queued or
+    running queries are never evicted. Evicted queries are only no longer
+    reused: their output is left on disk.
+
+    Args:
+            query_root (string): path to the query folder.
+            MAX_BYTES (int): output size budget of reused queries, in bytes. 0
+                    for no limit.
+            MAX_AGE (float): maximum age, in seconds. 0 for no limit.
+            keys (dict): query ID of each cache key.
+            entries (dict): cache key, last use time, and output size of each
+                    cached query, by query ID.
+    """
+
+    KEY_FIELD = "cache_key"
+    OUTPUT_FILES = {"single": "candidates.tsv", "spotting": "set_candidates.tsv"}
+
+    def __init__(self, query_root, MAX_BYTES=0, MAX_AGE=0):
+        super(ResultCache, self).__init__()
+        self.query_root = query_root
+        self.MAX_BYTES = MAX_BYTES
+        self.MAX_AGE = MAX_AGE
+        self.keys = {}
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.__load()
+
+    def __load(self):
+        """Rebuilds the index from the configuration of past queries."""
+        for configPath in glob.glob(os.path.join(self.query_root, "*.config")):
+            config = self.__read_config(configPath)
+            if config is None or self.KEY_FIELD not in config["GENERAL"]:
+                continue
+            query_id = os.path.basename(configPath)[:-7]
+            key = config["GENERAL"][self.KEY_FIELD]
+            lastUsed = float(
+                config["WHEN"].get("done_time", config["WHEN"].get("time", 0))
+            )
+            if key in self.keys:
+                if lastUsed <= self.entries[self.keys[key]]["last_used"]:
+                    continue
+                self.entries.pop(self.keys[key])
+            self.keys[key] = query_id
+            self.entries[query_id] = dict(key=key, last_used=lastUsed, nbytes=None)
+
+    def __read_config(self, configPath):
+        config = configparser.ConfigParser()
+        try:
+            with open(configPath, "r") as IH:
+                config.read_string("".join(IH.readlines()))
+        except (OSError, configparser.Error):
+            return None
+        if "GENERAL" not in config or "WHEN" not in config:
+            return None
+        return config
+
+    @staticmethod
+    def normalize(value):
+        """Normalizes a query parameter, so that numbers are represented in the
+        same way regardless of how they were typed (e.g., "1e3" and "1000")."""
+        try:
+            number = float(value)
+        except ValueError:
+            return value.strip()
+        if number.is_integer():
+            return str(int(number))
+        return repr(number)
+
+    @staticmethod
+    def get_key(cmd, dbChecksum):
+        """Cache key of a query command, i.e., the hash of the database checksum
+        and of the normalized query parameters. The output directory (the sixth
+        element of the command) and the database path are not part of the key.
+
+        Args:
+                cmd (list): query command line, starting with "ifpd".
+                dbChecksum (string): checksum of the queried database.
+        """
+        params = [ResultCache.normalize(x) for x in cmd[2:3] + cmd[4:5] + cmd[6:]]
+        encoder = hashlib.sha256()
+        encoder.update(bytes(json.dumps([dbChecksum, params]), "utf-8"))
+        return encoder.hexdigest()
+
+    @staticmethod
+    def get_db_checksum(oligoDB, chrom):
+        """Checksum of a chromosome of a database: the MD5 stored in the
+        database .config, if any, and the size and modification time of the
+        chromosome file, to notice files changed after the .config was
+        written."""
+        chromPath = os.path.join(oligoDB.dirPath, chrom)
+        if not os.path.isfile(chromPath):
+            return ""
+        chromStat = os.stat(chromPath)
+        section = f"CHROM:{chrom}"
+        md5 = ""
+        if section in oligoDB.config:
+            md5 = oligoDB.config[section].get("md5", "")
+        return f"{md5}:{chromStat.st_size}:{chromStat.st_mtime_ns}"
+
+    def __is_usable(self, query_id):
+        """Whether a cached query is pending or completed successfully."""
+        config = self.__read_config(os.path.join(self.query_root, f"{query_id}.config"))
+        if config is None:
+            return False
+        status = config["GENERAL"].get("status", "")
+        if "done" != status:
+            return status in ["queued", "running"]
+        outputFile = self.OUTPUT_FILES.get(config["GENERAL"].get("type", ""), None)
+        return outputFile is not None and os.path.isfile(
+            os.path.join(self.query_root, query_id, outputFile)
+        )
+
+    def lookup(self, key):
+        """Query ID of a pending or successful query with the given cache key,
+        or None. Failed or missing queries are removed from the index."""
+        with self.lock:
+            query_id = self.keys.get(key, None)
+            if query_id is None:
+                return None
+            if not self.__is_usable(query_id):
+                self.keys.pop(key)
+                self.entries.pop(query_id)
+                return None
+            self.entries[query_id]["last_used"] = time.time()
+            return query_id
+
+    def add(self, key, query_id):
+        """Adds a newly queued query to the index."""
+        with self.lock:
+            if key in self.keys:
+                self.entries.pop(self.keys[key], None)
+            self.keys[key] = query_id
+            self.entries[query_id] = dict(key=key, last_used=time.time(), nbytes=None)
+
+    def __get_nbytes(self, query_id):
+        nbytes = 0
+        for root, dirs, files in os.walk(os.path.join(self.query_root, query_id)):
+            nbytes += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return nbytes
+
+    def __remove(self, query_id):
+        """Removes a query from the index. Its output is left on disk."""
+        entry = self.entries.pop(query_id)
+        self.keys.pop(entry["key"], None)
+        logging.info(f'Evicting cached query "{query_id}"')
+
+    def evict(self):
+        """Evicts completed queries that are too old, and then the least
+        recently used ones until the disk budget is met."""
+        with self.lock:
+            completed = []
+            for query_id, entry in self.entries.items():
+                config = self.__read_config(
+                    os.path.join(self.query_root, f"{query_id}.config")
+                )
+                if config is not None and "done" != config["GENERAL"]["status"]:
+                    continue
+                if entry["nbytes"] is None:
+                    entry["nbytes"] = self.__get_nbytes(query_id)
+                completed.append((entry["last_used"], query_id))
+            completed.sort()
+
+            if 0 < self.MAX_AGE:
+                oldest = time.time() - self.MAX_AGE
+                while completed and completed[0][0] < oldest:
+                    self.__remove(completed.pop(0)[1])
+
+            if 0 < self.MAX_BYTES:
+                nbytes = sum(self.entries[x[1]]["nbytes"] for x in completed)
+                while completed and nbytes > self.MAX_BYTES:
+                    query_id = completed.pop(0)[1]
+                    nbytes -= self.entries[query_id]["nbytes"]
+                    self.__remove(query_id)
@@ -8,8 +8,13 @@ import configparser
 import datetime
 import hashlib
 import ifpd as fp
+from ifpd import bundle
+import json
+from ifpd.plot import get_plot_names
+from ifpd.progress import PROGRESS_FILE, read_progress
 from ifpd.sections import routes
 from ifpd.sections.probe_design.query import Query
+from ifpd.sections.probe_design.results import ResultCache
 import logging
 import os
 import pandas as pd  # type: ignore
@@ -19,37 +24,81 @@ from typing import Dict
 import zipfile
 
 
-def zipFile(path, ziph, root=None):
-    """Zips a file.
-    Args:
-            path (string): file path.
-            ziph (Zipfile): zipfile handler.
-    Returns:
-            None.
-    """
-    assert os.path.isfile(path), "file expected."
-    oldRoot = ""
-    new_path = path
-    if type(None) != type(root):
-        oldRoot = os.path.commonpath([root, path])
-        if len(oldRoot) != 0 and new_path.startswith(oldRoot):
-            new_path = new_path[len(oldRoot) :]
-    ziph.write(path, new_path)
-
-
-def zipDir(path, ziph, mainRoot=None):
-    """Zips a directory. Based on https://goo.gl/GeCPVm.
+ZIP_CHUNKSIZE = 2**20
+ZIP_STORED_EXTENSIONS = (".png", ".zip", ".gz")
+
+
+class ZipBuffer(object):
+    """Write-only buffer, collecting the output of a zipfile.ZipFile until it is
+    drained. As it cannot seek, zipfile writes sizes and checksums after the
+    data of each file."""
+
+    def __init__(self):
+        super(ZipBuffer, self).__init__()
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def listZipFiles(path, root):
+    """Lists the files in a directory, and their paths in a zip archive.
     Args:
             path (string): directory path.
-            ziph (Zipfile): zipfile handler.
+            root (string): directory that paths in the archive are relative to.
     Returns:
-            None.
+            list: (file path, archive path) tuples, sorted.
     """
-
     assert os.path.isdir(path), "folder expected."
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            zipFile(os.path.join(root, file), ziph, mainRoot)
+    fileList = []
+    for dirpath, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            filePath = os.path.join(dirpath, file)
+            fileList.append((filePath, os.path.relpath(filePath, root)))
+    return fileList
+
+
+def zipStream(fileList, chunksize=ZIP_CHUNKSIZE):
+    """Zips files while reading them, yielding the archive chunk by chunk.
+    Files that are already compressed (e.g., PNG images) are stored, the others
+    deflated.
+    Args:
+            fileList (list): (file path, archive path) tuples.
+            chunksize (int): size of the blocks read from each file.
+    Yields:
+            bytes: archive chunks.
+    """
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, "w") as zipf:
+        for path, arcname in fileList:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            if path.lower().endswith(ZIP_STORED_EXTENSIONS):
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as IH, zipf.open(info, "w") as OH:
+                for chunk in iter(lambda: IH.read(chunksize), b""):
+                    OH.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
 
 
 class Routes(routes.Routes):
@@ -57,7 +106,6 @@ class Routes(routes.Routes):
 
     # Empty routes dictionary
     data: Dict = {}
-    zipDirName = "zips"
 
     def __init__(self):
         """
@@ -139,84 +187,131 @@ class Routes(routes.Routes):
 
         self.add_route("list_chromosomes", "get", "/listChr/<dbDir>")
         self.add_route("queueStatus", "get", "/queueStatus")
+        self.add_route("query_progress", "get", "/q/<query_id>/progress")
+        self.add_route("cacheStatus", "get", "/cacheStatus")
 
         return
 
-    def mkZipDir(routes, self):
-        zipDirPath = os.path.join(self.static_path, "query", routes.zipDirName)
-        if not os.path.isdir(zipDirPath):
-            os.mkdir(zipDirPath)
-
-    def zipQuery(routes, self, query_id):
-        zipDirPath = os.path.join(self.static_path, "query", routes.zipDirName)
-        zipPath = os.path.join(zipDirPath, f"{query_id}.zip")
-        zipf = zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED)
-        zipDir(
-            os.path.join(self.static_path, "query", query_id),
-            zipf,
-            os.path.join(self.static_path, "query"),
-        )
-        zipFile(
-            os.path.join(self.static_path, "query", f"{query_id}.config"),
-            zipf,
-            os.path.join(self.static_path, "query"),
-        )
-        zipf.close()
-
-    def zipCandidate(routes, self, query_id, candidate_id):
-        zipDirPath = os.path.join(self.static_path, "query", routes.zipDirName)
-        zipPath = os.path.join(zipDirPath, f"{query_id}.candidate_{candidate_id}.zip")
-        zipf = zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED)
-        zipDir(
-            os.path.join(
-                self.static_path, "query", query_id, f"candidate_{candidate_id}"
-            ),
-            zipf,
-            os.path.join(
-                self.static_path, "query", query_id, f"candidate_{candidate_id}"
-            ),
-        )
-        zipf.close()
-
-    def zipCandidateSet(routes, self, query_id, candidate_id):
-        zipDirPath = os.path.join(self.static_path, "query", routes.zipDirName)
-        zipPath = os.path.join(zipDirPath, f"{query_id}.probe_set_{candidate_id}.zip")
-        zipf = zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED)
-        zipDir(
-            os.path.join(
-                self.static_path, "query", query_id, f"probe_set_{candidate_id}"
-            ),
-            zipf,
-            os.path.join(
-                self.static_path, "query", query_id, f"probe_set_{candidate_id}"
-            ),
-        )
-        zipf.close()
+    def zip_download(routes, self, fileList, outname):
+        """Stream a zip archive of files in the query output.
 
-    def zipCandidateSetProbe(routes, self, query_id, candidate_id, probe_id):
-        zipDirPath = os.path.join(self.static_path, "query", routes.zipDirName)
-        zipPath = os.path.join(
-            zipDirPath, f"{query_id}.probe_set_{candidate_id}.probe_{probe_id}.zip"
-        )
-        zipf = zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED)
-        zipDir(
-            os.path.join(
-                self.static_path,
-                "query",
-                query_id,
-                f"probe_set_{candidate_id}",
-                f"probe_{probe_id}",
-            ),
-            zipf,
-            os.path.join(
-                self.static_path,
-                "query",
-                query_id,
-                f"probe_set_{candidate_id}",
-                f"probe_{probe_id}",
-            ),
+        The ETag of the response depends on the name, size, and modification
+        time of the zipped files, so that it changes when a query is run again.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                fileList (list): (file path, archive path) tuples.
+                outname (string): name of the downloaded archive.
+        """
+        signature = hashlib.sha256()
+        for filePath, arcname in fileList:
+            fileStat = os.stat(filePath)
+            signature.update(
+                bytes(f"{arcname}:{fileStat.st_size}:{fileStat.st_mtime_ns};", "utf-8")
+            )
+        etag = f'"{signature.hexdigest()}"'
+
+        bot.response.set_header("ETag", etag)
+        bot.response.set_header("Cache-Control", "no-cache")
+        if etag == bot.request.get_header("If-None-Match"):
+            bot.response.status = 304
+            return ""
+
+        bot.response.content_type = "application/zip"
+        bot.response.set_header(
+            "Content-Disposition", f'attachment; filename="{outname}"'
         )
-        zipf.close()
+        return zipStream(fileList)
+
+    def get_output_dir(routes, self, *path):
+        """Path to a folder in the output of a query. Aborts with a 404 error if
+        it does not exist, or if it is not within the query folder.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                path (list): folder path components, starting with the query ID.
+        """
+        qpath = os.path.realpath(os.path.join(self.static_path, "query"))
+        dirPath = os.path.realpath(os.path.join(qpath, *path))
+        if dirPath.startswith(qpath + os.sep):
+            routes.materialize(self, dirPath)
+            if os.path.isdir(dirPath):
+                return dirPath
+        bot.abort(404, "Query output not found.")
+
+    def materialize(routes, self, dirPath):
+        """Exports a candidate, probe set, or probe set probe folder from the
+        result bundle of its query, if the folder is missing.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                dirPath (string): folder path.
+        """
+        dirPath = os.path.normpath(dirPath)
+        outdir, dirName = os.path.split(dirPath)
+        if not bundle.has_bundle(outdir):
+            outdir, dirName = os.path.split(outdir)
+        if os.path.isdir(os.path.join(outdir, dirName)):
+            return
+        if not bundle.has_bundle(outdir) or not bundle.is_available():
+            return
+        try:
+            results = bundle.ResultBundle(outdir)
+            if type(None) != type(results.parse_dir_name(dirName)):
+                results.materialize(dirName)
+        except Exception as e:
+            logging.exception(e)
+
+    def materialize_all(routes, self, outdir):
+        """Exports all the candidate or probe set folders of a query from its
+        result bundle, if missing, so that its archive has the same files as
+        that of a query without a result bundle.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                outdir (string): query output folder path.
+        """
+        if not bundle.has_bundle(outdir) or not bundle.is_available():
+            return
+        try:
+            results = bundle.ResultBundle(outdir)
+            for candidate in range(results.nExported):
+                results.materialize(f"{results.kind}_{candidate}")
+        except Exception as e:
+            logging.exception(e)
+
+    def read_candidate_table(routes, self, query_id, name):
+        """Candidate table of a query, from its result bundle if any.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                query_id (string): query folder name.
+                name (string): candidate table file name.
+        """
+        outdir = os.path.join(self.qpath, query_id)
+        if bundle.has_bundle(outdir) and bundle.is_available():
+            return bundle.read_candidate_table(outdir)
+        return pd.read_csv(os.path.join(outdir, name), "\t")
+
+    def output_file(routes, self, ipath, path, download=False):
+        """Serve a file in the output of a query. Missing folders are exported
+        from the result bundle, and missing plots are rendered, when first
+        requested.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                ipath (string): output folder path.
+                path (string): file name.
+                download (string): name of the downloaded file, if any.
+        """
+        routes.materialize(self, ipath)
+        if path in get_plot_names(ipath) and os.path.isdir(ipath):
+            if not os.path.isfile(os.path.join(ipath, path)):
+                try:
+                    self.plots.render(ipath)
+                except Exception as e:
+                    logging.exception(e)
+        return bot.static_file(path, ipath, download=download)
 
     # Static files -------------------------------------------------------------
 
@@ -231,7 +326,7 @@ class Routes(routes.Routes):
                 path (string): file name.
         """
         ipath = "%s/query/%s/candidate_%s/" % (self.static_path, query_id, candidate_id)
-        return bot.static_file(path, ipath)
+        return routes.output_file(self, ipath, path)
 
     def candidate_static_file_download(routes, self, query_id, candidate_id, path):
         """Download candidate static files.
@@ -245,7 +340,7 @@ class Routes(routes.Routes):
         """
         ipath = "%s/query/%s/candidate_%s/" % (self.static_path, query_id, candidate_id)
         outname = "%s.%s" % (query_id, path)
-        return bot.static_file(path, ipath, download=outname)
+        return routes.output_file(self, ipath, path, outname)
 
     def candidate_set_static_file(routes, self, query_id, candidate_id, dname, path):
         """Access candidate static files.
@@ -258,7 +353,7 @@ class Routes(routes.Routes):
                 path (string): file name.
         """
         ipath = "%s/query/%s/probe_set_%s/" % (self.static_path, query_id, candidate_id)
-        return bot.static_file(path, ipath)
+        return routes.output_file(self, ipath, path)
 
     def candidate_set_static_file_download(routes, self, query_id, candidate_id, path):
         """Download candidate static files.
@@ -272,7 +367,7 @@ class Routes(routes.Routes):
         """
         ipath = "%s/query/%s/probe_set_%s/" % (self.static_path, query_id, candidate_id)
         outname = "%s.%s" % (query_id, path)
-        return bot.static_file(path, ipath, download=outname)
+        return routes.output_file(self, ipath, path, outname)
 
     def candidate_set_probe_static_file(
         routes, self, query_id, candidate_id, probe_id, dname, path
@@ -292,7 +387,7 @@ class Routes(routes.Routes):
             candidate_id,
             probe_id,
         )
-        return bot.static_file(path, ipath)
+        return routes.output_file(self, ipath, path)
 
     def candidate_set_probe_static_file_download(
         routes, self, query_id, candidate_id, probe_id, path
@@ -313,7 +408,7 @@ class Routes(routes.Routes):
             probe_id,
         )
         outname = "%s.probe_set_%s.%s" % (query_id, candidate_id, path)
-        return bot.static_file(path, ipath, download=outname)
+        return routes.output_file(self, ipath, path, outname)
 
     def query_download(routes, self, query_id):
         """Download compressed query output.
@@ -323,15 +418,15 @@ class Routes(routes.Routes):
                 query_id (string): query folder name.
         """
 
-        routes.mkZipDir(self)
-        ipath = os.path.join(self.static_path, "query", routes.zipDirName)
-        fName = f"{query_id}.zip"
-        outname = f"query.{fName}"
-
-        if not os.path.isfile(os.path.join(ipath, fName)):
-            routes.zipQuery(self, query_id)
+        dirPath = routes.get_output_dir(self, query_id)
+        qpath = os.path.dirname(dirPath)
+        routes.materialize_all(self, dirPath)
+        fileList = listZipFiles(dirPath, qpath)
+        configPath = os.path.join(qpath, f"{query_id}.config")
+        if os.path.isfile(configPath):
+            fileList.append((configPath, f"{query_id}.config"))
 
-        return bot.static_file(fName, ipath, download=outname)
+        return routes.zip_download(self, fileList, f"query.{query_id}.zip")
 
     def candidate_download(routes, self, query_id, candidate_id):
         """Download compressed candidate output.
@@ -342,15 +437,10 @@ class Routes(routes.Routes):
                 candidate_id (string): candidate folder name.
         """
 
-        routes.mkZipDir(self)
-        ipath = os.path.join(self.static_path, "query", routes.zipDirName)
-        fName = f"{query_id}.candidate_{candidate_id}.zip"
-        outname = f"query.{fName}"
-
-        if not os.path.isfile(os.path.join(ipath, fName)):
-            routes.zipCandidate(self, query_id, candidate_id)
+        dirPath = routes.get_output_dir(self, query_id, f"candidate_{candidate_id}")
+        outname = f"query.{query_id}.candidate_{candidate_id}.zip"
 
-        return bot.static_file(fName, ipath, download=outname)
+        return routes.zip_download(self, listZipFiles(dirPath, dirPath), outname)
 
     def candidate_set_download(routes, self, query_id, candidate_id):
         """Download compressed candidate output.
@@ -361,15 +451,10 @@ class Routes(routes.Routes):
                 candidate_id (string): candidate folder name.
         """
 
-        routes.mkZipDir(self)
-        ipath = os.path.join(self.static_path, "query", routes.zipDirName)
-        fName = f"{query_id}.probe_set_{candidate_id}.zip"
-        outname = f"query.{fName}"
+        dirPath = routes.get_output_dir(self, query_id, f"probe_set_{candidate_id}")
+        outname = f"query.{query_id}.probe_set_{candidate_id}.zip"
 
-        if not os.path.isfile(os.path.join(ipath, fName)):
-            routes.zipCandidateSet(self, query_id, candidate_id)
-
-        return bot.static_file(fName, ipath, download=outname)
+        return routes.zip_download(self, listZipFiles(dirPath, dirPath), outname)
 
     def candidate_set_probe_download(routes, self, query_id, candidate_id, probe_id):
         """Download compressed candidate output.
@@ -380,15 +465,12 @@ class Routes(routes.Routes):
                 candidate_id (string): candidate folder name.
         """
 
-        routes.mkZipDir(self)
-        ipath = os.path.join(self.static_path, "query", routes.zipDirName)
-        fName = f"{query_id}.probe_set_{candidate_id}.probe_{probe_id}.zip"
-        outname = f"query.{fName}"
-
-        if not os.path.isfile(os.path.join(ipath, fName)):
-            routes.zipCandidateSetProbe(self, query_id, candidate_id, probe_id)
+        dirPath = routes.get_output_dir(
+            self, query_id, f"probe_set_{candidate_id}", f"probe_{probe_id}"
+        )
+        outname = f"query.{query_id}.probe_set_{candidate_id}.probe_{probe_id}.zip"
 
-        return bot.static_file(fName, ipath, download=outname)
+        return routes.zip_download(self, listZipFiles(dirPath, dirPath), outname)
 
     # Pages --------------------------------------------------------------------
 
@@ -405,22 +487,8 @@ class Routes(routes.Routes):
         d["custom_stylesheets"] = ["home.css", "style.css"]
         d["custom_root_stylesheets"] = []
 
-        configPathList = [
-            os.path.join(self.static_path, "db", p, ".config")
-            for p in next(os.walk(os.path.join(self.static_path, "db")))[1]
-        ]
-        configPathList.sort()
-        d["dbdata"] = []
-        for configPath in configPathList:
-            with open(configPath, "r") as IH:
-                parser = configparser.ConfigParser()
-                parser.read_string("".join(IH.readlines()))
-                d["dbdata"].append(parser)
-        d["dblist"] = {}
-        for p in d["dbdata"]:
-            dbDir = os.path.basename(p["SOURCE"]["outdirectory"])
-            dbName = p["DATABASE"]["name"]
-            d["dblist"][dbName] = dbDir
+        d["dbdata"] = self.catalog.get_configs()
+        d["dblist"] = self.catalog.get_names()
 
         return d
 
@@ -449,7 +517,9 @@ class Routes(routes.Routes):
             if not os.path.isfile(fpath):
                 d["query"]["status"] = "error"
             else:
-                d["query"]["candidate_table"] = pd.read_csv(fpath, "\t")
+                d["query"]["candidate_table"] = routes.read_candidate_table(
+                    self, query_id, os.path.basename(fpath)
+                )
 
         d["queryTimeout"] = 24 * 60 * 60  # 1 day timeout
 
@@ -476,12 +546,9 @@ class Routes(routes.Routes):
         d["queryRoot"] = self.qpath
 
         d["candidate"] = {"id": candidate_id}
-        configPath = os.path.join(
-            self.qpath,
-            query_id,
-            f"candidate_{candidate_id}",
-            f"candidate_{candidate_id}.config",
-        )
+        dirPath = os.path.join(self.qpath, query_id, f"candidate_{candidate_id}")
+        routes.materialize(self, dirPath)
+        configPath = os.path.join(dirPath, f"candidate_{candidate_id}.config")
         with open(configPath, "r") as IH:
             config = configparser.ConfigParser()
             config.read_string("".join(IH.readlines()))
@@ -508,8 +575,8 @@ class Routes(routes.Routes):
 
         d["query"] = Query(query_id, self.qpath).data
         d["queryRoot"] = self.qpath
-        d["query"]["candidate_table"] = pd.read_csv(
-            os.path.join(self.qpath, query_id, "set_candidates.tsv"), "\t"
+        d["query"]["candidate_table"] = routes.read_candidate_table(
+            self, query_id, "set_candidates.tsv"
         )
 
         d["candidate"] = {"id": candidate_id}
@@ -533,20 +600,18 @@ class Routes(routes.Routes):
 
         d["query"] = Query(query_id, self.qpath).data
         d["queryRoot"] = self.qpath
-        d["query"]["candidate_table"] = pd.read_csv(
-            os.path.join(self.qpath, query_id, "set_candidates.tsv"), "\t"
+        d["query"]["candidate_table"] = routes.read_candidate_table(
+            self, query_id, "set_candidates.tsv"
         )
 
         d["candidate"] = {"id": candidate_id}
 
         d["probe"] = {"id": probe_id}
-        configPath = os.path.join(
-            self.qpath,
-            query_id,
-            f"probe_set_{candidate_id}",
-            f"probe_{probe_id}",
-            f"probe_{probe_id}.config",
+        dirPath = os.path.join(
+            self.qpath, query_id, f"probe_set_{candidate_id}", f"probe_{probe_id}"
         )
+        routes.materialize(self, dirPath)
+        configPath = os.path.join(dirPath, f"probe_{probe_id}.config")
         with open(configPath, "r") as IH:
             config = configparser.ConfigParser()
             config.read_string("".join(IH.readlines()))
@@ -578,6 +643,19 @@ class Routes(routes.Routes):
 
         return "Done"
 
+    def redirect_to_query(routes, self, query_id):
+        """Redirect to the output page of a query.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                query_id (string): query folder name.
+        """
+        bot.response.status = 303
+        bot.response.set_header(
+            "Location", f"{self.root_uri}{self.app_uri}q/{query_id}"
+        )
+        return "Query received."
+
     def single_query(routes, self):
         """Single probe query form reception route.
 
@@ -590,8 +668,8 @@ class Routes(routes.Routes):
         if formData.start != formData.end:
             queriedRegion = [
                 "--region",
-                shlex.quote(formData.start),
-                shlex.quote(formData.end),
+                formData.start,
+                formData.end,
             ]
         query_id = "%s:%s:%s:%s" % (
             formData.chromosome,
@@ -611,25 +689,35 @@ class Routes(routes.Routes):
             "ifpd",
             "query",
             "probe",
-            shlex.quote(dbPath),
-            shlex.quote(formData.chromosome),
-            shlex.quote(f"{self.static_path}/query/{query_id}"),
+            dbPath,
+            formData.chromosome,
+            f"{self.static_path}/query/{query_id}",
             "--order",
-            shlex.quote(formData.f1),
-            shlex.quote(formData.f2),
-            shlex.quote(formData.f3),
+            formData.f1,
+            formData.f2,
+            formData.f3,
             "--filter-thr",
-            shlex.quote(formData.f1_threshold),
+            formData.f1_threshold,
             "--n-oligo",
-            shlex.quote(formData.n_oligo),
+            formData.n_oligo,
             "--max-probes",
-            shlex.quote(formData.max_probes),
+            formData.max_probes,
             "--min-d",
-            shlex.quote(f"{min_dist}"),
+            f"{min_dist}",
         ]
         if len(queriedRegion) != 0:
             cmd.extend(queriedRegion)
-        logging.info(" ".join(cmd))
+        if bundle.is_available():
+            cmd.append("--bundle")
+        logging.info(" ".join(shlex.quote(x) for x in cmd))
+
+        cache_key = ResultCache.get_key(
+            cmd, ResultCache.get_db_checksum(oligoDB, formData.chromosome)
+        )
+        cached_id = self.results.lookup(cache_key)
+        if cached_id is not None:
+            logging.info(f'Reusing results of query "{cached_id}"')
+            return routes.redirect_to_query(self, cached_id)
 
         config = configparser.ConfigParser()
         timestamp = time.time()
@@ -637,8 +725,9 @@ class Routes(routes.Routes):
             "name": formData.name,
             "description": formData.description,
             "type": "single",
-            "cmd": " ".join(cmd),
+            "cmd": " ".join(shlex.quote(x) for x in cmd),
             "status": "queued",
+            ResultCache.KEY_FIELD: cache_key,
         }
         config["WHEN"] = {
             "time": timestamp,
@@ -655,14 +744,19 @@ class Routes(routes.Routes):
         with open(configPath, "w+") as OH:
             config.write(OH)
 
-        self.queue.put(cmd)
-
-        bot.response.status = 303
-        bot.response.set_header(
-            "Location", f"{self.root_uri}{self.app_uri}q/{query_id}"
+        self.results.add(cache_key, query_id)
+        self.results.evict()
+        self.queue.put(
+            cmd,
+            info=dict(
+                name=config["GENERAL"]["name"],
+                type=config["GENERAL"]["type"],
+                time=timestamp,
+                isotime=config["WHEN"]["isotime"],
+            ),
         )
 
-        return "Query received."
+        return routes.redirect_to_query(self, query_id)
 
     def spotting_query(routes, self):
         """Multi probe query form reception route.
@@ -676,8 +770,8 @@ class Routes(routes.Routes):
         if formData.start != formData.end:
             queriedRegion = [
                 "--region",
-                shlex.quote(formData.start),
-                shlex.quote(formData.end),
+                formData.start,
+                formData.end,
             ]
         query_id = "%s:%s:%s:%s" % (
             formData.multi_chromosome,
@@ -697,26 +791,36 @@ class Routes(routes.Routes):
             "ifpd",
             "query",
             "set",
-            shlex.quote(dbPath),
-            shlex.quote(formData.multi_chromosome),
-            shlex.quote(f"{self.static_path}/query/{query_id}"),
-            shlex.quote(formData.multi_n_probes),
+            dbPath,
+            formData.multi_chromosome,
+            f"{self.static_path}/query/{query_id}",
+            formData.multi_n_probes,
             "--order",
-            shlex.quote(formData.f1),
-            shlex.quote(formData.f2),
-            shlex.quote(formData.f3),
+            formData.f1,
+            formData.f2,
+            formData.f3,
             "--filter-thr",
-            shlex.quote(formData.multi_f1_threshold),
+            formData.multi_f1_threshold,
             "--n-oligo",
-            shlex.quote(formData.multi_n_oligo),
+            formData.multi_n_oligo,
             "--min-d",
-            shlex.quote(f"{min_dist}"),
+            f"{min_dist}",
             "--window-shift",
-            shlex.quote(f"{formData.multi_win_shift}"),
+            f"{formData.multi_win_shift}",
         ]
         if len(queriedRegion) != 0:
             cmd.extend(queriedRegion)
-        logging.info(" ".join(cmd))
+        if bundle.is_available():
+            cmd.append("--bundle")
+        logging.info(" ".join(shlex.quote(x) for x in cmd))
+
+        cache_key = ResultCache.get_key(
+            cmd, ResultCache.get_db_checksum(oligoDB, formData.multi_chromosome)
+        )
+        cached_id = self.results.lookup(cache_key)
+        if cached_id is not None:
+            logging.info(f'Reusing results of query "{cached_id}"')
+            return routes.redirect_to_query(self, cached_id)
 
         config = configparser.ConfigParser()
         timestamp = time.time()
@@ -724,8 +828,9 @@ class Routes(routes.Routes):
             "name": formData.multi_name,
             "description": formData.multi_description,
             "type": "spotting",
-            "cmd": " ".join(cmd),
+            "cmd": " ".join(shlex.quote(x) for x in cmd),
             "status": "queued",
+            ResultCache.KEY_FIELD: cache_key,
         }
         config["WHEN"] = {
             "time": timestamp,
@@ -743,15 +848,20 @@ class Routes(routes.Routes):
         with open(configPath, "w+") as OH:
             config.write(OH)
 
-        self.queue.put(cmd)
-
-        bot.response.status = 303
-        bot.response.set_header(
-            "Location", f"{self.root_uri}{self.app_uri}q/{query_id}"
+        self.results.add(cache_key, query_id)
+        self.results.evict()
+        self.queue.put(
+            cmd,
+            info=dict(
+                name=config["GENERAL"]["name"],
+                type=config["GENERAL"]["type"],
+                time=timestamp,
+                isotime=config["WHEN"]["isotime"],
+            ),
         )
 
         # Output
-        return "Query received."
+        return routes.redirect_to_query(self, query_id)
 
     # Error --------------------------------------------------------------------
 
@@ -772,20 +882,64 @@ class Routes(routes.Routes):
     # AJAX Requests ------------------------------------------------------------
 
     def list_chromosomes(routes, self, dbDir):
-        dbPath = os.path.join(self.static_path, "db", dbDir)
-        chrList = [x for x in os.listdir(dbPath) if not os.path.isdir(x)]
-        chrList = [x for x in chrList if x not in [".log", ".config"]]
-        if not chrList:
-            return '{"chrList":[]}'
-        chrList.sort()
-        return '{"chrList":["%s"]}' % '","'.join(chrList[::-1])
+        chrList = self.catalog.get_chromosomes(dbDir)
+        bot.response.content_type = "application/json"
+        return json.dumps({"chrList": chrList[::-1]})
 
     def queueStatus(routes, self):
-        taskList = []
-        for task in self.queue.queue:
-            query_id = os.path.basename(task[5])
-            data = Query(query_id, self.qpath).data
-            taskList.append(os.path.basename(task[1]) + f' @{data["isotime"]}')
-        if not taskList:
-            return '{"queue":[]}'
-        return '{"queue": ["%s"]}' % '", "'.join(taskList)
+        """Running and queued queries, as JSON. Clients polling with the ETag of
+        the previous response get a 304 response until the queue changes.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+        """
+        version, taskList = self.queue.status()
+        etag = f'"{version}"'
+        bot.response.set_header("ETag", etag)
+        bot.response.set_header("Cache-Control", "no-cache")
+        if etag == bot.request.get_header("If-None-Match"):
+            bot.response.status = 304
+            return ""
+        bot.response.content_type = "application/json"
+        return json.dumps({"queue": taskList})
+
+    def query_progress(routes, self, query_id):
+        """Status and progress of a query, as JSON. The ETag of the response
+        changes when the query status or progress change, and clients polling
+        with the ETag of the previous response get a 304 response, without
+        reading the query config, until then.
+
+        Args:
+                self (App): ProbeDesigner.App instance.
+                query_id (string): query folder name.
+        """
+        if not Query.exists(query_id, self.qpath):
+            bot.abort(404, "Query not found.")
+        configPath = os.path.join(self.qpath, f"{query_id}.config")
+        outdir = os.path.join(self.qpath, query_id)
+
+        version = []
+        for path in [configPath, os.path.join(outdir, PROGRESS_FILE)]:
+            version.append(os.stat(path).st_mtime_ns if os.path.isfile(path) else 0)
+        etag = f'"{"-".join([str(x) for x in version])}"'
+        bot.response.set_header("ETag", etag)
+        bot.response.set_header("Cache-Control", "no-cache")
+        if etag == bot.request.get_header("If-None-Match"):
+            bot.response.status = 304
+            return ""
+
+        data = Query(query_id, self.qpath).data
+        status = data["status"]
+        outputFile = ResultCache.OUTPUT_FILES.get(data["type"], None)
+        if "done" == status and (
+            outputFile is None or not os.path.isfile(os.path.join(outdir, outputFile))
+        ):
+            status = "error"
+
+        bot.response.content_type = "application/json"
+        return json.dumps({"status": status, "progress": read_progress(outdir)})
+
+    def cacheStatus(routes, self):
+        """Chromosome cache stats of the query processes, as JSON."""
+        bot.response.content_type = "application/json"
+        return json.dumps(self.pool.get_cache_stats())
@@ -0,0 +1,202 @@
+"""
+@author: Gabriele Girelli
+@contact: gigi.ga90@gmail.com
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import contextlib
+from ifpd import cache, plot
+import logging
+import multiprocessing
+import threading
+import traceback
+
+_parser = None
+
+
+def get_parser():
+    """Builds the ifpd parser once per process."""
+    global _parser
+    if _parser is None:
+        from ifpd.scripts.ifpd import build_parser
+
+        _parser = build_parser()
+    return _parser
+
+
+def init_worker(cacheBytes=0):
+    """Imports the query scripts, with all their dependencies, and sets up the
+    chromosome cache when a worker process starts."""
+    cache.enable_chromosome_cache(cacheBytes)
+    get_parser()
+
+
+def run_command(cmd, errorLogPath):
+    """Runs an ifpd command in the current process.
+
+    Args:
+            cmd (list): command line, starting with "ifpd".
+            errorLogPath (string): path to the file where warnings, errors, and
+                    anything written to stderr are logged.
+
+    Returns:
+            int: exit status, non-zero if the command failed.
+    """
+    rootLogger = logging.getLogger()
+    handlers = list(rootLogger.handlers)
+    status = 0
+    with open(errorLogPath, "w+") as EH, contextlib.redirect_stderr(EH):
+        errorHandler = logging.StreamHandler(EH)
+        errorHandler.setLevel(logging.WARNING)
+        rootLogger.addHandler(errorHandler)
+        try:
+            args = get_parser().parse_args(cmd[1:])
+            args = args.parse(args)
+            args.run(args)
+        except SystemExit as e:
+            status = 1 if e.code is None else e.code
+        except Exception:
+            traceback.print_exc(file=EH)
+            status = 1
+        finally:
+            for handler in list(rootLogger.handlers):
+                if handler not in handlers:
+                    rootLogger.removeHandler(handler)
+                    handler.close()
+                    if hasattr(handler, "console"):
+                        handler.console.file.close()
+    return status
+
+
+def run_command_with_stats(cmd, errorLogPath):
+    """Runs an ifpd command in the current process, like run_command, and
+    reports the chromosome cache stats of the process."""
+    status = run_command(cmd, errorLogPath)
+    return (status, cache.get_chromosome_cache().stats())
+
+
+class QueryPool(object):
+    """Pool of long-lived processes running queries.
+
+    Worker processes keep their imports and a chromosome cache between queries.
+    A new pool is started if a worker process dies unexpectedly.
+
+    Args:
+            max_workers (int): number of worker processes.
+            cacheBytes (int): chromosome cache budget of each worker, in bytes.
+    """
+
+    def __init__(self, max_workers=1, cacheBytes=0):
+        super(QueryPool, self).__init__()
+        self.max_workers = max_workers
+        self.cacheBytes = cacheBytes
+        self.cacheStats = {}
+        self.lock = threading.Lock()
+        self.executor = self.__mk_executor()
+
+    def __mk_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.cacheBytes,),
+        )
+
+    def run(self, cmd, errorLogPath):
+        """Runs an ifpd command in a worker process, waiting for it to finish.
+
+        Args:
+                cmd (list): command line, starting with "ifpd".
+                errorLogPath (string): path to the error log file.
+
+        Returns:
+                int: exit status, non-zero if the command failed.
+        """
+        executor = self.executor
+        try:
+            status, cacheStats = executor.submit(
+                run_command_with_stats, cmd, errorLogPath
+            ).result()
+        except BrokenProcessPool:
+            with self.lock:
+                if executor is self.executor:
+                    self.executor = self.__mk_executor()
+                    self.cacheStats = {}
+            with open(errorLogPath, "a+") as EH:
+                EH.write("Query process terminated unexpectedly.\n")
+            return 1
+        with self.lock:
+            self.cacheStats[cacheStats["pid"]] = cacheStats
+        return status
+
+    def submit(self, fn, *args):
+        """Runs a function in a worker process, without waiting for it.
+        A new pool is started if the current one is broken.
+
+        Returns:
+                concurrent.futures.Future: the function result.
+        """
+        executor = self.executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self.lock:
+                if executor is self.executor:
+                    self.executor = self.__mk_executor()
+                    self.cacheStats = {}
+                executor = self.executor
+            return executor.submit(fn, *args)
+
+    def get_cache_stats(self):
+        """Chromosome cache stats, as last reported by each worker process,
+        and their totals."""
+        with self.lock:
+            workers = list(self.cacheStats.values())
+        total = {
+            key: sum(stats[key] for stats in workers)
+            for key in ["entries", "nbytes", "maxBytes", "hits", "misses", "evictions"]
+        }
+        return {"workers": workers, "total": total}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+class PlotRenderer(object):
+    """Renders the plots of query outputs when first requested, in a pool of
+    processes. Concurrent requests for the plots of the same folder wait for
+    the same rendering.
+
+    Args:
+            pool (QueryPool): pool of processes rendering plots.
+            pending (dict): futures of the renderings in progress, by folder.
+    """
+
+    def __init__(self, pool):
+        super(PlotRenderer, self).__init__()
+        self.pool = pool
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def render(self, dirPath):
+        """Renders the plots of an exported folder, if missing, and waits for
+        them. Raises the rendering error, if any."""
+        if plot.has_plots(dirPath):
+            return
+        with self.lock:
+            future = self.pending.get(dirPath, None)
+            isNew = future is None
+            if isNew:
+                future = self.pool.submit(plot.render, dirPath)
+                self.pending[dirPath] = future
+        if isNew:
+            future.add_done_callback(lambda f: self.__forget(dirPath))
+        future.result()
+
+    def __forget(self, dirPath):
+        with self.lock:
+            self.pending.pop(dirPath, None)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
@@ -27,3 +27,57 @@ def calc_density(data, **kwargs):
         "y": density(np.linspace(min(data), max(data), nbins)),
         "f": density,
     }
+
+
+class OligoStats(object):
+    """Accumulates the statistics of the oligos in a chromosome, one block of
+    oligos at a time. Blocks must be sorted and provided in order. The checksum
+    of the chromosome file can be stored alongside, when available."""
+
+    def __init__(self):
+        super(OligoStats, self).__init__()
+        self.count = 0
+        self.min_dist = np.inf
+        self.length_range = [np.inf, -np.inf]
+        self.overlaps = False
+        self.checksum = None
+        self.lastEnd = None
+
+    def update(self, chromStart, chromEnd):
+        """Adds a block of oligos to the statistics."""
+        chromStart = np.asarray(chromStart)
+        chromEnd = np.asarray(chromEnd)
+        if 0 == chromStart.shape[0]:
+            return self
+        self.count += chromStart.shape[0]
+
+        lengths = chromEnd - chromStart
+        self.length_range[0] = min(self.length_range[0], lengths.min())
+        self.length_range[1] = max(self.length_range[1], lengths.max())
+
+        if self.lastEnd is None:
+            distances = chromStart[1:] - chromEnd[:-1]
+        else:
+            distances = chromStart - np.append(self.lastEnd, chromEnd[:-1])
+        if 0 != distances.shape[0]:
+            self.min_dist = min(self.min_dist, distances.min())
+            self.overlaps |= bool((distances < 0).any())
+        self.lastEnd = chromEnd[-1]
+
+        return self
+
+    @staticmethod
+    def merge(statsList):
+        """Combines the statistics of multiple chromosomes."""
+        merged = OligoStats()
+        for oligoStats in statsList:
+            merged.count += oligoStats.count
+            merged.min_dist = min(merged.min_dist, oligoStats.min_dist)
+            merged.length_range[0] = min(
+                merged.length_range[0], oligoStats.length_range[0]
+            )
+            merged.length_range[1] = max(
+                merged.length_range[1], oligoStats.length_range[1]
+            )
+            merged.overlaps |= oligoStats.overlaps
+        return merged